@@ -1,14 +1,39 @@
 from django.contrib import admin
 
-from pool_ladder.models import UserProfile, Match, Game, Season
+from pool_ladder.models import (
+    UserProfile, Match, MatchParticipant, Game, Season, PlayerStats, PlayerRating, HeadToHead, SeasonStanding,
+    DailyStanding, LadderEvent, FailedNotification
+)
+from pool_ladder.charts import invalidate_all_rank_charts
+from pool_ladder.notifications import retry_failed
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'rank', 'active', 'slack_id']
+    list_display = ['user', 'rank', 'rating', 'active', 'slack_id']
     raw_id_fields = ['user']
     list_editable = ['active', 'rank', 'slack_id']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+
+        if change and 'rank' in form.changed_data:
+            # a rank set by hand can change the length of the ladder the charts are drawn against
+            invalidate_all_rank_charts()
+
+        if change and ('rank' in form.changed_data or 'active' in form.changed_data):
+            # players that aren't active aren't on the ladder
+            LadderEvent.record(
+                LadderEvent.EDIT,
+                [
+                    (
+                        obj.user_id,
+                        form.initial.get('rank') if form.initial.get('active') else None,
+                        obj.rank if obj.active else None
+                    )
+                ]
+            )
+
 
 @admin.register(Season)
 class SeasonAdmin(admin.ModelAdmin):
@@ -27,3 +52,74 @@ class MatchAdmin(admin.ModelAdmin):
 class GameAdmin(admin.ModelAdmin):
     list_display = ['index', 'match', 'winner', 'balled']
     raw_id_fields = ['match', 'winner', 'balled']
+
+
+@admin.register(MatchParticipant)
+class MatchParticipantAdmin(admin.ModelAdmin):
+    list_display = ['match', 'user', 'role', 'result', 'rank_before', 'rank_after']
+    list_filter = ['role', 'result']
+    raw_id_fields = ['match', 'user']
+
+
+@admin.register(PlayerStats)
+class PlayerStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'matches_won', 'matches_lost', 'games_won', 'streak', 'last_played', 'is_top', 'is_bottom']
+    raw_id_fields = ['user']
+
+
+@admin.register(PlayerRating)
+class PlayerRatingAdmin(admin.ModelAdmin):
+    list_display = ['user', 'season', 'rating', 'matches']
+    list_filter = ['season']
+    raw_id_fields = ['user']
+
+
+@admin.register(HeadToHead)
+class HeadToHeadAdmin(admin.ModelAdmin):
+    list_display = ['player_a', 'player_b', 'a_wins', 'b_wins', 'last_played']
+    raw_id_fields = ['player_a', 'player_b']
+
+
+@admin.register(SeasonStanding)
+class SeasonStandingAdmin(admin.ModelAdmin):
+    list_display = ['season', 'rank', 'user', 'matches_won', 'matches_lost', 'games_won', 'rating']
+    list_filter = ['season']
+
+    def has_change_permission(self, request, obj=None):
+        # standings are a record of how a season finished
+        return False
+
+
+@admin.register(DailyStanding)
+class DailyStandingAdmin(admin.ModelAdmin):
+    list_display = ['date', 'rank', 'user', 'rating']
+    date_hierarchy = 'date'
+    raw_id_fields = ['user']
+
+
+@admin.register(LadderEvent)
+class LadderEventAdmin(admin.ModelAdmin):
+    list_display = ['time', 'kind', 'user', 'rank_before', 'rank_after', 'match', 'season']
+    list_filter = ['kind']
+    date_hierarchy = 'time'
+    raw_id_fields = ['user', 'match']
+
+    def has_change_permission(self, request, obj=None):
+        # the ladder is replayed from these so they are never changed
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FailedNotification)
+class FailedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['failed', 'kind', 'attempts', 'error']
+    list_filter = ['kind']
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        sent = len([notification for notification in queryset if retry_failed(notification)])
+        self.message_user(request, '{} of {} notifications sent.'.format(sent, len(queryset)))
+
+    retry.short_description = 'Retry the selected notifications'
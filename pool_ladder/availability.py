@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.db.models import Max, Min, Q
+from django.utils.timezone import now
+
+from pool_ladder.models import Match, UserProfile
+
+COOL_DOWN = timedelta(hours=4)
+
+
+class LadderAvailability(object):
+    """
+    Work out availability, cool down and challenge eligibility for a set of profiles in one go.
+    Open challenges and last played times are loaded with a fixed number of queries
+    so the answers match the UserProfile properties without a query per player.
+    """
+    def __init__(self, profiles=None, users=None):
+        """
+        profiles are the profiles to answer for (all active profiles by default).
+        users optionally restricts the match queries to the given user ids
+        """
+        all_active = profiles is None
+
+        if all_active:
+            profiles = UserProfile.objects.filter(active=True).select_related('user')
+
+        self.profiles = list(profiles)
+        self.by_user = {profile.user_id: profile for profile in self.profiles}
+        self.now = now()
+
+        # every user in a match not yet played
+        open_matches = Match.objects.filter(played__isnull=True, declined=False)
+
+        if users is not None:
+            open_matches = open_matches.filter(Q(challenger__in=users) | Q(opponent__in=users))
+
+        self.open_challenges = set()
+
+        for challenger_id, opponent_id in open_matches.values_list('challenger_id', 'opponent_id'):
+            self.open_challenges.add(challenger_id)
+            self.open_challenges.add(opponent_id)
+
+        # the latest played time for each user, once as challenger and once as opponent
+        self.last_played = {}
+
+        for field in ['challenger', 'opponent']:
+            played_matches = Match.objects.filter(played__isnull=False)
+
+            if users is not None:
+                played_matches = played_matches.filter(**{'{}__in'.format(field): users})
+
+            # clear the default ordering so it isn't added to the group by
+            for user_id, last_played in played_matches.order_by().values(field).annotate(
+                last_played=Max('played')
+            ).values_list(field, 'last_played'):
+                if user_id not in self.last_played or last_played > self.last_played[user_id]:
+                    self.last_played[user_id] = last_played
+
+        # the top and bottom of the ladder for swag
+        if all_active:
+            active_ranks = [profile.rank for profile in self.profiles]
+            self.min_rank = min(active_ranks) if active_ranks else None
+            self.max_rank = max(active_ranks) if active_ranks else None
+        else:
+            ranks = UserProfile.objects.filter(active=True).aggregate(min_rank=Min('rank'), max_rank=Max('rank'))
+            self.min_rank = ranks['min_rank']
+            self.max_rank = ranks['max_rank']
+
+    @classmethod
+    def for_users(cls, *users):
+        """
+        build the availability for just the given users
+        """
+        user_ids = [user.pk for user in users]
+        return cls(UserProfile.objects.filter(user__in=user_ids).select_related('user'), users=user_ids)
+
+    def profile_for(self, user):
+        """
+        return the profile for the given user, loading it if it wasn't part of the initial set
+        """
+        profile = self.by_user.get(user.pk)
+
+        if profile is None:
+            profile = UserProfile.objects.get(user=user)
+            self.by_user[user.pk] = profile
+
+        return profile
+
+    def has_open_challenge(self, profile):
+        """
+        return True if this user is in a match not yet played
+        """
+        return profile.user_id in self.open_challenges
+
+    def time_available(self, profile):
+        """
+        Return the time the player will become available
+        """
+        last_played = self.last_played.get(profile.user_id)
+
+        if last_played:
+            return last_played + COOL_DOWN
+
+        return None
+
+    def in_cool_down(self, profile):
+        """
+        Determine if the player is in their cool down period
+        """
+        last_played = self.last_played.get(profile.user_id)
+
+        if last_played:
+            return (self.now - last_played) <= COOL_DOWN
+
+        return False
+
+    def is_available(self, profile):
+        """
+        determine if this user has any open challenges or has played a match in the last 4 hours
+        """
+        return not self.has_open_challenge(profile) and not self.in_cool_down(profile) and profile.active
+
+    def can_challenge(self, profile, challenger):
+        """
+        determine if the provided user can challenge the user of this profile
+        """
+        try:
+            challenger_profile = self.profile_for(challenger)
+        except UserProfile.DoesNotExist:
+            return False
+
+        return (
+                challenger_profile.rank > profile.rank >= (challenger_profile.rank - 2)
+                and not self.has_open_challenge(profile)
+                and self.is_available(challenger_profile)
+        )
+
+    def swag(self, profile):
+        swag = []
+
+        if profile.rank == self.min_rank:
+            swag.append('1f478')
+
+        if profile.rank == self.max_rank:
+            swag.append('1F4A9')
+
+        if profile.movement == 100:
+            # user was balled
+            swag.append('1F3B1')
+
+        return swag
+
+    def row_context(self, profile, viewer):
+        """
+        return the template context used to render a ladder row for the given viewer
+        """
+        return {
+            'profile': profile,
+            'swag': self.swag(profile),
+            'can_challenge': self.can_challenge(profile, viewer),
+            'has_open_challenge': self.has_open_challenge(profile),
+            'in_cool_down': self.in_cool_down(profile),
+            'time_available': self.time_available(profile),
+        }
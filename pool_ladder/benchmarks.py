@@ -0,0 +1,374 @@
+import asyncio
+import json
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+from django.utils.timezone import now
+
+from pool_ladder import metrics
+from pool_ladder.business_days import challenge_deadline
+from pool_ladder.consumers import MainConsumer
+from pool_ladder.diffs import OVERLAP, LadderDiff
+from pool_ladder.fanout import TABLES
+from pool_ladder.models import (
+    Game, HeadToHead, LadderEvent, Match, MatchParticipant, PlayerRating, PlayerStats, Season, User, UserProfile
+)
+from pool_ladder.results import record_result
+
+# the ladder sizes benchmarked by default
+SIZES = [10, 100, 1000]
+PASSWORD = 'benchmark'
+# rows written per insert while generating history
+BATCH_SIZE = 1000
+
+
+def participants(matches):
+    """
+    return the participant rows for matches that have only just been created
+    """
+    return [participant for match in matches for participant in MatchParticipant.for_match(match)]
+
+
+def ladder_events(before, after, offset, match, balled):
+    """
+    return the events for the players the match moved between two orderings of the ladder starting at rank offset + 1
+    """
+    ranks = {user_id: offset + index + 1 for index, user_id in enumerate(after)}
+
+    return [
+        LadderEvent(
+            time=match.played,
+            kind=LadderEvent.BALLED if balled and user_id != match.winner_id else LadderEvent.RESULT,
+            user_id=user_id,
+            match_id=match.pk,
+            rank_before=offset + index + 1,
+            rank_after=ranks[user_id]
+        ) for index, user_id in enumerate(before) if ranks[user_id] != offset + index + 1
+    ]
+
+
+def generate_ladder(players, years=2, rate=1, seed=0):
+    """
+    Create a ladder of players with years of history, about rate matches a week for each player.
+    The history is played out in order so ranks, balls, seasons and ladder events are consistent with each other.
+    A few challenges are left open at the top of the ladder for the scenarios to play
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    User.objects.bulk_create(
+        [User(username='player_{}'.format(index), password=password) for index in range(players)]
+    )
+    # the ladder from the top down
+    ladder = list(User.objects.filter(username__startswith='player_').order_by('pk').values_list('pk', flat=True))
+    rng.shuffle(ladder)
+
+    start = now() - timedelta(days=365 * years)
+    Season.objects.bulk_create(
+        [Season(number=year + 1, date_started=start + timedelta(days=365 * year)) for year in range(max(years, 1))]
+    )
+    seasons = list(Season.objects.order_by('date_started'))
+
+    total = int(players * rate * 52 * years / 2)
+    span = now() - timedelta(days=1) - start
+    next_pk = (Match.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+    matches = []
+    games = []
+    # everyone joined before the first match so it can be replayed from the ladder they joined
+    events = [
+        LadderEvent(time=start - timedelta(days=1), kind=LadderEvent.JOIN, user_id=user_id, rank_after=rank + 1)
+        for rank, user_id in enumerate(ladder)
+    ]
+
+    for index in range(total):
+        played = start + span * (index / total)
+        opponent_rank = rng.randrange(players - 1)
+        challenger_rank = min(opponent_rank + rng.randint(1, 2), players - 1)
+        challenger, opponent = ladder[challenger_rank], ladder[opponent_rank]
+        balled = rng.random() < 0.05
+        winner, loser = (challenger, opponent) if rng.random() < 0.45 else (opponent, challenger)
+
+        if balled:
+            results = [(winner, None)] * rng.randint(0, 2) + [(winner, loser)]
+        else:
+            results = rng.choice([[winner, winner], [winner, loser, winner], [loser, winner, winner]])
+            results = [(game_winner, None) for game_winner in results]
+
+        # only the players from the opponent down to the challenger, or the bottom when balled, can move
+        end = None if balled else challenger_rank + 1
+        before = ladder[opponent_rank:end]
+
+        # winners take the higher rank and balled players drop to the bottom
+        ladder[opponent_rank], ladder[challenger_rank] = winner, loser
+
+        if balled:
+            ladder.remove(loser)
+            ladder.append(loser)
+
+        matches.append(
+            Match(
+                pk=next_pk,
+                season=[season for season in seasons if season.date_started <= played][-1],
+                challenge_time=played - timedelta(days=1),
+                played=played,
+                challenger_id=challenger,
+                opponent_id=opponent,
+                winner_id=winner,
+                loser_id=loser,
+                challenger_rank=challenger_rank + 1,
+                opponent_rank=opponent_rank + 1,
+                winner_rank=ladder.index(winner) + 1,
+                loser_rank=ladder.index(loser) + 1
+            )
+        )
+        events += ladder_events(before, ladder[opponent_rank:end], opponent_rank, matches[-1], balled)
+        games += [
+            Game(match_id=next_pk, index=game_index, winner_id=game_winner, balled_id=game_balled)
+            for game_index, (game_winner, game_balled) in enumerate(results + [(None, None)] * (3 - len(results)))
+        ]
+        next_pk += 1
+
+        if len(matches) >= BATCH_SIZE:
+            Match.objects.bulk_create(matches)
+            Game.objects.bulk_create(games)
+            MatchParticipant.objects.bulk_create(participants(matches))
+            LadderEvent.objects.bulk_create(events)
+            matches, games, events = [], [], []
+
+    Match.objects.bulk_create(matches)
+    Game.objects.bulk_create(games)
+    MatchParticipant.objects.bulk_create(participants(matches))
+    LadderEvent.objects.bulk_create(events)
+
+    # the primary keys were given so move the sequence on past them
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Match]):
+            cursor.execute(sql)
+
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, rank=rank + 1) for rank, user_id in enumerate(ladder)]
+    )
+
+    PlayerRating.rebuild()
+
+    # the history was saved just now, date it back to when it was played so it isn't all new to the fan out
+    Match.objects.update(updated=F('played'))
+    UserProfile.objects.update(updated=start)
+
+    # challenges between the pairs at the top, each player only has one
+    challenge_time = now() - timedelta(hours=1)
+    Match.objects.bulk_create(
+        [
+            Match(
+                season=seasons[-1],
+                challenge_time=challenge_time,
+                deadline=challenge_deadline(challenge_time, 3),
+                challenger_id=ladder[rank + 1],
+                opponent_id=ladder[rank],
+                challenger_rank=rank + 2,
+                opponent_rank=rank + 1
+            ) for rank in range(0, min(players - 1, max(6, players // 5)), 2)
+        ]
+    )
+    MatchParticipant.sync(Match.objects.filter(played__isnull=True))
+
+    PlayerStats.rebuild()
+    HeadToHead.rebuild()
+
+
+class Benchmark(object):
+    """
+    Run each scenario against a generated ladder, recording what it cost.
+    The cache and channel layer are cleared before each scenario so only run this against throwaway ones
+    """
+    def __init__(self, sockets=None):
+        self.sockets = sockets
+        self.scenario = None
+        self.results = {}
+        self.client = Client()
+
+    def run(self, scenarios=None):
+        for name in scenarios or SCENARIOS:
+            self.scenario = name
+            # every scenario starts cold
+            cache.clear()
+            async_to_sync(get_channel_layer().flush)()
+            getattr(self, name)()
+
+        return self.results
+
+    @contextmanager
+    def measure(self):
+        """
+        time the block, queries are only counted if it records them as well
+        """
+        with metrics.measure('benchmark.{}'.format(self.scenario)) as sample:
+            yield sample
+
+        self.results[self.scenario] = sample.as_dict()
+
+    def login(self, user):
+        self.client.login(username=user.username, password=PASSWORD)
+
+    def open_challenge(self):
+        return Match.objects.filter(played__isnull=True, declined=False).order_by('opponent_rank').first()
+
+    def datatable(self, name):
+        self.login(User.objects.get(userprofile__rank=1))
+
+        with self.measure() as sample, sample.recording():
+            self.client.get(reverse(name), {'draw': 1, 'start': 0, 'length': 50})
+
+    def ladder_datatable(self):
+        self.datatable('ladder_datatable')
+
+    def challenge_datatable(self):
+        self.datatable('challenge_datatable')
+
+    def match_datatable(self):
+        self.datatable('match_datatable')
+
+    def play_match(self):
+        match = self.open_challenge()
+        self.login(match.challenger)
+        data = {
+            'game_0_winner': match.challenger_id,
+            'game_0_balled': '---',
+            'game_1_winner': match.opponent_id,
+            'game_1_balled': '---',
+            'game_2_winner': match.challenger_id,
+            'game_2_balled': '---'
+        }
+
+        with self.measure() as sample, sample.recording():
+            self.client.post(reverse('play_match', kwargs={'pk': match.pk}), data)
+
+    def balled(self):
+        match = self.open_challenge()
+
+        with self.measure() as sample, sample.recording():
+            record_result(match, [(match.opponent, match.challenger), (None, None), (None, None)])
+
+    def new_season(self):
+        user, created = User.objects.get_or_create(username='benchmark', defaults={'is_superuser': True})
+        user.set_password(PASSWORD)
+        user.save()
+        self.login(user)
+
+        with self.measure() as sample, sample.recording():
+            self.client.get(reverse('new-season'))
+
+    def match_data(self):
+        with self.measure() as sample, sample.recording():
+            response = self.client.get(
+                reverse('match-data', kwargs={'season': 0}),
+                HTTP_HTTP_AUTH_TOKEN='pool-token {}'.format(settings.DATA_SECRET_TOKEN)
+            )
+            b''.join(response.streaming_content)
+
+    def fanout(self):
+        users = list(User.objects.filter(userprofile__isnull=False).order_by('userprofile__rank')[:self.sockets])
+
+        # date the earlier scenarios' changes back out of the diff's overlap so it only carries this result
+        earlier = now() - OVERLAP * 2
+        UserProfile.objects.filter(updated__gt=earlier).update(updated=earlier)
+        Match.objects.filter(updated__gt=earlier).update(updated=earlier)
+
+        ladder_diff = LadderDiff()
+        match = self.open_challenge()
+
+        # a result for the coordinator to send out
+        if match is not None:
+            record_result(match, [(match.challenger, None), (match.challenger, None), (None, None)])
+
+        async_to_sync(self.fan_out)(users, ladder_diff)
+
+    async def fan_out(self, users, ladder_diff):
+        """
+        connect a socket for each user then time working out the diff and getting it to all of them
+        """
+        sockets = []
+
+        for user in users:
+            socket = WebsocketCommunicator(MainConsumer, '/pool-ladder/')
+            socket.scope['user'] = user
+            await socket.connect()
+            sockets.append(socket)
+
+        def diff(sample):
+            with sample.recording():
+                return ladder_diff.diff(TABLES)
+
+        try:
+            with self.measure() as sample:
+                patch = await database_sync_to_async(diff)(sample)
+                await get_channel_layer().group_send('pool_ladder', dict(patch, type='ladder.diff'))
+                await asyncio.gather(*[socket.receive_json_from(timeout=60) for socket in sockets])
+                sample.messages += len(sockets) + 1
+        finally:
+            for socket in sockets:
+                await socket.disconnect()
+
+
+SCENARIOS = [
+    'ladder_datatable',
+    'challenge_datatable',
+    'match_datatable',
+    'play_match',
+    'balled',
+    'new_season',
+    'match_data',
+    'fanout'
+]
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return a description of everything in the results that has gone over its baseline.
+    Query counts are deterministic for a generated ladder so any increase counts, timings can go over by tolerance
+    """
+    regressions = []
+
+    for size, scenarios in sorted(results.items()):
+        for name, result in sorted(scenarios.items()):
+            expected = baseline.get(size, {}).get(name)
+
+            if expected is None:
+                continue
+
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    '{} players {}: {} queries, up from {}'.format(size, name, result['queries'], expected['queries'])
+                )
+
+            if result['wall_time'] > expected['wall_time'] * (1 + tolerance):
+                regressions.append(
+                    '{} players {}: {:.3f}s, up from {:.3f}s'.format(
+                        size, name, result['wall_time'], expected['wall_time']
+                    )
+                )
+
+    return regressions
+
+
+def load(path):
+    with open(path) as results:
+        return json.load(results)
+
+
+def save(results, path):
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
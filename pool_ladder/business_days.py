@@ -0,0 +1,162 @@
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.dateparse import parse_date, parse_time
+from django.utils.timezone import localdate, localtime, make_aware
+
+# days covered by the lookup table, which starts a little before today and is rebuilt as the days roll on
+HORIZON = 400
+LOOKBACK = 30
+
+_lock = threading.Lock()
+_calendar = None
+
+
+@lru_cache(maxsize=8)
+def parse_holidays(holidays):
+    return frozenset(parse_date(holiday) for holiday in holidays)
+
+
+def holidays():
+    """
+    return the dates from settings.HOLIDAYS, which can be dates or ISO 8601 strings
+    """
+    return parse_holidays(tuple(str(holiday) for holiday in settings.HOLIDAYS))
+
+
+@lru_cache(maxsize=8)
+def parse_working_hours(working_hours):
+    opens, closes = working_hours.split('-')
+    return parse_time(opens.strip()), parse_time(closes.strip())
+
+
+def working_hours():
+    """
+    return the (opens, closes) times from settings.WORKING_HOURS, or None if challenges run around the clock
+    """
+    if not settings.WORKING_HOURS:
+        return None
+
+    return parse_working_hours(settings.WORKING_HOURS)
+
+
+def is_business_day(day, closed=None):
+    return day.weekday() < 5 and day not in (holidays() if closed is None else closed)
+
+
+class BusinessCalendar(object):
+    """
+    A lookup table of the business days from origin over the horizon.
+    first[offset] is the position in days of the first business day on or after origin + offset,
+    so moving a date on by business days is two lookups rather than a walk over the days in between
+    """
+    def __init__(self, origin, closed, horizon=HORIZON):
+        self.origin = origin
+        self.closed = closed
+        dates = [origin + timedelta(days=offset) for offset in range(horizon)]
+        self.days = [day for day in dates if is_business_day(day, closed)]
+        self.first = [bisect_left(self.days, day) for day in dates]
+
+    def covers(self, day, closed):
+        return closed == self.closed and 0 <= (day - self.origin).days < len(self.first)
+
+    def add(self, day, days):
+        """
+        return the business day the given number of days on from day, or None if it is past the horizon
+        """
+        offset = (day - self.origin).days
+
+        if days == 0:
+            position = self.first[offset]
+        elif offset + 1 < len(self.first):
+            position = self.first[offset + 1] + days - 1
+        else:
+            return None
+
+        if position >= len(self.days):
+            return None
+
+        return self.days[position]
+
+
+def calendar(day):
+    """
+    return the lookup table covering day, building a new one if the holidays have changed or day is outside it
+    """
+    global _calendar
+    closed = holidays()
+
+    if _calendar is not None and _calendar.covers(day, closed):
+        return _calendar
+
+    today = localdate()
+
+    if not today - timedelta(days=LOOKBACK) <= day < today + timedelta(days=HORIZON - LOOKBACK):
+        # far from today so not worth keeping
+        return None
+
+    with _lock:
+        if _calendar is None or not _calendar.covers(day, closed):
+            _calendar = BusinessCalendar(today - timedelta(days=LOOKBACK), closed)
+
+        return _calendar
+
+
+def step_business_days(day, days):
+    if days == 0 and not is_business_day(day):
+        days = 1
+
+    while days > 0:
+        day += timedelta(days=1)
+
+        if is_business_day(day):
+            days -= 1
+
+    return day
+
+
+def add_business_days(start, days):
+    """
+    Move start on by the given number of business days, keeping the time of day.
+    Each day moves to the next business day so a weekend or holiday start counts its first day as the next business
+    day, which gives the same results as pandas' BDay when there are no holidays
+    """
+    table = calendar(start.date())
+    day = table.add(start.date(), days) if table is not None else None
+
+    if day is None:
+        day = step_business_days(start.date(), days)
+
+    return start + timedelta(days=(day - start.date()).days)
+
+
+def start_of_work(start):
+    """
+    return start, or the opening of the next working day if it is outside the working hours
+    """
+    opens, closes = working_hours()
+    local = localtime(start)
+
+    if is_business_day(local.date()) and opens <= local.time() < closes:
+        return start
+
+    day = local.date()
+
+    if not is_business_day(day) or local.time() >= closes:
+        day = step_business_days(day, 1)
+
+    return make_aware(datetime.combine(day, opens))
+
+
+def challenge_deadline(challenge_time, days_to_play):
+    """
+    Return when a challenge made at challenge_time runs out.
+    With working hours set, one made outside them counts from the opening of the next working day
+    """
+    if working_hours() is not None:
+        challenge_time = start_of_work(challenge_time)
+
+    return add_business_days(challenge_time, days_to_play)
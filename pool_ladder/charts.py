@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db import transaction
+
+# bumped whenever the whole ladder or its length changes, which drops every cached chart at once
+GENERATION_KEY = 'rank_chart:generation'
+
+
+def chart_key(generation, user_id):
+    return 'rank_chart:{}:{}'.format(generation, user_id)
+
+
+def get_generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def get_cached_rank_chart(user_id):
+    """
+    return the cached history, and the chart last drawn from it with the rank and day it was drawn for, or None if
+    the history needs reading again
+    """
+    return cache.get(chart_key(get_generation(), user_id))
+
+
+def cache_rank_chart(user_id, series, rank, day, svg):
+    cache.set(chart_key(get_generation(), user_id), {'series': series, 'rank': rank, 'day': day, 'svg': svg}, None)
+
+
+def invalidate_rank_charts(user_ids):
+    """
+    Drop the cached charts for the given users once the current transaction commits
+    """
+    user_ids = list(user_ids)
+
+    def invalidate():
+        generation = get_generation()
+        cache.delete_many([chart_key(generation, user_id) for user_id in user_ids])
+
+    transaction.on_commit(invalidate)
+
+
+def invalidate_all_rank_charts():
+    """
+    Drop every cached chart, used when the whole ladder or the range of ranks changes
+    """
+    def invalidate():
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, None)
+
+    transaction.on_commit(invalidate)
+
+
+def render_rank_chart(ranks, max_rank):
+    """
+    Render the rank movements as a data uri.
+    pygal is only needed to draw a chart so it is loaded the first time one isn't found in the cache
+    """
+    from pool_ladder import rank_chart
+
+    return rank_chart.render(ranks, max_rank)
@@ -1,103 +1,83 @@
-import json
+import asyncio
 
-import requests
-from asgiref.sync import async_to_sync
-from channels.consumer import SyncConsumer
-from channels.generic.websocket import JsonWebsocketConsumer
-from channels.layers import get_channel_layer
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
-from django.utils.timezone import now
 
-from pool_ladder.models import Match, Season
+from pool_ladder.availability import LadderAvailability
+from pool_ladder.diffs import LadderDiff
+from pool_ladder.fanout import FANOUT_STATS, TABLES
+from pool_ladder.metrics import measure
+from pool_ladder.models import Match, Season, UserProfile
+from pool_ladder.notifications import deliver, get_executor
 
 
-class MainConsumer(JsonWebsocketConsumer):
-    def connect(self):
+class MainConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Each socket has a bounded outbox drained by its own task.
+    Table redraws are merged while one is waiting and anything else waits for space,
+    which stops this socket reading from the channel layer until the browser catches up
+    """
+    async def connect(self):
         """
         Add channel to the necessary groups. Initiate data scan
         """
         # accept the web socket connection
-        self.accept()
+        await self.accept()
 
-        # add the channel to the necessary groups
-        async_to_sync(self.channel_layer.group_add)('pool_ladder', self.channel_name)
+        self.outbox = asyncio.Queue(maxsize=settings.SOCKET_SEND_QUEUE)
+        self.dirty = set()
+        self.sender = asyncio.ensure_future(self.send_outbox())
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'check.challenges'
-            }
-        )
+        # add the channel to the necessary groups
+        await self.channel_layer.group_add('pool_ladder', self.channel_name)
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         """
         disconnect from the websocket so remove from groups
         """
-        async_to_sync(self.channel_layer.group_discard)('pool_ladder', self.channel_name)
-        self.close()
+        await self.channel_layer.group_discard('pool_ladder', self.channel_name)
 
-    def send_users(self, event):
-        """
-        update the user ladder
-        """
-        # clear the table
-        self.send_json({'message_type': 'users'})
+        if hasattr(self, 'sender'):
+            self.sender.cancel()
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'check.challenges'
-            }
-        )
-
-    def send_challenges(self, event):
-        """
-        update the matches to be played
-        """
-        # clear the table
-        self.send_json({'message_type': 'challenges'})
+    async def send_outbox(self):
+        while True:
+            content = await self.outbox.get()
 
-        if not event.get('ignore_users'):
-            async_to_sync(get_channel_layer().group_send)(
-                'pool_ladder',
-                {
-                    'type': 'send.users'
-                }
-            )
+            if content is None:
+                # a table redraw, sent with every table that has changed since it was queued
+                content = {'message_type': 'tables', 'tables': [table for table in TABLES if table in self.dirty]}
+                self.dirty = set()
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'check.challenges'
-            }
-        )
+            await self.send_json(content)
+            FANOUT_STATS['socket_messages'] += 1
 
-    def send_matches(self, event):
+    async def tables_dirty(self, event):
         """
-        update the played matches
+        tell the browser which tables need redrawing.
+        the fan out coordinator has already merged the changes so nothing is sent on from here
         """
-        # clear the table
-        self.send_json({'message_type': 'matches'})
+        with measure('MainConsumer.tables_dirty') as sample:
+            queued = bool(self.dirty)
+            self.dirty.update(event.get('tables', []))
 
-        if not event.get('ignore_users'):
-            async_to_sync(get_channel_layer().group_send)(
-                'pool_ladder',
-                {
-                    'type': 'send.users'
-                }
-            )
+            if not queued:
+                await self.outbox.put(None)
+                sample.messages += 1
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'check.challenges'
-            }
-        )
+    async def ladder_diff(self, event):
+        """
+        pass the rows that have changed on to the browser
+        """
+        with measure('MainConsumer.ladder_diff') as sample:
+            await self.outbox.put({'message_type': 'diff', 'seq': event['seq'], 'tables': event['tables']})
+            sample.messages += 1
 
-    def receive_json(self, content, **kwargs):
+    async def receive_json(self, content, **kwargs):
         message_type = content.get('message_type')
 
         if message_type is None:
@@ -105,135 +85,159 @@ class MainConsumer(JsonWebsocketConsumer):
             return
 
         if message_type == 'challenge':
-            challenger = self.scope['user']
+            with measure('MainConsumer.challenge') as sample:
+                message = await self.challenge(sample, self.scope['user'], content.get('opponent'))
 
-            try:
-                opponent = User.objects.get(pk=content.get('opponent'))
-            except User.DoesNotExist:
-                print('no opponent found for pk {}'.format(content.get('opponent')))
-                return
-
-            if not challenger.userprofile.is_available:
-                self.send_json(
-                    {
-                        'message_type': 'messages',
-                        'text': render_to_string(
-                            'pool_ladder/fragments/message.html',
-                            {
-                                'message': 'You are not available to make this challenge',
-                                'tag': 'danger'
-                            }
-                        )
-                    }
-                )
-                return
-
-            if opponent.userprofile.has_open_challenge:
-                self.send_json(
-                    {
-                        'message_type': 'messages',
-                        'text': render_to_string(
-                            'pool_ladder/fragments/message.html',
-                            {
-                                'message': '{} is already being chalenged'.format(opponent),
-                                'tag': 'danger'
-                            }
-                        )
-                    }
-                )
-                return
-
-            if opponent.userprofile.can_challenge(challenger):
-                try:
-                    Match.objects.create(
-                        challenger=challenger,
-                        opponent=opponent,
-                        challenger_rank=challenger.userprofile.rank,
-                        opponent_rank=opponent.userprofile.rank,
-                        season=Season.objects.all().first()
-                    )
-                except Exception as e:
-                    self.send_json(
+                if message is not None:
+                    await self.outbox.put(
                         {
                             'message_type': 'messages',
                             'text': render_to_string(
                                 'pool_ladder/fragments/message.html',
                                 {
-                                    'message': 'There was a problem creating the challenge: {}'.format(e),
+                                    'message': message,
                                     'tag': 'danger'
                                 }
                             )
                         }
                     )
-            else:
-                print('{} cannot challenge {}'.format(challenger, opponent))
+                    sample.messages += 1
+
+    @database_sync_to_async
+    def challenge(self, sample, challenger, opponent_pk):
+        """
+        Create a challenge against the opponent if the challenger is allowed to.
+        All of the database work for a challenge happens here in one go, recorded against the sample.
+        Returns a message for the challenger if it couldn't be created
+        """
+        with sample.recording():
+            return self.create_challenge(challenger, opponent_pk)
+
+    def create_challenge(self, challenger, opponent_pk):
+        try:
+            opponent = User.objects.get(pk=opponent_pk)
+        except User.DoesNotExist:
+            print('no opponent found for pk {}'.format(opponent_pk))
+            return None
+
+        availability = LadderAvailability.for_users(challenger, opponent)
+
+        try:
+            challenger_profile = availability.profile_for(challenger)
+            opponent_profile = availability.profile_for(opponent)
+        except UserProfile.DoesNotExist:
+            print('no profile found for {} or {}'.format(challenger, opponent))
+            return None
+
+        if not availability.is_available(challenger_profile):
+            return 'You are not available to make this challenge'
+
+        if availability.has_open_challenge(opponent_profile):
+            return '{} is already being chalenged'.format(opponent)
+
+        if not availability.can_challenge(opponent_profile, challenger):
+            print('{} cannot challenge {}'.format(challenger, opponent))
+            return None
+
+        try:
+            Match.objects.create(
+                challenger=challenger,
+                opponent=opponent,
+                challenger_rank=challenger_profile.rank,
+                opponent_rank=opponent_profile.rank,
+                season=Season.objects.all().first()
+            )
+        except Exception as e:
+            return 'There was a problem creating the challenge: {}'.format(e)
+
+        return None
+
+
+class FanoutConsumer(AsyncConsumer):
+    """
+    Merge table invalidations over a short window then work out what changed once and send the same diff
+    to every socket
+    """
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.dirty = set()
+        self.flush_scheduled = False
+        self.ladder_diff = LadderDiff()
+        # diffs are worked out one at a time so their sequence numbers go out in order
+        self.diffing = asyncio.Lock()
+
+    async def tables_dirty(self, event):
+        self.dirty.update(event.get('tables', []))
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.flush_scheduled:
+            return
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'check.challenges'
-            }
-        )
+        self.flush_scheduled = True
+        asyncio.ensure_future(self.flush())
 
-    @staticmethod
-    def check_challenges(event):
+    async def flush(self):
         """
-        Ensure that no challenge has expired
+        wait for the window to close then send everything that changed in it
         """
-        for challenge in Match.objects.filter(played__isnull=True, declined=False):
-            if challenge.time_until < now():
-                # challenge has timed out so the challenger automatically wins
-                challenge.start_match()
+        await asyncio.sleep(settings.FANOUT_WINDOW)
 
-                game_0 = challenge.game_set.get(index=0)
-                game_0.winner = challenge.challenger
-                game_0.save()
+        tables = [table for table in TABLES if table in self.dirty]
+        self.dirty = set()
+        self.flush_scheduled = False
+
+        if not tables:
+            return
+
+        async with self.diffing:
+            try:
+                diff = await database_sync_to_async(self.ladder_diff.diff)(tables)
+            except Exception as e:
+                # the browsers can still fetch the tables themselves
+                print('could not work out the diff for {}: {}'.format(tables, e))
+                message = {'type': 'tables.dirty', 'tables': tables}
+            else:
+                message = dict(diff, type='ladder.diff')
 
-                game_1 = challenge.game_set.get(index=1)
-                game_1.winner = challenge.challenger
-                game_1.save()
+            await self.channel_layer.group_send('pool_ladder', message)
+            FANOUT_STATS['group_messages'] += 1
 
-                challenge.set_winner_and_loser()
-                challenge.save()
 
+class NotificationConsumer(AsyncConsumer):
+    """
+    Collects notifications over NOTIFICATION_WINDOW and hands each batch to the notification threads
+    so a burst like a forfeit sweep becomes one slack post and slow deliveries don't hold up the worker
+    """
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.pending = {'slack': [], 'email': []}
+        self.flush_scheduled = {'slack': False, 'email': False}
 
-class NotificationConsumer(SyncConsumer):
-    @staticmethod
-    def email(event):
+    async def email(self, event):
         """
         send a challenge by email
         """
-        if not settings.FROM_EMAIL:
-            return
+        self.queue('email', event)
 
-        send_mail(
-            '{} Challenge'.format(settings.LADDER_NAME),
-            '{} has challenged you to a {} match.\n'
-            'It needs to be played by {} or you will forfeit'.format(
-                event.get('challenger'),
-                settings.LADDER_NAME,
-                event.get('time_until')
-            ),
-            '<{}>{}'.format(settings.FROM_EMAIL, settings.LADDER_NAME),
-            [
-                event.get('email')
-            ]
-        )
-        print('notified {} by email'.format(event.get('email')))
-
-    @staticmethod
-    def slack(event):
+    async def slack(self, event):
         """
         Send challenge notification by slack
         """
-        if settings.SLACK_WEBHOOK_URL:
-            requests.post(
-                url=settings.SLACK_WEBHOOK_URL,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(
-                    {
-                        'text': event.get('message')
-                    }
-                )
-            )
-            print('notified by slack')
+        self.queue('slack', event.get('message'))
+
+    def queue(self, kind, item):
+        self.pending[kind].append(item)
+
+        if not self.flush_scheduled[kind]:
+            self.flush_scheduled[kind] = True
+            asyncio.ensure_future(self.flush(kind))
+
+    async def flush(self, kind):
+        await asyncio.sleep(settings.NOTIFICATION_WINDOW)
+
+        items = self.pending[kind]
+        self.pending[kind] = []
+        self.flush_scheduled[kind] = False
+
+        await asyncio.get_event_loop().run_in_executor(get_executor(), deliver, kind, items)
@@ -0,0 +1,183 @@
+import hashlib
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views import View
+
+from pool_ladder.fanout import table_version
+from pool_ladder.metrics import MeasuredView
+
+
+class Column(object):
+    """
+    A datatables column.
+    order_by lists the model fields it sorts on and search lists the lookups used to match a search term
+    """
+    def __init__(self, name, order_by=None, search=None):
+        self.name = name
+        self.order_by = order_by or []
+        self.search = search or []
+
+
+def get_int(request, name, default=0):
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_filter(ordering, values):
+    """
+    return a Q selecting the rows that come after the given values in the ordering
+    """
+    after = Q()
+
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        clause = Q(**{'{}__{}'.format(name, 'lt' if field.startswith('-') else 'gt'): values[index]})
+
+        for previous, value in zip(ordering[:index], values[:index]):
+            clause &= Q(**{previous.lstrip('-'): value})
+
+        after |= clause
+
+    return after
+
+
+class DataTablesView(MeasuredView, LoginRequiredMixin, View):
+    """
+    Server side processing for datatables.
+    Only declared columns can be searched or ordered. Requests the ladder snapshot can answer don't touch the
+    database, otherwise counts and page boundaries are cached against the version of the table so sequential
+    pages are read with a keyset rather than an offset
+    """
+    # the fan out table whose changes invalidate anything cached for this view
+    table = None
+    model = None
+    columns = []
+    default_order = []
+    paginate = True
+
+    def get_queryset(self, request, **kwargs):
+        return self.model.objects.all()
+
+    def get_rows(self, request, objects, **kwargs):
+        """
+        return a cell for each column, read from the attribute of the same name
+        """
+        return [[str(getattr(obj, column.name, '')) for column in self.columns] for obj in objects]
+
+    def get_data(self, request, objects, **kwargs):
+        """
+        return the rows for the response, along with anything else the browser needs to draw them
+        """
+        return {'data': self.get_rows(request, objects, **kwargs)}
+
+    def cache_key(self, kwargs, *parts):
+        key = ':'.join([str(part) for part in [table_version(self.table), sorted(kwargs.items())] + list(parts)])
+        return 'datatable:{}:{}'.format(type(self).__name__, hashlib.md5(key.encode()).hexdigest())
+
+    def search_filter(self, search):
+        search_filter = Q()
+
+        for column in self.columns:
+            for lookup in column.search:
+                search_filter |= Q(**{lookup: search})
+
+        return search_filter
+
+    def get_ordering(self, request):
+        ordering = list(self.default_order)
+        index = get_int(request, 'order[0][column]', None)
+
+        if index is not None and 0 <= index < len(self.columns) and self.columns[index].order_by:
+            descending = request.GET.get('order[0][dir]') == 'desc'
+            ordering = [
+                '-{}'.format(field) if descending else field for field in self.columns[index].order_by
+            ]
+
+        # always finish on the primary key so every row has a unique position
+        ordering.append('-pk' if ordering and ordering[0].startswith('-') else 'pk')
+        return ordering
+
+    def get_page(self, queryset, ordering, start, length, kwargs, search):
+        """
+        return one page of objects, continuing from the end of the previous page when it is known
+        """
+        boundary = None
+
+        if start:
+            boundary = cache.get(self.cache_key(kwargs, 'page', ordering, search, start))
+
+        if boundary is not None:
+            objects = list(queryset.filter(keyset_filter(ordering, boundary))[:length])
+        else:
+            objects = list(queryset[start:start + length])
+
+        if len(objects) == length:
+            last = objects[-1]
+            cache.set(
+                self.cache_key(kwargs, 'page', ordering, search, start + length),
+                [getattr(last, field.lstrip('-')) for field in ordering]
+            )
+
+        return objects
+
+    def get_snapshot_page(self, ordering, start, length, **kwargs):
+        """
+        return the objects and total for the request from the ladder snapshot, or None if it can't answer it
+        """
+        return None
+
+    def query(self, request, search, ordering, start, length, kwargs):
+        """
+        return the objects, total and filtered total for the request from the database
+        """
+        queryset = self.get_queryset(request, **kwargs)
+
+        total_key = self.cache_key(kwargs, 'total')
+        records_total = cache.get(total_key)
+
+        if records_total is None:
+            records_total = queryset.count()
+            cache.set(total_key, records_total)
+
+        records_filtered = records_total
+
+        if search:
+            queryset = queryset.filter(self.search_filter(search))
+            records_filtered = queryset.count()
+
+        queryset = queryset.order_by(*ordering)
+
+        if self.paginate and length > 0:
+            objects = self.get_page(queryset, ordering, start, length, kwargs, search)
+        else:
+            objects = list(queryset)
+
+        return objects, records_total, records_filtered
+
+    def get(self, request, **kwargs):
+        draw = get_int(request, 'draw')
+        start = max(get_int(request, 'start'), 0)
+        length = get_int(request, 'length')
+
+        search = request.GET.get('search[value]', '').strip()
+        ordering = self.get_ordering(request)
+        page = None if search else self.get_snapshot_page(ordering, start, length, **kwargs)
+
+        if page is not None:
+            objects, records_total = page
+            records_filtered = records_total
+        else:
+            objects, records_total, records_filtered = self.query(request, search, ordering, start, length, kwargs)
+
+        response = {
+            'draw': draw,
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+        }
+        response.update(self.get_data(request, objects, **kwargs))
+        return JsonResponse(response)
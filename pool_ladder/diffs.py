@@ -0,0 +1,251 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from pool_ladder.availability import LadderAvailability
+from pool_ladder.fragments import cached_rows, render_fragment, stamp
+from pool_ladder.models import Match, UserProfile
+
+# rows saved this long before the last diff are sent again in case their transaction committed after it
+OVERLAP = timedelta(seconds=60)
+
+
+def ladder_rows(availability, profiles):
+    """
+    The viewer independent form of each ladder row.
+    Each viewer sees either the challenge button or the status, see ladder_cells
+    """
+    cells = cached_rows(
+        'ladder',
+        profiles,
+        lambda profile: [
+            render_fragment('user_rank', {'profile': profile, 'swag': availability.swag(profile)}),
+            render_fragment('user_name', {'profile': profile}),
+            render_fragment('user_available', {'profile': profile, 'can_challenge': True})
+        ],
+        # swag depends on the rest of the ladder so it is part of the version
+        version=lambda profile: '{}:{}'.format(stamp(profile), ','.join(availability.swag(profile)))
+    )
+    return [
+        {
+            'id': profile.user_id,
+            'rank': profile.rank,
+            'available': availability.is_available(profile),
+            'has_open_challenge': availability.has_open_challenge(profile),
+            'cells': [rank, name],
+            'challenge': button,
+            'status': render_fragment(
+                'user_available',
+                {
+                    'profile': profile,
+                    'has_open_challenge': availability.has_open_challenge(profile),
+                    'in_cool_down': availability.in_cool_down(profile),
+                    'time_available': availability.time_available(profile),
+                }
+            )
+        } for profile, (rank, name, button) in zip(profiles, cells)
+    ]
+
+
+def ladder_cells(row, viewer):
+    """
+    the cells of a ladder row as seen by the viewer, given as their own ladder row (or None if they aren't on it).
+    the same choice is made in the browser when a diff is applied
+    """
+    can_challenge = (
+        viewer is not None
+        and viewer['available']
+        and viewer['rank'] > row['rank'] >= viewer['rank'] - 2
+        and not row['has_open_challenge']
+    )
+    return row['cells'] + [row['challenge'] if can_challenge else row['status']]
+
+
+def challenge_rows(challenges, can_decline=None):
+    """
+    The viewer independent form of each challenge row, with the actions each player in it sees.
+    can_decline maps opponents to whether they can decline, it is worked out for each row if not given
+    """
+    if can_decline is None:
+        can_decline = decline_rights(challenges)
+
+    cells = cached_rows(
+        'challenges',
+        challenges,
+        lambda challenge: [
+            render_fragment('challenge_time', {'challenge': challenge}),
+            render_fragment('challenge_challenger', {'challenge': challenge}),
+            render_fragment('challenge_opponent', {'challenge': challenge})
+        ]
+    )
+    return [
+        {
+            'id': challenge.pk,
+            'challenge_time': challenge.challenge_time.isoformat(),
+            'cells': [
+                challenge_time,
+                render_fragment('challenge_time_until', {'challenge': challenge}),
+                challenger,
+                opponent
+            ],
+            'actions': {
+                str(user.pk): render_fragment(
+                    'challenge_action',
+                    {
+                        'challenge': challenge,
+                        'logged_in_user': user.username,
+                        'max_days': challenge.days_to_play == settings.MAX_DAYS_TO_PLAY,
+                        'can_decline': can_decline.get(challenge.opponent_id, False)
+                    }
+                ).strip() for user in [challenge.challenger, challenge.opponent]
+            }
+        } for challenge, (challenge_time, challenger, opponent) in zip(challenges, cells)
+    ]
+
+
+def decline_rights(challenges):
+    """
+    return whether the opponent of each challenge can decline it
+    """
+    return {challenge.opponent_id: challenge.opponent.userprofile.can_decline() for challenge in challenges}
+
+
+def challenge_cells(row, viewer):
+    return row['cells'] + [row['actions'].get(str(viewer.pk), '')]
+
+
+def match_rows(matches):
+    cells = cached_rows(
+        'matches',
+        matches,
+        lambda match: [
+            render_fragment('match_link', {'match': match}),
+            render_fragment('match_winner', {'match': match}),
+            render_fragment('match_loser', {'match': match})
+        ]
+    )
+    return [
+        {
+            'id': match.pk,
+            'played': match.played.isoformat(),
+            'cells': row
+        } for match, row in zip(matches, cells)
+    ]
+
+
+def open_challenges():
+    return Match.objects.filter(
+        played__isnull=True,
+        declined=False
+    ).select_related(
+        'challenger',
+        'opponent__userprofile'
+    )
+
+
+def played_matches():
+    return Match.objects.filter(
+        played__isnull=False,
+        declined=False
+    ).select_related(
+        'season',
+        'challenger',
+        'winner',
+        'loser'
+    ).prefetch_related(
+        'game_set'
+    )
+
+
+class LadderDiff(object):
+    """
+    Works out which rows have changed since the last diff, using the updated stamps,
+    so the coordinator can send the same patch to every socket.
+    Each diff has the next sequence number so a browser that misses one knows to fetch the tables again
+    """
+    def __init__(self):
+        self.seq = 0
+        self.since = now()
+        # the users at the top and bottom of the ladder, whose swag changes without them being saved
+        self.extremes = set()
+        # the rows each table was last sent with, so rows looked at again in the overlap aren't resent unchanged
+        self.sent = {}
+
+    def changes(self, table, upsert, remove):
+        """
+        return the patch for a table, leaving out rows the browsers already have
+        """
+        current = {row['id']: row for row in upsert}
+        current.update({pk: None for pk in remove})
+
+        sent = self.sent.get(table, {})
+        self.sent[table] = current
+
+        return {
+            'upsert': [row for row in upsert if sent.get(row['id']) != row],
+            'remove': [pk for pk in remove if pk not in sent or sent[pk] is not None]
+        }
+
+    def diff(self, tables):
+        since = self.since - OVERLAP
+        self.since = now()
+
+        changed = Match.objects.filter(updated__gte=since)
+        patch = {}
+
+        if 'challenges' in tables:
+            challenges = list(changed.select_related('challenger', 'opponent__userprofile'))
+            patch['challenges'] = self.changes(
+                'challenges',
+                challenge_rows(
+                    [challenge for challenge in challenges if not challenge.played and not challenge.declined]
+                ),
+                [challenge.pk for challenge in challenges if challenge.played or challenge.declined]
+            )
+
+        if 'matches' in tables:
+            patch['matches'] = self.changes(
+                'matches',
+                match_rows(list(played_matches().filter(updated__gte=since).order_by('-played', '-pk'))),
+                []
+            )
+
+        if 'users' in tables:
+            # the players of changed matches have new open challenges or cool downs
+            user_ids = set(UserProfile.objects.filter(updated__gte=since).values_list('user_id', flat=True))
+
+            for challenger_id, opponent_id in changed.values_list('challenger_id', 'opponent_id'):
+                user_ids.update([challenger_id, opponent_id])
+
+            profiles = list(UserProfile.objects.filter(user_id__in=user_ids).select_related('user'))
+            availability = LadderAvailability(profiles, users=list(user_ids))
+
+            extremes = set(
+                UserProfile.objects.filter(
+                    active=True,
+                    rank__in=[availability.min_rank, availability.max_rank]
+                ).values_list(
+                    'user_id',
+                    flat=True
+                )
+            )
+
+            if extremes != self.extremes:
+                missing = (extremes | self.extremes) - user_ids
+                self.extremes = extremes
+
+                if missing:
+                    extra = list(UserProfile.objects.filter(user_id__in=missing).select_related('user'))
+                    availability = LadderAvailability(profiles + extra, users=list(user_ids | missing))
+                    profiles += extra
+
+            active = [profile for profile in profiles if profile.active]
+            patch['users'] = self.changes(
+                'users',
+                ladder_rows(availability, active),
+                [profile.user_id for profile in profiles if not profile.active]
+            )
+
+        self.seq += 1
+        return {'seq': self.seq, 'tables': patch}
@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import time
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from pool_ladder.models import Match
+from pool_ladder.results import record_result
+
+
+def forfeit_challenge(pk):
+    """
+    Forfeit the challenge if it is still open and its time has run out.
+    The match row is locked so it can only ever be forfeited once
+    """
+    with transaction.atomic():
+        try:
+            challenge = Match.objects.select_for_update(of=('self',)).select_related('challenger').get(
+                pk=pk,
+                played__isnull=True,
+                declined=False
+            )
+        except Match.DoesNotExist:
+            return False
+
+        if challenge.time_until >= now():
+            # a day has been added since this was scheduled
+            return False
+
+        # challenge has timed out so the challenger automatically wins
+        record_result(
+            challenge,
+            [
+                (challenge.challenger, None),
+                (challenge.challenger, None),
+                (None, None)
+            ],
+            forfeit=True
+        )
+
+    print('forfeited {}'.format(challenge))
+    return True
+
+
+def expired_challenges(at=None):
+    """
+    return the open challenges whose deadline has passed
+    """
+    return Match.objects.filter(played__isnull=True, declined=False, deadline__lt=at or now())
+
+
+def forfeit_expired():
+    """
+    forfeit every challenge that has run out, found with a single query on the deadline
+    """
+    return len([pk for pk in expired_challenges().values_list('pk', flat=True) if forfeit_challenge(pk)])
+
+
+class ExpiryScheduler(object):
+    """
+    Keep the open challenges in a min-heap keyed on their deadline and forfeit each one as it comes due.
+    Changed deadlines are pushed as new entries and the stale ones are skipped when they reach the top
+    """
+    def __init__(self):
+        self.heap = []
+        self.deadlines = {}
+        self.resync_at = 0
+
+    def load(self):
+        """
+        rebuild the heap from the open challenges in the database
+        """
+        self.heap = []
+        self.deadlines = {}
+
+        for pk, deadline in Match.objects.filter(
+            played__isnull=True,
+            declined=False,
+            deadline__isnull=False
+        ).values_list(
+            'pk',
+            'deadline'
+        ):
+            self.schedule(pk, deadline.timestamp())
+
+        self.resync_at = time.time() + settings.EXPIRY_RESYNC
+        print('scheduled {} open challenges'.format(len(self.deadlines)))
+
+    def schedule(self, pk, deadline):
+        """
+        add the challenge or move its deadline
+        """
+        if self.deadlines.get(pk) == deadline:
+            return
+
+        self.deadlines[pk] = deadline
+        heapq.heappush(self.heap, (deadline, pk))
+
+    def cancel(self, pk):
+        self.deadlines.pop(pk, None)
+
+    def next_deadline(self):
+        """
+        return the earliest current deadline, dropping any stale entries on the way
+        """
+        while self.heap:
+            deadline, pk = self.heap[0]
+
+            if self.deadlines.get(pk) == deadline:
+                return deadline
+
+            heapq.heappop(self.heap)
+
+        return None
+
+    def pop_due(self, at):
+        """
+        return the challenges whose deadline has passed
+        """
+        due = []
+
+        while True:
+            deadline = self.next_deadline()
+
+            if deadline is None or deadline > at:
+                return due
+
+            deadline, pk = heapq.heappop(self.heap)
+            del self.deadlines[pk]
+            due.append(pk)
+
+    def forfeit_due(self):
+        forfeited = 0
+
+        for pk in self.pop_due(time.time()):
+            if forfeit_challenge(pk):
+                forfeited += 1
+
+        return forfeited
+
+    def handle(self, message):
+        if message['type'] == 'challenge.scheduled':
+            self.schedule(message['match'], message['deadline'])
+
+        if message['type'] == 'challenge.closed':
+            self.cancel(message['match'])
+
+    def seconds_to_sleep(self):
+        wake_at = self.resync_at
+        deadline = self.next_deadline()
+
+        if deadline is not None:
+            wake_at = min(wake_at, deadline)
+
+        return max(wake_at - time.time(), 0)
+
+    async def run(self):
+        """
+        Sleep until the next deadline, waking early to apply any changes sent by Match.save.
+        One receive is kept waiting across wake ups as cancelling a receive can lose the message it was taking
+        """
+        channel_layer = get_channel_layer()
+        await database_sync_to_async(self.load)()
+        receive = None
+
+        while True:
+            await database_sync_to_async(self.forfeit_due)()
+
+            if receive is None:
+                receive = asyncio.ensure_future(channel_layer.receive('expiry'))
+
+            await asyncio.wait([receive], timeout=self.seconds_to_sleep())
+
+            if not receive.done():
+                if time.time() >= self.resync_at:
+                    # catch anything missed while the scheduler wasn't listening
+                    await database_sync_to_async(self.load)()
+                continue
+
+            message = receive.result()
+            receive = None
+            self.handle(message)
@@ -0,0 +1,213 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from pool_ladder.models import Game
+
+# number of matches read, and parquet rows written, at a time
+CHUNK_SIZE = 500
+
+# exported name and the values() lookup it is read from
+MATCH_COLUMNS = [
+    ('challenge_time', 'challenge_time'),
+    ('season', 'season__number'),
+    ('challenger', 'challenger__username'),
+    ('opponent', 'opponent__username'),
+    ('challenger_rank', 'challenger_rank'),
+    ('opponent_rank', 'opponent_rank'),
+    ('declined', 'declined'),
+    ('days_to_play', 'days_to_play'),
+]
+PLAYED_COLUMNS = [
+    ('played', 'played'),
+    ('winner', 'winner__username'),
+    ('loser', 'loser__username'),
+    ('winner_rank', 'winner_rank'),
+    ('loser_rank', 'loser_rank'),
+    ('winner_rating', 'winner_rating'),
+    ('loser_rating', 'loser_rating'),
+]
+
+# the columns of the flat csv and parquet formats, with each of the three games spread across columns
+FLAT_FIELDS = [name for name, column in MATCH_COLUMNS + PLAYED_COLUMNS] + [
+    'game_{}_{}'.format(index, field) for index in range(3) for field in ['winner', 'balled']
+] + ['updated']
+
+
+def iterate_matches(matches, chunk_size=CHUNK_SIZE):
+    """
+    Yield the serialized form of each match, in the same shape as Match.serialize.
+    Matches are read a chunk at a time by primary key with their names joined in and one query for the games
+    of each chunk so memory and query count don't grow with the export
+    """
+    columns = ['pk', 'updated'] + [column for name, column in MATCH_COLUMNS + PLAYED_COLUMNS]
+    last_pk = 0
+
+    while True:
+        chunk = list(matches.filter(pk__gt=last_pk).order_by('pk').values(*columns)[:chunk_size])
+
+        if not chunk:
+            return
+
+        last_pk = chunk[-1]['pk']
+        games = defaultdict(list)
+
+        for match_id, index, winner, balled in Game.objects.filter(
+            match_id__in=[row['pk'] for row in chunk]
+        ).order_by(
+            'match_id',
+            'index'
+        ).values_list(
+            'match_id',
+            'index',
+            'winner__username',
+            'balled__username'
+        ):
+            games[match_id].append({'index': index, 'winner': winner, 'balled': balled})
+
+        for row in chunk:
+            match = {name: row[column] for name, column in MATCH_COLUMNS}
+
+            if row['played']:
+                match.update({name: row[column] for name, column in PLAYED_COLUMNS})
+                match['games'] = games[row['pk']]
+
+            # lets incremental pulls pass the latest value back as since
+            match['updated'] = row['updated']
+            yield match
+
+        if len(chunk) < chunk_size:
+            return
+
+
+def flatten(match):
+    """
+    return a match with its games spread across the FLAT_FIELDS columns
+    """
+    row = {field: match.get(field) for field in FLAT_FIELDS}
+
+    for game in match.get('games', []):
+        for field in ['winner', 'balled']:
+            name = 'game_{}_{}'.format(game['index'], field)
+
+            if name in row:
+                row[name] = game[field]
+
+    return row
+
+
+def json_stream(matches):
+    yield '['
+
+    for index, match in enumerate(matches):
+        yield '{}{}'.format(',' if index else '', json.dumps(match, cls=DjangoJSONEncoder))
+
+    yield ']'
+
+
+def jsonl_stream(matches):
+    for match in matches:
+        yield '{}\n'.format(json.dumps(match, cls=DjangoJSONEncoder))
+
+
+class Echo(object):
+    """
+    a file that hands back what is written to it so csv rows can be streamed
+    """
+    def write(self, value):
+        return value
+
+
+def csv_stream(matches):
+    writer = csv.DictWriter(Echo(), FLAT_FIELDS)
+    yield writer.writerow({field: field for field in FLAT_FIELDS})
+
+    for match in matches:
+        row = flatten(match)
+
+        for field, value in row.items():
+            if hasattr(value, 'isoformat'):
+                row[field] = value.isoformat()
+
+        yield writer.writerow(row)
+
+
+class ParquetSink(object):
+    """
+    a write only file that keeps what has been written until it is collected
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def collect(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_stream(matches, chunk_size=CHUNK_SIZE):
+    """
+    Write the matches as parquet, one row group per chunk.
+    pyarrow is only needed for this format so it is imported here
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    timestamp = pyarrow.timestamp('us', tz='UTC')
+    types = {
+        'challenge_time': timestamp,
+        'played': timestamp,
+        'updated': timestamp,
+        'season': pyarrow.int64(),
+        'challenger_rank': pyarrow.int64(),
+        'opponent_rank': pyarrow.int64(),
+        'winner_rank': pyarrow.int64(),
+        'loser_rank': pyarrow.int64(),
+        'winner_rating': pyarrow.float64(),
+        'loser_rating': pyarrow.float64(),
+        'days_to_play': pyarrow.int64(),
+        'declined': pyarrow.bool_(),
+    }
+    schema = pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in FLAT_FIELDS])
+
+    sink = ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    rows = []
+
+    def write_rows():
+        writer.write_table(
+            pyarrow.Table.from_pydict({field: [row[field] for row in rows] for field in FLAT_FIELDS}, schema=schema)
+        )
+        del rows[:]
+        return sink.collect()
+
+    for match in matches:
+        rows.append(flatten(match))
+
+        if len(rows) == chunk_size:
+            yield write_rows()
+
+    if rows:
+        yield write_rows()
+
+    writer.close()
+    yield sink.collect()
@@ -0,0 +1,135 @@
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+
+from pool_ladder.metrics import message_sent
+
+TABLES = ['users', 'challenges', 'matches']
+
+# counts of the events sent in this process so that fan out can be checked to be O(N)
+FANOUT_STATS = Counter()
+
+
+def tables_dirty(*tables):
+    """
+    Tell the fan out coordinator that the given tables need redrawing once the current transaction commits.
+    The coordinator merges these over a short window so each socket gets a single message
+    """
+    FANOUT_STATS['saves'] += 1
+
+    def committed():
+        bump_table_versions(tables)
+        send_to_coordinator({'type': 'tables.dirty', 'tables': list(tables)})
+
+    transaction.on_commit(committed)
+
+
+def table_version(table):
+    """
+    return the current version of a table, used to key anything cached from it
+    """
+    return cache.get('table_version:{}'.format(table), 0)
+
+
+def ladder_version():
+    """
+    return the version of the ladder as a whole, which moves whenever any of the tables do
+    """
+    version = cache.get('ladder_version')
+
+    if version is None:
+        # start from the time so a version held by a process is never reused if the cache is cleared
+        cache.add('ladder_version', int(time.time() * 1000), None)
+        version = cache.get('ladder_version')
+
+    return version
+
+
+def bump_table_versions(tables):
+    for table in tables:
+        try:
+            cache.incr('table_version:{}'.format(table))
+        except ValueError:
+            cache.set('table_version:{}'.format(table), 1, None)
+
+    try:
+        cache.incr('ladder_version')
+    except ValueError:
+        cache.add('ladder_version', int(time.time() * 1000), None)
+
+
+def send_to_coordinator(message):
+    try:
+        send('fanout', message)
+    except ChannelFull:
+        # the coordinator is backed up so a flush is already on its way
+        print('fanout channel is full, dropping {}'.format(message))
+        return
+
+    FANOUT_STATS['coordinator_messages'] += 1
+
+
+def send(channel, message):
+    """
+    send a message to one of the worker channels
+    """
+    async_to_sync(get_channel_layer().send)(channel, message)
+    message_sent()
+
+
+def fanout_stats():
+    """
+    return the fan out counters along with the number of events sent for each model save
+    """
+    stats = {key: FANOUT_STATS[key] for key in ['saves', 'coordinator_messages', 'group_messages', 'socket_messages']}
+    events = stats['coordinator_messages'] + stats['group_messages'] + stats['socket_messages']
+    stats['events_per_save'] = (events / stats['saves']) if stats['saves'] else 0
+    return stats
+
+
+def challenge_scheduled(pk, deadline):
+    """
+    Tell the expiry scheduler when an open challenge is due to be forfeited
+    """
+    transaction.on_commit(
+        lambda: send_to_expiry({'type': 'challenge.scheduled', 'match': pk, 'deadline': deadline.timestamp()})
+    )
+
+
+def challenge_closed(pk):
+    """
+    Tell the expiry scheduler that a challenge no longer needs forfeiting
+    """
+    transaction.on_commit(lambda: send_to_expiry({'type': 'challenge.closed', 'match': pk}))
+
+
+def send_to_expiry(message):
+    try:
+        send('expiry', message)
+    except ChannelFull:
+        # the scheduler resyncs from the database periodically so it will catch up
+        print('expiry channel is full, dropping {}'.format(message))
+
+
+def notify_slack(message):
+    """
+    Send a slack message through the notifications worker once the current transaction commits
+    """
+    transaction.on_commit(lambda: send('notifications', {'type': 'slack', 'message': message}))
+
+
+def notify_email(email, challenger, time_until):
+    """
+    Email a challenge through the notifications worker once the current transaction commits
+    """
+    transaction.on_commit(
+        lambda: send(
+            'notifications',
+            {'type': 'email', 'email': email, 'challenger': challenger, 'time_until': time_until}
+        )
+    )
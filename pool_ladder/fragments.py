@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.template.loader import get_template
+
+# how long a rendered row is kept. rows are keyed on their version so this only limits garbage
+ROW_TIMEOUT = 60 * 60 * 24
+
+# compiled fragment templates, loaded once per process
+TEMPLATES = {}
+
+
+def render_fragment(name, context):
+    """
+    render the named template from pool_ladder/fragments with the given context
+    """
+    template = TEMPLATES.get(name)
+
+    if template is None:
+        template = TEMPLATES[name] = get_template('pool_ladder/fragments/{}.html'.format(name))
+
+    return template.render(context)
+
+
+def stamp(obj):
+    """
+    the default version of a row, taken from the last time it was saved
+    """
+    return obj.updated.timestamp()
+
+
+def cached_rows(prefix, objects, render, version=stamp):
+    """
+    Return the shared cells for each object, as returned by render(obj).
+    Rows are cached against the object's pk and version so only new or changed rows are rendered.
+    Anything that depends on the viewer or the current time should be rendered separately
+    """
+    keys = ['fragments:{}:{}:{}'.format(prefix, obj.pk, version(obj)) for obj in objects]
+    rows = cache.get_many(keys)
+    missing = {}
+
+    for key, obj in zip(keys, objects):
+        if key not in rows:
+            rows[key] = missing[key] = render(obj)
+
+    if missing:
+        cache.set_many(missing, ROW_TIMEOUT)
+
+    return [rows[key] for key in keys]
@@ -0,0 +1,58 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.utils.timezone import localdate, make_aware, now
+
+from pool_ladder.models import LadderEvent, UserProfile
+from pool_ladder.standings import ladder_as_of
+
+
+def start_of_day(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def replay(ranks, events, field):
+    """
+    Set each player's rank from the events in the order given, None taking them off the ladder.
+    Ranks in events are absolute so applying one again changes nothing
+    """
+    for user_id, rank in events.values_list('user_id', field):
+        if rank is None:
+            ranks.pop(user_id, None)
+        else:
+            ranks[user_id] = rank
+
+    return ranks
+
+
+def ladder_at(at):
+    """
+    Rebuild the ladder as it was at the given time from whichever is nearer, the last daily standings stored before
+    that day played forward or the ladder as it is now played back.
+    Returns the base used (the date of the standings or 'live') and the standings as {user_id, username, rank}
+    """
+    current = now()
+    snapshot = list(ladder_as_of(localdate(at) - timedelta(days=1)).values_list('date', 'user_id', 'rank'))
+    start = start_of_day(snapshot[0][0] + timedelta(days=1)) if snapshot else None
+
+    if start is not None and at - start < current - at:
+        base = snapshot[0][0]
+        ranks = replay(
+            {user_id: rank for day, user_id, rank in snapshot},
+            LadderEvent.objects.filter(time__gte=start, time__lte=at).order_by('time', 'pk'),
+            'rank_after'
+        )
+    else:
+        base = 'live'
+        ranks = replay(
+            dict(UserProfile.objects.filter(active=True).values_list('user_id', 'rank')),
+            LadderEvent.objects.filter(time__gt=at).order_by('-time', '-pk'),
+            'rank_before'
+        )
+
+    usernames = dict(User.objects.filter(pk__in=ranks).values_list('pk', 'username'))
+
+    return base, [
+        {'user_id': user_id, 'username': usernames.get(user_id), 'rank': rank}
+        for user_id, rank in sorted(ranks.items(), key=lambda item: (item[1], item[0]))
+    ]
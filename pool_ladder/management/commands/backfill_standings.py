@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+from django.utils.dateparse import parse_date
+
+from pool_ladder.standings import backfill_daily_standings, backfill_season_standings
+
+
+class Command(BaseCommand):
+    help = 'Replay the match history to write the standings of finished seasons and the ladder on each day played'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='Only write days from this YYYY-MM-DD date on')
+        parser.add_argument('--seasons-only', action='store_true', help="Don't write the daily standings")
+
+    def handle(self, *args, **options):
+        print('wrote {} season standings'.format(len(backfill_season_standings())))
+
+        if not options['seasons_only']:
+            print('wrote {} daily standings'.format(backfill_daily_standings(options['since'])))
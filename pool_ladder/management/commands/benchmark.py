@@ -0,0 +1,65 @@
+from django.core.management import BaseCommand, CommandError, call_command
+from django.test import override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from pool_ladder.benchmarks import SCENARIOS, SIZES, Benchmark, compare, generate_ladder, load, save
+
+
+class Command(BaseCommand):
+    help = 'Time the ladder operations against generated ladders in a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, nargs='+', default=SIZES, help='The ladder sizes to generate')
+        parser.add_argument('--years', type=int, default=2, help='Years of match history to generate')
+        parser.add_argument('--rate', type=float, default=1, help='Matches played by each player a week')
+        parser.add_argument('--sockets', type=int, help='Sockets to fan out to, defaults to one for each player')
+        parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, help='Only run these scenarios')
+        parser.add_argument('--output', default='benchmark.json', help='Where to save the results')
+        parser.add_argument('--baseline', help='Fail if the results go over those saved in this file')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='How far over its baseline a timing can go, as a fraction of it'
+        )
+
+    def handle(self, *args, **options):
+        baseline = load(options['baseline']) if options['baseline'] else None
+        results = {}
+
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+
+        try:
+            # sockets are simulated on the in memory channel layer and each scenario clears its own in memory cache,
+            # leaving the configured redis alone
+            with override_settings(
+                CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+            ):
+                for players in options['players']:
+                    call_command('flush', interactive=False, verbosity=0)
+                    print('generating {} players'.format(players))
+                    generate_ladder(players, years=options['years'], rate=options['rate'])
+
+                    results[str(players)] = Benchmark(sockets=options['sockets'] or players).run(options['scenario'])
+
+                    for name, result in results[str(players)].items():
+                        print(
+                            '{} players {}: {queries} queries, {wall_time:.3f}s ({db_time:.3f}s database, '
+                            '{template_time:.3f}s templates)'.format(players, name, **result)
+                        )
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        save(results, options['output'])
+        print('saved results to {}'.format(options['output']))
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+
+            if regressions:
+                raise CommandError('\n'.join(['regressions against {}:'.format(options['baseline'])] + regressions))
+
+            print('no regressions against {}'.format(options['baseline']))
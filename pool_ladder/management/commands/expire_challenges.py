@@ -0,0 +1,22 @@
+from asgiref.sync import async_to_sync
+from django.core.management import BaseCommand
+
+from pool_ladder.expiry import ExpiryScheduler, forfeit_expired
+
+
+class Command(BaseCommand):
+    help = 'Forfeit open challenges as their time runs out'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Forfeit any expired challenges then exit rather than waiting for the next deadline'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            print('forfeited {} challenges'.format(forfeit_expired()))
+            return
+
+        async_to_sync(ExpiryScheduler().run)()
@@ -0,0 +1,79 @@
+import re
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import now
+
+from pool_ladder.diffs import open_challenges, played_matches
+from pool_ladder.expiry import expired_challenges
+from pool_ladder.models import Game, Match, MatchParticipant, UserProfile
+
+# full scans of the match, game and participant tables, as postgres and sqlite describe them
+FULL_SCAN = re.compile(
+    r'Seq Scan on (pool_ladder_(?:match|game|matchparticipant))\b'
+    r'|SCAN (?:TABLE )?(pool_ladder_(?:match|game|matchparticipant))\b(?! USING)'
+)
+
+
+def hot_queries(profile):
+    """
+    return the queries run most often, named, for the given player
+    """
+    user = profile.user
+    played = Match.objects.filter(played__isnull=False)
+    match = played.order_by('-played').first() or Match(pk=0)
+    participations = MatchParticipant.objects.filter(user=user)
+
+    return [
+        ('open challenges', open_challenges().order_by('challenge_time')),
+        ('expired challenges', expired_challenges()),
+        ('player has open challenge', participations.filter(result=MatchParticipant.OPEN)),
+        ('player last played', profile.matches.order_by('-played')[:1]),
+        ('player last challenges', participations.order_by('-challenge_time')[:2]),
+        ('player rank history', participations.filter(played__isnull=False).order_by('played')),
+        ('played matches', played_matches().order_by('-played', '-pk')[:50]),
+        ('changed matches', Match.objects.filter(updated__gte=now())),
+        ('match game', Game.objects.filter(match=match, index=0)),
+        ('ladder', UserProfile.objects.filter(active=True).select_related('user').order_by('rank')),
+    ]
+
+
+def full_scans(plan):
+    """
+    return the match, game and participant tables the plan reads in full
+    """
+    return sorted({first or second for first, second in FULL_SCAN.findall(plan)})
+
+
+class Command(BaseCommand):
+    help = 'Print the query plans of the hot ladder queries so changes to them can be seen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--player', type=int, help='The user id to plan the player queries for')
+        parser.add_argument('--analyze', action='store_true', help='Run the queries to get real timings (postgres)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Fail if any of the queries reads all of the matches, games or participants. '
+                 'Only meaningful on a full size database'
+        )
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.select_related('user')
+        profile = profiles.filter(user_id=options['player']).first() if options['player'] else profiles.first()
+
+        if profile is None:
+            raise CommandError('there are no players to plan the queries for')
+
+        explain = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        scans = []
+
+        for name, queryset in hot_queries(profile):
+            plan = queryset.explain(**explain)
+            print('{}\n{}\n{}\n'.format(name, '-' * len(name), plan))
+
+            for table in full_scans(plan):
+                scans.append('{} reads all of {}'.format(name, table))
+
+        if options['check'] and scans:
+            raise CommandError('\n'.join(scans))
@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from pool_ladder.seasons import STRATEGIES, start_new_season
+
+
+class Command(BaseCommand):
+    help = 'Start a new season, ranking the active players for it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strategy',
+            choices=sorted(STRATEGIES),
+            default='random',
+            help='Shuffle the ranks, keep the order of the last season or seed them on its record or Elo ratings'
+        )
+        parser.add_argument(
+            '--carry-challenges',
+            action='store_true',
+            help='Move open challenges into the new season rather than declining them'
+        )
+        parser.add_argument('--seed', type=int, help='Seed for the random strategy')
+
+    def handle(self, *args, **options):
+        season = start_new_season(
+            options['strategy'],
+            carry_challenges=options['carry_challenges'],
+            seed=options['seed']
+        )
+        print('started season {}'.format(season.number))
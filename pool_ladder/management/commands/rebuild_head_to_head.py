@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from pool_ladder.models import HeadToHead
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the head to head records of each pair of players from the match and game history'
+
+    def handle(self, *args, **options):
+        records = HeadToHead.rebuild()
+        print('rebuilt head to head records for {} pairs'.format(len(records)))
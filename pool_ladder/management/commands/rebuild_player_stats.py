@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from pool_ladder.models import PlayerStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the player statistics from the match and game history'
+
+    def handle(self, *args, **options):
+        stats = PlayerStats.rebuild()
+        print('rebuilt stats for {} players'.format(len(stats)))
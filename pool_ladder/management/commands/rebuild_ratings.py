@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from pool_ladder.models import PlayerRating, Season
+
+
+class Command(BaseCommand):
+    help = 'Replay the match history to rebuild the Elo ratings for every season, or just the given ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, action='append', help='The number of a season to rebuild')
+
+    def handle(self, *args, **options):
+        season_ids = None
+
+        if options['season']:
+            season_ids = list(Season.objects.filter(number__in=options['season']).values_list('pk', flat=True))
+
+        ratings = PlayerRating.rebuild(season_ids)
+        print('rebuilt {} ratings'.format(len(ratings)))
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+from django.utils.dateparse import parse_date
+
+from pool_ladder.standings import snapshot_day
+
+
+class Command(BaseCommand):
+    help = 'Store the ladder as it is now against today, run once a day after the last results are in'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Store it against this YYYY-MM-DD date instead of today')
+
+    def handle(self, *args, **options):
+        standings = snapshot_day(options['date'])
+        print('stored {} standings'.format(len(standings)))
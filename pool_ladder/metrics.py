@@ -0,0 +1,246 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+
+# upper bounds of the wall time histogram, in seconds
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+COUNTERS = OrderedDict([
+    ('queries', ('pool_ladder_db_queries_total', 'Database queries run')),
+    ('db_time', ('pool_ladder_db_seconds_total', 'Seconds spent waiting on the database')),
+    ('template_time', ('pool_ladder_template_seconds_total', 'Seconds spent rendering templates')),
+    ('messages', ('pool_ladder_channel_messages_total', 'Messages sent to the channel layer or a socket')),
+    ('wall_time', ('pool_ladder_seconds_total', 'Seconds from start to finish')),
+])
+
+# totals for each view and consumer handler in this process, like the fan out stats
+_lock = threading.Lock()
+_totals = defaultdict(lambda: defaultdict(float))
+_histograms = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+
+# the sample being recorded by the current thread, if any
+_local = threading.local()
+
+
+class Sample(object):
+    """
+    The cost of a single request or consumer handler
+    """
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.messages = 0
+        self.wall_time = 0
+        self.rendering = 0
+        # the sample this one was recorded within, which everything is counted against too
+        self.parent = None
+
+    @contextmanager
+    def recording(self):
+        """
+        Count the queries, template rendering and messages sent by this thread against the sample.
+        Async code shares its thread between sockets so it should only record in its sync parts
+        """
+        self.parent = getattr(_local, 'sample', None)
+        _local.sample = self
+
+        try:
+            with connection.execute_wrapper(self.execute):
+                yield self
+        finally:
+            _local.sample = self.parent
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def within(self):
+        """
+        this sample and every sample it is being recorded within
+        """
+        sample = self
+
+        while sample is not None:
+            yield sample
+            sample = sample.parent
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in COUNTERS}
+
+
+@contextmanager
+def measure(name):
+    """
+    time everything in the block and add the sample to the totals for name once it finishes
+    """
+    sample = Sample(name)
+    start = time.perf_counter()
+
+    try:
+        yield sample
+    finally:
+        sample.wall_time = time.perf_counter() - start
+        record(sample)
+
+
+def record(sample):
+    with _lock:
+        totals = _totals[sample.name]
+        totals['count'] += 1
+
+        for key in COUNTERS:
+            totals[key] += getattr(sample, key)
+
+        histogram = _histograms[sample.name]
+        histogram[next((i for i, bound in enumerate(BUCKETS) if sample.wall_time <= bound), len(BUCKETS))] += 1
+
+    if settings.METRICS_SLOW_REQUEST is not None and sample.wall_time >= settings.METRICS_SLOW_REQUEST:
+        print(
+            'slow {name}: {wall_time:.3f}s, {queries} queries in {db_time:.3f}s, '
+            '{template_time:.3f}s rendering, {messages} messages'.format(name=sample.name, **sample.as_dict())
+        )
+
+
+def message_sent(count=1):
+    """
+    count messages sent from the current thread against the sample being recorded
+    """
+    sample = getattr(_local, 'sample', None)
+
+    if sample is not None:
+        for outer in sample.within():
+            outer.messages += count
+
+
+def totals():
+    """
+    return a copy of the totals for each name
+    """
+    with _lock:
+        return {name: dict(values) for name, values in _totals.items()}
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _histograms.clear()
+
+
+def prometheus(gauges=None):
+    """
+    render the totals, along with any other gauges given, in the prometheus text format
+    """
+    with _lock:
+        names = sorted(_totals)
+        current = {name: dict(_totals[name]) for name in names}
+        histograms = {name: list(_histograms[name]) for name in names}
+
+    lines = [
+        '# HELP pool_ladder_requests_total Requests and consumer messages handled',
+        '# TYPE pool_ladder_requests_total counter'
+    ]
+    lines += ['pool_ladder_requests_total{{name="{}"}} {}'.format(name, int(current[name]['count'])) for name in names]
+
+    for key, (metric, description) in COUNTERS.items():
+        lines += ['# HELP {} {}'.format(metric, description), '# TYPE {} counter'.format(metric)]
+        lines += ['{}{{name="{}"}} {}'.format(metric, name, current[name][key]) for name in names]
+
+    lines += [
+        '# HELP pool_ladder_duration_seconds Seconds from start to finish',
+        '# TYPE pool_ladder_duration_seconds histogram'
+    ]
+
+    for name in names:
+        cumulative = 0
+
+        for bound, count in zip(BUCKETS + ['+Inf'], histograms[name]):
+            cumulative += count
+            lines.append('pool_ladder_duration_seconds_bucket{{name="{}",le="{}"}} {}'.format(name, bound, cumulative))
+
+        lines.append('pool_ladder_duration_seconds_sum{{name="{}"}} {}'.format(name, current[name]['wall_time']))
+        lines.append('pool_ladder_duration_seconds_count{{name="{}"}} {}'.format(name, int(current[name]['count'])))
+
+    for metric, value in sorted((gauges or {}).items()):
+        lines += ['# TYPE {} gauge'.format(metric), '{} {}'.format(metric, value)]
+
+    return '\n'.join(lines) + '\n'
+
+
+class MeasuredView(object):
+    """
+    Record a sample for each request to the view, named after it.
+    Streamed responses are recorded as their content is sent
+    """
+    def dispatch(self, request, *args, **kwargs):
+        sample = Sample(type(self).__name__)
+        start = time.perf_counter()
+
+        with sample.recording():
+            response = super().dispatch(request, *args, **kwargs)
+
+        if response.streaming:
+            response.streaming_content = measured_stream(sample, start, response.streaming_content)
+        else:
+            sample.wall_time = time.perf_counter() - start
+            record(sample)
+
+        return response
+
+
+def measured_stream(sample, start, content):
+    try:
+        with sample.recording():
+            yield from content
+    finally:
+        sample.wall_time = time.perf_counter() - start
+        record(sample)
+
+
+class MeasuredTemplate(object):
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        sample = getattr(_local, 'sample', None)
+
+        if sample is None or sample.rendering:
+            # templates rendered within another are already being timed
+            return self.template.render(context, request)
+
+        sample.rendering += 1
+        start = time.perf_counter()
+
+        try:
+            return self.template.render(context, request)
+        finally:
+            sample.rendering -= 1
+            elapsed = time.perf_counter() - start
+
+            for outer in sample.within():
+                outer.template_time += elapsed
+
+
+class MeasuredTemplates(DjangoTemplates):
+    """
+    the django template backend, with rendering timed against the sample being recorded
+    """
+    def from_string(self, template_code):
+        return MeasuredTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return MeasuredTemplate(super().get_template(template_name))
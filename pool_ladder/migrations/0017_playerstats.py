@@ -0,0 +1,90 @@
+# Generated by Django 2.2.1 on 2026-10-17 22:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+import django.db.models.deletion
+
+
+def build_player_stats(apps, schema_editor):
+    """
+    a copy of the statistics replay as it was when the table was added, so this doesn't change with the app code
+    """
+    UserProfile = apps.get_model('pool_ladder', 'UserProfile')
+    Match = apps.get_model('pool_ladder', 'Match')
+    Game = apps.get_model('pool_ladder', 'Game')
+    PlayerStats = apps.get_model('pool_ladder', 'PlayerStats')
+
+    ranks = UserProfile.objects.filter(active=True).aggregate(min_rank=Min('rank'), max_rank=Max('rank'))
+    stats = {
+        user_id: {
+            'user_id': user_id,
+            'matches_won': 0,
+            'matches_lost': 0,
+            'games_won': 0,
+            'streak': 0,
+            'last_played': None,
+            'is_top': rank == ranks['min_rank'],
+            'is_bottom': rank == ranks['max_rank']
+        } for user_id, rank in UserProfile.objects.values_list('user_id', 'rank')
+    }
+
+    for played, challenger_id, opponent_id, winner_id, loser_id in Match.objects.filter(
+        played__isnull=False
+    ).order_by(
+        'played'
+    ).values_list(
+        'played', 'challenger_id', 'opponent_id', 'winner_id', 'loser_id'
+    ).iterator():
+        for user_id in [challenger_id, opponent_id]:
+            if user_id in stats:
+                stats[user_id]['last_played'] = played
+
+        if winner_id in stats:
+            winner = stats[winner_id]
+            winner['matches_won'] += 1
+            winner['streak'] = winner['streak'] + 1 if winner['streak'] > 0 else 1
+
+        if loser_id in stats:
+            loser = stats[loser_id]
+            loser['matches_lost'] += 1
+            loser['streak'] = loser['streak'] - 1 if loser['streak'] < 0 else -1
+
+    for winner_id, games_won in Game.objects.filter(
+        winner__isnull=False
+    ).order_by().values('winner').annotate(
+        games_won=Count('id')
+    ).values_list('winner', 'games_won'):
+        if winner_id in stats:
+            stats[winner_id]['games_won'] = games_won
+
+    PlayerStats.objects.bulk_create([PlayerStats(**values) for values in stats.values()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0016_auto_20190530_1217'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matches_won', models.IntegerField(default=0)),
+                ('matches_lost', models.IntegerField(default=0)),
+                ('games_won', models.IntegerField(default=0)),
+                ('streak', models.IntegerField(default=0)),
+                ('last_played', models.DateTimeField(blank=True, null=True)),
+                ('is_top', models.BooleanField(default=False)),
+                ('is_bottom', models.BooleanField(default=False)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'player stats',
+            },
+        ),
+        migrations.RunPython(build_player_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:40
+
+from django.db import migrations
+
+
+def create_username_index(apps, schema_editor):
+    # username search uses icontains (UPPER(...) LIKE) which a trigram index can serve on postgres
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS pool_ladder_username_trgm ON auth_user USING gin (UPPER(username) gin_trgm_ops)'
+    )
+
+
+def drop_username_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS pool_ladder_username_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('pool_ladder', '0017_playerstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_index, drop_username_index),
+    ]
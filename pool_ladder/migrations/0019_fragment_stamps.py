@@ -0,0 +1,23 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool_ladder', '0018_username_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.1 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool_ladder', '0019_fragment_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('slack', 'Slack'), ('email', 'Email')], max_length=10)),
+                ('payload', models.TextField()),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('failed', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-failed'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.1 on 2026-10-18 00:34
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def challenge_deadline(challenge_time, days_to_play):
+    """
+    move the challenge time on by business days, skipping weekends only so this doesn't depend on the settings or
+    app code at the time it is run
+    """
+    day = challenge_time.date()
+    days = 1 if days_to_play == 0 and day.weekday() >= 5 else days_to_play
+
+    while days > 0:
+        day += timedelta(days=1)
+
+        if day.weekday() < 5:
+            days -= 1
+
+    return challenge_time + timedelta(days=(day - challenge_time.date()).days)
+
+
+def fill_deadlines(apps, schema_editor):
+    Match = apps.get_model('pool_ladder', 'Match')
+    matches = []
+
+    for match in Match.objects.only('challenge_time', 'days_to_play').iterator():
+        match.deadline = challenge_deadline(match.challenge_time, match.days_to_play)
+        matches.append(match)
+
+        if len(matches) >= 1000:
+            Match.objects.bulk_update(matches, ['deadline'])
+            matches = []
+
+    Match.objects.bulk_update(matches, ['deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool_ladder', '0020_failednotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='deadline',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.1 on 2026-10-18 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool_ladder', '0021_challenge_deadline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('declined', False), ('played__isnull', True)), fields=['challenge_time'], name='match_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('declined', False), ('played__isnull', True)), fields=['challenger'], name='match_open_challenger_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('declined', False), ('played__isnull', True)), fields=['opponent'], name='match_open_opponent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(condition=models.Q(('declined', False), ('played__isnull', False)), fields=['-played'], name='match_played_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['challenger', 'played'], name='match_challenger_played_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['opponent', 'played'], name='match_opponent_played_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['challenger', 'challenge_time'], name='match_challenger_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['opponent', 'challenge_time'], name='match_opponent_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['updated'], name='match_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['updated'], name='userprofile_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.1 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_games(apps, schema_editor):
+    # keep the first game saved for each index of a match so the constraint can be added
+    Game = apps.get_model('pool_ladder', 'Game')
+
+    for duplicate in Game.objects.order_by().values('match', 'index').annotate(
+        games=Count('id'),
+        first=Min('id')
+    ).filter(
+        games__gt=1
+    ):
+        Game.objects.filter(
+            match=duplicate['match'],
+            index=duplicate['index']
+        ).exclude(
+            pk=duplicate['first']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pool_ladder', '0022_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_games, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='game',
+            constraint=models.UniqueConstraint(fields=('match', 'index'), name='game_match_index_unique'),
+        ),
+    ]
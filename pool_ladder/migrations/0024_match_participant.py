@@ -0,0 +1,91 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def participant_result(match, user_id):
+    if match.declined:
+        return 'declined'
+
+    if match.winner_id is None:
+        return 'open'
+
+    return 'won' if match.winner_id == user_id else 'lost'
+
+
+def fill_participants(apps, schema_editor):
+    Match = apps.get_model('pool_ladder', 'Match')
+    MatchParticipant = apps.get_model('pool_ladder', 'MatchParticipant')
+    participants = []
+
+    for match in Match.objects.order_by('pk').iterator():
+        for role, user_id, rank_before in [
+            ('challenger', match.challenger_id, match.challenger_rank),
+            ('opponent', match.opponent_id, match.opponent_rank)
+        ]:
+            result = participant_result(match, user_id)
+            participants.append(
+                MatchParticipant(
+                    match_id=match.pk,
+                    user_id=user_id,
+                    role=role,
+                    challenge_time=match.challenge_time,
+                    played=match.played,
+                    result=result,
+                    rank_before=rank_before,
+                    rank_after={'won': match.winner_rank, 'lost': match.loser_rank}.get(result)
+                )
+            )
+
+        if len(participants) >= 1000:
+            MatchParticipant.objects.bulk_create(participants)
+            participants = []
+
+    MatchParticipant.objects.bulk_create(participants)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0023_game_match_index_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchParticipant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('challenger', 'Challenger'), ('opponent', 'Opponent')], max_length=10)),
+                ('challenge_time', models.DateTimeField()),
+                ('played', models.DateTimeField(blank=True, null=True)),
+                ('result', models.CharField(choices=[('open', 'Open'), ('declined', 'Declined'), ('won', 'Won'), ('lost', 'Lost')], default='open', max_length=10)),
+                ('rank_before', models.IntegerField(blank=True, null=True)),
+                ('rank_after', models.IntegerField(blank=True, null=True)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='pool_ladder.Match')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['match', 'role'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='matchparticipant',
+            index=models.Index(fields=['user', 'played'], name='participant_user_played_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchparticipant',
+            index=models.Index(fields=['user', 'challenge_time'], name='participant_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchparticipant',
+            index=models.Index(fields=['user', 'result'], name='participant_user_result_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='matchparticipant',
+            constraint=models.UniqueConstraint(fields=('match', 'role'), name='participant_match_role_unique'),
+        ),
+        migrations.RunPython(fill_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import pool_ladder.ratings
+
+# the rating settings' defaults when the ratings were added, so the backfill doesn't change with them
+INITIAL_RATING = 1500
+K_FACTOR = 32
+
+
+def calculate_ratings(Match):
+    """
+    a copy of the Elo replay as it was when the ratings were added, see pool_ladder.ratings.calculate_ratings
+    """
+    ratings = {}
+    match_ratings = {}
+
+    for pk, season_id, winner_id, loser_id in Match.objects.filter(
+        played__isnull=False,
+        winner__isnull=False,
+        loser__isnull=False
+    ).order_by(
+        'played', 'pk'
+    ).values_list(
+        'pk', 'season_id', 'winner_id', 'loser_id'
+    ).iterator():
+        winner = ratings.setdefault((winner_id, season_id), {'rating': INITIAL_RATING, 'matches': 0})
+        loser = ratings.setdefault((loser_id, season_id), {'rating': INITIAL_RATING, 'matches': 0})
+
+        expected = 1 / (1 + 10 ** ((loser['rating'] - winner['rating']) / 400))
+        change = K_FACTOR * (1 - expected)
+        winner['rating'] += change
+        loser['rating'] -= change
+        winner['matches'] += 1
+        loser['matches'] += 1
+        match_ratings[pk] = (winner['rating'], loser['rating'])
+
+    return ratings, match_ratings
+
+
+def build_ratings(apps, schema_editor):
+    Match = apps.get_model('pool_ladder', 'Match')
+    PlayerRating = apps.get_model('pool_ladder', 'PlayerRating')
+    Season = apps.get_model('pool_ladder', 'Season')
+    UserProfile = apps.get_model('pool_ladder', 'UserProfile')
+
+    ratings, match_ratings = calculate_ratings(Match)
+    PlayerRating.objects.bulk_create(
+        [
+            PlayerRating(user_id=user_id, season_id=season_id, **values)
+            for (user_id, season_id), values in ratings.items()
+        ]
+    )
+
+    matches = []
+
+    for match in Match.objects.filter(played__isnull=False).only('pk').iterator():
+        if match.pk in match_ratings:
+            match.winner_rating, match.loser_rating = match_ratings[match.pk]
+            matches.append(match)
+
+    Match.objects.bulk_update(matches, ['winner_rating', 'loser_rating'], batch_size=500)
+
+    season = Season.objects.order_by('-date_started').first()
+    profiles = []
+
+    for profile in UserProfile.objects.all():
+        rating = ratings.get((profile.user_id, season.pk if season else None))
+
+        if rating:
+            profile.rating = rating['rating']
+            profiles.append(profile)
+
+    UserProfile.objects.bulk_update(profiles, ['rating'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0024_match_participant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='loser_rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='winner_rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rating',
+            field=models.FloatField(default=pool_ladder.ratings.initial_rating),
+        ),
+        migrations.CreateModel(
+            name='PlayerRating',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.FloatField(default=pool_ladder.ratings.initial_rating)),
+                ('matches', models.IntegerField(default=0)),
+                ('season', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='pool_ladder.Season')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-rating'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='playerrating',
+            constraint=models.UniqueConstraint(fields=('user', 'season'), name='playerrating_user_season_unique'),
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
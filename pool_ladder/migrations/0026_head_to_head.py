@@ -0,0 +1,101 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_head_to_head(apps, schema_editor):
+    """
+    a copy of the head to head totals as they were when the table was added, so this doesn't change with the app code
+    """
+    Match = apps.get_model('pool_ladder', 'Match')
+    Game = apps.get_model('pool_ladder', 'Game')
+    HeadToHead = apps.get_model('pool_ladder', 'HeadToHead')
+    pairs = {}
+
+    def pair(user_id, other_id):
+        return pairs.setdefault(
+            (min(user_id, other_id), max(user_id, other_id)),
+            {
+                'a_wins': 0,
+                'b_wins': 0,
+                'a_games': 0,
+                'b_games': 0,
+                'a_balled': 0,
+                'b_balled': 0,
+                'last_played': None
+            }
+        )
+
+    for played, challenger_id, opponent_id, winner_id in Match.objects.filter(
+        played__isnull=False,
+        winner__isnull=False
+    ).order_by().values_list(
+        'played', 'challenger_id', 'opponent_id', 'winner_id'
+    ).iterator():
+        record = pair(challenger_id, opponent_id)
+        record['a_wins' if winner_id == min(challenger_id, opponent_id) else 'b_wins'] += 1
+
+        if record['last_played'] is None or played > record['last_played']:
+            record['last_played'] = played
+
+    for challenger_id, opponent_id, winner_id, balled_id in Game.objects.filter(
+        match__played__isnull=False,
+        match__winner__isnull=False
+    ).order_by().values_list(
+        'match__challenger_id', 'match__opponent_id', 'winner_id', 'balled_id'
+    ).iterator():
+        record = pair(challenger_id, opponent_id)
+        player_a = min(challenger_id, opponent_id)
+
+        if winner_id is not None:
+            record['a_games' if winner_id == player_a else 'b_games'] += 1
+
+        if balled_id is not None:
+            record['a_balled' if balled_id == player_a else 'b_balled'] += 1
+
+    HeadToHead.objects.bulk_create(
+        [
+            HeadToHead(player_a_id=player_a_id, player_b_id=player_b_id, **values)
+            for (player_a_id, player_b_id), values in pairs.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0025_player_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeadToHead',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('a_wins', models.IntegerField(default=0)),
+                ('b_wins', models.IntegerField(default=0)),
+                ('a_games', models.IntegerField(default=0)),
+                ('b_games', models.IntegerField(default=0)),
+                ('a_balled', models.IntegerField(default=0)),
+                ('b_balled', models.IntegerField(default=0)),
+                ('last_played', models.DateTimeField(blank=True, null=True)),
+                ('player_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='head_to_head_a', to=settings.AUTH_USER_MODEL)),
+                ('player_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='head_to_head_b', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'head to head',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='headtohead',
+            index=models.Index(fields=['player_b'], name='headtohead_player_b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='headtohead',
+            constraint=models.UniqueConstraint(fields=('player_a', 'player_b'), name='headtohead_pair_unique'),
+        ),
+        migrations.RunPython(build_head_to_head, migrations.RunPython.noop),
+    ]
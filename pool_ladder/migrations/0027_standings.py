@@ -0,0 +1,58 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import pool_ladder.ratings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0026_head_to_head'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeasonStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('matches_won', models.IntegerField(default=0)),
+                ('matches_lost', models.IntegerField(default=0)),
+                ('games_won', models.IntegerField(default=0)),
+                ('rating', models.FloatField(default=pool_ladder.ratings.initial_rating)),
+                ('season', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='pool_ladder.Season')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='season_standings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['season', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('rank', models.IntegerField()),
+                ('rating', models.FloatField(default=pool_ladder.ratings.initial_rating)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_standings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='seasonstanding',
+            constraint=models.UniqueConstraint(fields=('season', 'user'), name='seasonstanding_season_user_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='dailystanding',
+            index=models.Index(fields=['date', 'rank'], name='dailystanding_date_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystanding',
+            constraint=models.UniqueConstraint(fields=('date', 'user'), name='dailystanding_date_user_unique'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.1 on 2026-10-17 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pool_ladder', '0027_standings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LadderEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('kind', models.CharField(choices=[('result', 'Result'), ('balled', 'Balled'), ('forfeit', 'Forfeit'), ('season', 'New season'), ('edit', 'Edited'), ('join', 'Joined')], max_length=10)),
+                ('rank_before', models.IntegerField(blank=True, null=True)),
+                ('rank_after', models.IntegerField(blank=True, null=True)),
+                ('match', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pool_ladder.Match')),
+                ('season', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pool_ladder.Season')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ladder_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['time', 'pk'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ladderevent',
+            index=models.Index(fields=['time'], name='ladderevent_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ladderevent',
+            index=models.Index(fields=['user', 'time'], name='ladderevent_user_time_idx'),
+        ),
+    ]
@@ -1,16 +1,19 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 
-import pygal
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models import Q, Max, Min
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Max, Min, Value, When
 from django.utils import timezone
-from django.utils.timezone import now
-from pandas.tseries.offsets import BDay
-from pygal.style import CleanStyle
+from django.utils.timezone import localdate, make_aware, now
+
+from pool_ladder.business_days import challenge_deadline
+from pool_ladder.charts import (
+    cache_rank_chart, get_cached_rank_chart, invalidate_all_rank_charts, invalidate_rank_charts, render_rank_chart
+)
+from pool_ladder.fanout import challenge_closed, challenge_scheduled, notify_email, notify_slack, tables_dirty
+from pool_ladder.ratings import calculate_ratings, elo, initial_rating
+from pool_ladder.stats import calculate_head_to_head, calculate_player_stats
 
 
 class UserProfile(models.Model):
@@ -19,6 +22,10 @@ class UserProfile(models.Model):
     slack_id = models.CharField(max_length=255, blank=True, null=True)
     movement = models.IntegerField(default=0)
     active = models.BooleanField(default=True)
+    # the Elo rating for the current season, kept with the rank so the ladder can show it without another query
+    rating = models.FloatField(default=initial_rating)
+    # stamps cached fragments so set this on any update that bypasses save()
+    updated = models.DateTimeField(auto_now=True)
 
     @property
     def matches(self):
@@ -26,11 +33,7 @@ class UserProfile(models.Model):
         return the query set of matches that the user has played
         :return:
         """
-        return Match.objects.filter(
-            played__isnull=False
-        ).filter(
-            Q(opponent=self.user) | Q(challenger=self.user)
-        )
+        return Match.objects.filter(participants__user=self.user, participants__played__isnull=False)
 
     @property
     def is_available(self):
@@ -47,12 +50,11 @@ class UserProfile(models.Model):
         """
         return True if this user is in a match not yet played
         """
-        return Match.objects.filter(
-            played__isnull=True,
-            declined=False
-        ).filter(
-            Q(challenger=self.user) | Q(opponent=self.user)
-        ).count() > 0
+        return MatchParticipant.objects.filter(
+            user=self.user,
+            result=MatchParticipant.OPEN,
+            played__isnull=True
+        ).exists()
 
     @property
     def last_played_match(self):
@@ -84,13 +86,13 @@ class UserProfile(models.Model):
 
     @property
     def swag(self):
-        active_profiles = UserProfile.objects.filter(active=True)
+        stats = self.stats
         swag = []
 
-        if self.rank == active_profiles.aggregate(min_rank=Min('rank'))['min_rank']:
+        if stats.is_top:
             swag.append('1f478')
 
-        if self.rank == active_profiles.aggregate(max_rank=Max('rank'))['max_rank']:
+        if stats.is_bottom:
             swag.append('1F4A9')
 
         if self.movement == 100:
@@ -122,15 +124,22 @@ class UserProfile(models.Model):
             return can_decline
 
         # get the last 2 matches for this user
-        matches = Match.objects.filter(Q(challenger=self.user) | Q(opponent=self.user)).order_by('-challenge_time')[:2]
+        matches = MatchParticipant.objects.filter(
+            user=self.user
+        ).order_by(
+            '-challenge_time'
+        ).values_list(
+            'role',
+            'result'
+        )[:2]
 
         user_challenged_count = 0
 
-        for match in matches:
-            if match.declined:
+        for role, result in matches:
+            if result == MatchParticipant.DECLINED:
                 continue
 
-            if match.opponent == self.user:
+            if role == MatchParticipant.OPPONENT:
                 user_challenged_count += 1
 
         if user_challenged_count == 2:
@@ -138,123 +147,196 @@ class UserProfile(models.Model):
 
         return can_decline
 
-    def update_rank(self, rank, balled=False):
+    def update_rank(self, rank, balled=False, broadcast=True, match=None):
         """
         Update the rank of this profile with the given rank.
-        If balled is True set rank to bottom and move everyone else below rank up
+        If balled is True set rank to bottom and move everyone else below rank up.
+        The moves are recorded as ladder events against the match if one is given
         """
+        played = match.played if match else None
+
         if balled:
-            # get current maximum rank
-            max = UserProfile.objects.filter(active=True).aggregate(max_rank=Max('rank'))
-            self.rank = max['max_rank']
-
-            # get all profiles above 'rank' (the losers rank) and move them up 1
-            for profile in UserProfile.objects.filter(rank__gt=rank):
-                profile.rank -= 1
-                profile.save()
-
-            # also need to alter the pending matches
-            for challenge in Match.objects.filter(
-                    played__isnull=True
-            ).filter(
-                Q(opponent__userprofile__rank__gt=rank) | Q(challenger__userprofile__rank__gt=rank)
-            ):
-                if challenge.challenger_rank > rank:
-                    challenge.challenger_rank -= 1
-
-                if challenge.opponent_rank > rank:
-                    challenge.opponent_rank -= 1
-
-                challenge.save()
-
-            # set movement to 100 (balled)
-            self.movement = 100
-            self.save()
+            with transaction.atomic():
+                # get current maximum rank
+                max = UserProfile.objects.filter(active=True).aggregate(max_rank=Max('rank'))
+                previous_rank = self.rank
+                self.rank = max['max_rank']
+
+                # get all profiles above 'rank' (the losers rank) and move them up 1
+                shifted = UserProfile.objects.filter(rank__gt=rank).exclude(pk=self.pk)
+                moved = list(shifted.values_list('user_id', 'rank', 'active'))
+                invalidate_rank_charts([user_id for user_id, shifted_rank, active in moved] + [self.user_id])
+                shifted.update(rank=F('rank') - 1, updated=now())
+                # inactive players are moved along too but they aren't on the ladder to replay
+                LadderEvent.record(
+                    LadderEvent.BALLED,
+                    [(user_id, shifted_rank, shifted_rank - 1) for user_id, shifted_rank, active in moved if active]
+                    + [(self.user_id, previous_rank, self.rank)],
+                    match=match,
+                    time=played
+                )
+
+                # also need to alter the pending matches, and the ranks their players go into them with
+                MatchParticipant.objects.filter(
+                    played__isnull=True,
+                    rank_before__gt=rank
+                ).update(
+                    rank_before=F('rank_before') - 1
+                )
+                Match.objects.filter(
+                    played__isnull=True,
+                    challenger_rank__gt=rank
+                ).update(
+                    challenger_rank=F('challenger_rank') - 1,
+                    updated=now()
+                )
+                Match.objects.filter(
+                    played__isnull=True,
+                    opponent_rank__gt=rank
+                ).update(
+                    opponent_rank=F('opponent_rank') - 1,
+                    updated=now()
+                )
+
+                # set movement to 100 (balled)
+                self.movement = 100
+                self.save(broadcast=False)
+
+                # the whole ladder and the pending matches have moved so redraw them once
+                if broadcast:
+                    tables_dirty('users', 'challenges')
             return
 
+        LadderEvent.record(LadderEvent.RESULT, [(self.user_id, self.rank, rank)], match=match, time=played)
         self.movement = rank - self.rank
         self.rank = rank
-        self.save()
+        self.save(broadcast=broadcast)
 
-    def get_rank_chart(self):
+    def rank_history(self):
         """
-        Use Pygal to generate a chart of the rank movements
-        :return:
+        return the rank before and after every match played, oldest first
         """
-        ranks = [(now(), self.rank)]
+        ranks = []
 
-        for match in self.matches.order_by('-played'):
-            if self.user == match.winner:
-                ranks.insert(0, (match.played, match.winner_rank))
-            else:
-                ranks.insert(0, (match.played, match.loser_rank))
+        for played, rank_before, rank_after in MatchParticipant.objects.filter(
+            user=self.user,
+            played__isnull=False
+        ).order_by(
+            'played'
+        ).values_list(
+            'played',
+            'rank_before',
+            'rank_after'
+        ):
+            ranks.append((played, rank_before))
+            ranks.append((played, rank_after))
+
+        return ranks
 
-            if self.user == match.challenger:
-                ranks.insert(0, (match.played, match.challenger_rank))
-            else:
-                ranks.insert(0, (match.played, match.opponent_rank))
-
-        chart = pygal.DateTimeLine(
-            title='Rank Movements',
-            x_label_rotation=35,
-            x_title='Date Played',
-            y_title='Rank',
-            range=(1, UserProfile.objects.filter(active=True).aggregate(max_rank=Max('rank'))['max_rank']),
-            inverse_y_axis=True,
-            show_legend=False,
-            truncate_label=-1,
-            x_value_formatter=lambda dt: dt.strftime('%b. %d, %Y, %I:%M %p'),
-            style=CleanStyle(
-                font_family='googlefont:Raleway',
-            ),
+    def get_rank_chart(self):
+        """
+        Use Pygal to generate a chart of the rank movements up to today.
+        The chart is cached until this player's matches or rank change, the day rolls over or the length of the
+        ladder changes, and the history is kept for redrawing it unless their matches changed
+        """
+        day = localdate()
+        cached = get_cached_rank_chart(self.user_id)
+
+        if cached is not None and cached['rank'] == self.rank and cached['day'] == day:
+            return cached['svg']
+
+        series = cached['series'] if cached is not None else self.rank_history()
+        # the current rank is drawn at the start of the day so the chart stays the same all day
+        today = make_aware(datetime.combine(day, time.min))
+        svg = render_rank_chart(
+            series + [(max([today] + [played for played, rank in series[-1:]]), self.rank)],
+            UserProfile.objects.filter(active=True).aggregate(max_rank=Max('rank'))['max_rank']
         )
-        chart.add('', ranks)
-        return chart.render_data_uri()
+        cache_rank_chart(self.user_id, series, self.rank, day, svg)
+        return svg
+
+    @property
+    def stats(self):
+        """
+        return the precomputed statistics for this user, building them from the history if they are missing
+        """
+        try:
+            return self.user.stats
+        except PlayerStats.DoesNotExist:
+            return PlayerStats.rebuild([self.user_id])[0]
+
+    @property
+    def matches_played(self):
+        """
+        Return the number of matches played by this user
+        """
+        return self.stats.matches_won + self.stats.matches_lost
 
     @property
     def matches_won(self):
         """
         Return the number of matches won by this user
         """
-        return Match.objects.filter(
-            played__isnull=False
-        ).filter(
-            winner=self.user
-        ).count()
+        return self.stats.matches_won
 
     @property
     def matches_lost(self):
         """
         Return the number of matches lost by this user
         """
-        return Match.objects.filter(
-            played__isnull=False
-        ).filter(
-            loser=self.user
-        ).count()
+        return self.stats.matches_lost
 
     @property
     def games_won(self):
         """
         return the number of games won by this user
         """
-        return Game.objects.filter(winner=self.user).count()
+        return self.stats.games_won
 
     def __str__(self):
         return '{} #{}'.format(self.user, self.rank)
 
     class Meta:
         ordering = ['rank']
+        indexes = [
+            models.Index(fields=['updated'], name='userprofile_updated_idx'),
+        ]
 
-    def save(self, **kwargs):
-        super().save(kwargs)
+    @property
+    def slack_mention(self):
+        """
+        return the slack mention for this user, falling back to their username
+        """
+        if self.slack_id:
+            return '<@{}>'.format(self.slack_id)
 
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'send.users'
-            }
-        )
+        return self.user.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        profile = super().from_db(db, field_names, values)
+        # kept so save can tell if the ladder has changed shape, deferred fields are left as None
+        profile._loaded_place = (profile.__dict__.get('rank'), profile.__dict__.get('active'))
+        return profile
+
+    def save(self, broadcast=True, **kwargs):
+        loaded = getattr(self, '_loaded_place', None)
+        moved = loaded != (self.rank, self.active)
+        super().save(**kwargs)
+        self._loaded_place = (self.rank, self.active)
+
+        if loaded is None or loaded[1] != self.active:
+            # joining or leaving changes the length of the ladder, which every chart is drawn against
+            invalidate_all_rank_charts()
+        else:
+            invalidate_rank_charts([self.user_id])
+
+        if broadcast:
+            if moved:
+                # the rank or active flag may have been edited directly
+                PlayerStats.refresh_extremes()
+
+            tables_dirty('users')
 
 
 class Season(models.Model):
@@ -268,6 +350,11 @@ class Season(models.Model):
         return '{} <{}>'.format(self.number, self.date_started)
 
 
+# the filters the partial indexes on Match are built for
+OPEN = Q(played__isnull=True, declined=False)
+PLAYED = Q(played__isnull=False, declined=False)
+
+
 class Match(models.Model):
     challenge_time = models.DateTimeField(
         default=timezone.now
@@ -306,73 +393,87 @@ class Match(models.Model):
     opponent_rank = models.IntegerField(null=True, blank=True)
     winner_rank = models.IntegerField(null=True, blank=True)
     loser_rank = models.IntegerField(null=True, blank=True)
+    # the Elo ratings the winner and loser came out of the match with
+    winner_rating = models.FloatField(null=True, blank=True)
+    loser_rating = models.FloatField(null=True, blank=True)
     played = models.DateTimeField(null=True, blank=True)
     pending = models.BooleanField(default=False)
     declined = models.BooleanField(default=False)
     days_to_play = models.IntegerField(default=3)
+    # when the challenge runs out, worked out from challenge_time and days_to_play whenever an open challenge is saved
+    deadline = models.DateTimeField(null=True, blank=True, db_index=True)
+    # stamps cached fragments so set this on any update that bypasses save()
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-challenge_time']
         verbose_name_plural = "matches"
+        indexes = [
+            # open challenges, on their own and for each player
+            models.Index(fields=['challenge_time'], name='match_open_idx', condition=OPEN),
+            models.Index(fields=['challenger'], name='match_open_challenger_idx', condition=OPEN),
+            models.Index(fields=['opponent'], name='match_open_opponent_idx', condition=OPEN),
+            # the played matches table
+            models.Index(fields=['-played'], name='match_played_idx', condition=PLAYED),
+            # each player's history, by when it was played or when they were challenged
+            models.Index(fields=['challenger', 'played'], name='match_challenger_played_idx'),
+            models.Index(fields=['opponent', 'played'], name='match_opponent_played_idx'),
+            models.Index(fields=['challenger', 'challenge_time'], name='match_challenger_time_idx'),
+            models.Index(fields=['opponent', 'challenge_time'], name='match_opponent_time_idx'),
+            # rows changed since the last ladder diff
+            models.Index(fields=['updated'], name='match_updated_idx'),
+        ]
 
     def __str__(self):
         return '{}: {} vs {}'.format(self.challenge_time, self.challenger, self.opponent)
 
-    def save(self, **kwargs):
-        super().save(kwargs)
+    def save(self, broadcast=True, **kwargs):
+        if self.played is None:
+            self.deadline = challenge_deadline(self.challenge_time, self.days_to_play)
+
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'deadline'}
+
+        with transaction.atomic():
+            super().save(**kwargs)
+            MatchParticipant.sync([self])
+
+        if not broadcast:
+            return
 
         if self.played:
             # played is set when results are entered so redraw the matches table
-            async_to_sync(get_channel_layer().group_send)(
-                'pool_ladder',
-                {
-                    'type': 'send.matches'
-                }
-            )
+            tables_dirty('matches', 'users')
+            challenge_closed(self.pk)
             return
 
         # this is a new challenge
-        async_to_sync(get_channel_layer().group_send)(
-            'pool_ladder',
-            {
-                'type': 'send.challenges'
-            }
-        )
+        tables_dirty('challenges', 'users')
+
+        # keep the expiry scheduler up to date as days are added or the challenge is declined
+        if self.declined:
+            challenge_closed(self.pk)
+        else:
+            challenge_scheduled(self.pk, self.time_until)
 
         # Notify the opponent of the challenge.
         # only if days_to_play is the default 3 otherwise new notifications will go out each time a day is added
         if self.days_to_play == 3 and not self.declined:
             if self.opponent.email:
-                async_to_sync(get_channel_layer().send)(
-                    'notifications',
-                    {
-                        'type': 'email',
-                        'email': self.opponent.email,
-                        'challenger': self.challenger.username,
-                        'time_until': self.time_until.strftime('%Y-%m-%d %H:%M:%S')
-                    }
+                notify_email(
+                    self.opponent.email,
+                    self.challenger.username,
+                    self.time_until.strftime('%Y-%m-%d %H:%M:%S')
                 )
 
-            async_to_sync(get_channel_layer().send)(
-                'notifications',
-                {
-                    'type': 'slack',
-                    'message': '{} You have been challenged to a {} match by {}.\n'
-                               'You need to play the match by {} or you will forfeit'.format(
-                                    (
-                                        '<@{}>'.format(self.opponent.userprofile.slack_id)
-                                        if self.opponent.userprofile.slack_id
-                                        else self.opponent.username
-                                    ),
-                                    settings.LADDER_NAME,
-                                    (
-                                        '<@{}>'.format(self.challenger.userprofile.slack_id)
-                                        if self.challenger.userprofile.slack_id
-                                        else self.challenger.username
-                                    ),
-                                    self.time_until.strftime('%Y-%m-%d %H:%M:%S')
-                               )
-                }
+            notify_slack(
+                '{} You have been challenged to a {} match by {}.\n'
+                'You need to play the match by {} or you will forfeit'.format(
+                    self.opponent.userprofile.slack_mention,
+                    settings.LADDER_NAME,
+                    self.challenger.userprofile.slack_mention,
+                    self.time_until.strftime('%Y-%m-%d %H:%M:%S')
+                )
             )
 
     def can_play(self, user):
@@ -390,132 +491,54 @@ class Match(models.Model):
     @property
     def loser_balled(self):
         for game in self.game_set.all():
-            if game.balled == self.loser:
+            if game.balled_id == self.loser_id:
                 return True
 
         return False
 
     @property
     def time_until(self):
-        return self.challenge_time + BDay(self.days_to_play)
-
-    def start_match(self, **kwargs):
-        self.played = now()
-
-        if not self.challenger_rank:
-            self.challenger_rank = self.challenger.userprofile.rank
-
-        if not self.opponent_rank:
-            self.opponent_rank = self.opponent.userprofile.rank
+        if self.deadline is None:
+            return challenge_deadline(self.challenge_time, self.days_to_play)
 
-        super().save(**kwargs)
-
-        if self.game_set.count() == 0:
-            for x in range(3):
-                game = Game.objects.create(
-                    index=x,
-                    match=self
-                )
-                game.save()
-                self.game_set.add(game)
+        return self.deadline
 
-    def set_winner_and_loser(self):
+    def decide_winner(self, games):
+        """
+        Work out the winner and loser from the games, in index order.
+        returns the winner, the loser and whether the loser was balled
+        """
         game_wins = {'challenger': 0, 'opponent': 0}
 
-        winner_rank = min(self.challenger_rank, self.opponent_rank)
-        loser_rank = max(self.challenger_rank, self.opponent_rank)
-
-        for game in self.game_set.all():
+        for game in games:
             # if a player is balled in any game they immediately lose the match
-            if game.balled == self.challenger:
-                self.winner = self.opponent
-                self.opponent.userprofile.update_rank(winner_rank)
-                self.winner_rank = self.opponent.userprofile.rank
-
-                self.loser = self.challenger
-                self.challenger.userprofile.update_rank(loser_rank, balled=True)
-                self.loser_rank = self.challenger.userprofile.rank
-
-                self.save()
-                # we should let everyone know
-                async_to_sync(get_channel_layer().send)(
-                    'notifications',
-                    {
-                        'type': 'slack',
-                        'message': '{} JUST GOT BALLED!'.format(
-                                        (
-                                            '<@{}>'.format(self.challenger.userprofile.slack_id)
-                                            if self.challenger.userprofile.slack_id
-                                            else self.challenger.username
-                                        )
-                                    )
-                    }
-                )
-                return
+            if game.balled_id == self.challenger_id:
+                return self.opponent, self.challenger, True
 
-            if game.balled == self.opponent:
-                self.winner = self.challenger
-                self.challenger.userprofile.update_rank(winner_rank)
-                self.winner_rank = self.challenger.userprofile.rank
-
-                self.loser = self.opponent
-                self.opponent.userprofile.update_rank(loser_rank, balled=True)
-                self.loser_rank = self.opponent.userprofile.rank
-
-                self.save()
-                # we should let everyone know
-                async_to_sync(get_channel_layer().send)(
-                    'notifications',
-                    {
-                        'type': 'slack',
-                        'message': '{} JUST GOT BALLED!'.format(
-                            (
-                                '<@{}>'.format(self.opponent.userprofile.slack_id)
-                                if self.opponent.userprofile.slack_id
-                                else self.opponent.username
-                            )
-                        )
-                    }
-                )
-                return
+            if game.balled_id == self.opponent_id:
+                return self.challenger, self.opponent, True
 
             # otherwise get the tally going
-            if game.winner == self.challenger:
+            if game.winner_id == self.challenger_id:
                 game_wins['challenger'] += 1
 
-            if game.winner == self.opponent:
+            if game.winner_id == self.opponent_id:
                 game_wins['opponent'] += 1
 
         # at this point it's down to a best of 3
         if game_wins['challenger'] >= 2:
-            self.winner = self.challenger
-            self.loser = self.opponent
-        else:
-            self.winner = self.opponent
-            self.loser = self.challenger
-
-        self.save()
+            return self.challenger, self.opponent, False
 
-        self.winner.userprofile.update_rank(winner_rank)
-        self.winner_rank = self.winner.userprofile.rank
+        return self.opponent, self.challenger, False
 
-        self.loser.userprofile.update_rank(loser_rank)
-        self.loser_rank = self.loser.userprofile.rank
-
-        self.save()
-
-        async_to_sync(get_channel_layer().send)(
-            'notifications',
-            {
-                'type': 'slack',
-                'message': '{} has beaten {}!'.format(
-                    self.winner,
-                    self.loser
-                )
-            }
-        )
+    def result_message(self, balled):
+        """
+        return the slack message announcing the result
+        """
+        if balled:
+            return '{} JUST GOT BALLED!'.format(self.loser.userprofile.slack_mention)
 
-        return
+        return '{} has beaten {}!'.format(self.winner, self.loser)
 
     def serialize(self):
         """
@@ -539,6 +562,8 @@ class Match(models.Model):
             match_data['loser'] = self.loser.username
             match_data['winner_rank'] = self.winner_rank
             match_data['loser_rank'] = self.loser_rank
+            match_data['winner_rating'] = self.winner_rating
+            match_data['loser_rating'] = self.loser_rating
 
             match_data['games'] = []
 
@@ -577,4 +602,543 @@ class Game(models.Model):
 
     class Meta:
         ordering = ['match', 'index']
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'index'], name='game_match_index_unique'),
+        ]
+
+    def save(self, broadcast=True, **kwargs):
+        super().save(**kwargs)
+
+        if broadcast:
+            tables_dirty('matches')
+
+
+class MatchParticipant(models.Model):
+    """
+    One row for each player in a match, so a player's history is a single index range rather than
+    an OR across the challenger and opponent columns.
+    Rewritten from the match whenever it is saved, with the bulk updates to matches keeping it in step
+    """
+    CHALLENGER = 'challenger'
+    OPPONENT = 'opponent'
+    OPEN = 'open'
+    DECLINED = 'declined'
+    WON = 'won'
+    LOST = 'lost'
+
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='participations')
+    role = models.CharField(max_length=10, choices=[(CHALLENGER, 'Challenger'), (OPPONENT, 'Opponent')])
+    # copied from the match to order a player's history without joining to it
+    challenge_time = models.DateTimeField()
+    played = models.DateTimeField(null=True, blank=True)
+    result = models.CharField(
+        max_length=10,
+        choices=[(OPEN, 'Open'), (DECLINED, 'Declined'), (WON, 'Won'), (LOST, 'Lost')],
+        default=OPEN
+    )
+    rank_before = models.IntegerField(null=True, blank=True)
+    rank_after = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['match', 'role']
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'role'], name='participant_match_role_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'played'], name='participant_user_played_idx'),
+            models.Index(fields=['user', 'challenge_time'], name='participant_user_time_idx'),
+            models.Index(fields=['user', 'result'], name='participant_user_result_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(self.match_id, self.role, self.user_id)
+
+    @classmethod
+    def for_match(cls, match):
+        """
+        return the unsaved challenger and opponent rows for the match
+        """
+        participants = []
+
+        for role, user_id, rank_before in [
+            (cls.CHALLENGER, match.challenger_id, match.challenger_rank),
+            (cls.OPPONENT, match.opponent_id, match.opponent_rank)
+        ]:
+            if match.declined:
+                result = cls.DECLINED
+            elif match.winner_id is None:
+                # includes a match that has been started but has no result yet
+                result = cls.OPEN
+            else:
+                result = cls.WON if match.winner_id == user_id else cls.LOST
+
+            rank_after = None
+
+            if result == cls.WON:
+                rank_after = match.winner_rank
+            elif result == cls.LOST:
+                rank_after = match.loser_rank
+
+            participants.append(
+                cls(
+                    match_id=match.pk,
+                    user_id=user_id,
+                    role=role,
+                    challenge_time=match.challenge_time,
+                    played=match.played,
+                    result=result,
+                    rank_before=rank_before,
+                    rank_after=rank_after
+                )
+            )
+
+        return participants
+
+    @classmethod
+    def sync(cls, matches):
+        """
+        Replace the rows for the given matches with ones built from their current state
+        """
+        matches = list(matches)
+
+        with transaction.atomic():
+            cls.objects.filter(match__in=[match.pk for match in matches]).delete()
+            return cls.objects.bulk_create([
+                participant for match in matches for participant in cls.for_match(match)
+            ])
+
+
+class PlayerStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    matches_won = models.IntegerField(default=0)
+    matches_lost = models.IntegerField(default=0)
+    games_won = models.IntegerField(default=0)
+    streak = models.IntegerField(default=0)
+    last_played = models.DateTimeField(null=True, blank=True)
+    is_top = models.BooleanField(default=False)
+    is_bottom = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name_plural = 'player stats'
+
+    def __str__(self):
+        return '{} {}-{}'.format(self.user, self.matches_won, self.matches_lost)
 
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """
+        Replace the stats for the given users (or everyone) with ones calculated from the match history
+        """
+        with transaction.atomic():
+            stats = [
+                cls(**values) for values in calculate_player_stats(UserProfile, Match, Game, user_ids)
+            ]
+            existing = cls.objects.all()
+
+            if user_ids is not None:
+                existing = existing.filter(user_id__in=user_ids)
+
+            existing.delete()
+            return cls.objects.bulk_create(stats)
+
+    @classmethod
+    def record_match(cls, match, games):
+        """
+        Add a newly played match to the winner and loser stats
+        """
+        stats = {
+            stat.user_id: stat
+            for stat in cls.objects.select_for_update().filter(user_id__in=[match.winner_id, match.loser_id])
+        }
+
+        for user_id in [match.winner_id, match.loser_id]:
+            if user_id not in stats:
+                stats[user_id] = cls.objects.create(user_id=user_id)
+
+        winner = stats[match.winner_id]
+        winner.matches_won += 1
+        winner.streak = winner.streak + 1 if winner.streak > 0 else 1
+
+        loser = stats[match.loser_id]
+        loser.matches_lost += 1
+        loser.streak = loser.streak - 1 if loser.streak < 0 else -1
+
+        for stat in [winner, loser]:
+            stat.last_played = match.played
+            stat.games_won += len([game for game in games if game.winner_id == stat.user_id])
+
+        cls.objects.bulk_update(
+            [winner, loser],
+            ['matches_won', 'matches_lost', 'games_won', 'streak', 'last_played']
+        )
+
+    @classmethod
+    def refresh_extremes(cls):
+        """
+        Mark who is at the top and bottom of the ladder
+        """
+        ranks = UserProfile.objects.filter(active=True).aggregate(min_rank=Min('rank'), max_rank=Max('rank'))
+        cls.objects.update(
+            is_top=Case(
+                When(user__in=UserProfile.objects.filter(rank=ranks['min_rank']).values('user'), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            ),
+            is_bottom=Case(
+                When(user__in=UserProfile.objects.filter(rank=ranks['max_rank']).values('user'), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            )
+        )
+
+
+class HeadToHead(models.Model):
+    """
+    The record of a pair of players against each other, stored once for the pair with player_a the lower user id.
+    Kept up to date as results are recorded
+    """
+    player_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name='head_to_head_a')
+    player_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name='head_to_head_b')
+    # matches and games won, and times balled, by each player
+    a_wins = models.IntegerField(default=0)
+    b_wins = models.IntegerField(default=0)
+    a_games = models.IntegerField(default=0)
+    b_games = models.IntegerField(default=0)
+    a_balled = models.IntegerField(default=0)
+    b_balled = models.IntegerField(default=0)
+    last_played = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'head to head'
+        constraints = [
+            models.UniqueConstraint(fields=['player_a', 'player_b'], name='headtohead_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['player_b'], name='headtohead_player_b_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}-{} {}'.format(self.player_a, self.a_wins, self.b_wins, self.player_b)
+
+    @staticmethod
+    def pair(user_id, other_id):
+        return min(user_id, other_id), max(user_id, other_id)
+
+    @property
+    def matches(self):
+        return self.a_wins + self.b_wins
+
+    @classmethod
+    def between(cls, user_id, other_id):
+        """
+        return the record of the pair, unsaved and empty if they haven't played each other
+        """
+        player_a_id, player_b_id = cls.pair(user_id, other_id)
+        record = cls.objects.filter(player_a_id=player_a_id, player_b_id=player_b_id).first()
+        return record or cls(player_a_id=player_a_id, player_b_id=player_b_id)
+
+    @classmethod
+    def for_player(cls, user):
+        """
+        return the records of everyone the user has played, most played first
+        """
+        return cls.objects.filter(
+            Q(player_a=user) | Q(player_b=user)
+        ).select_related(
+            'player_a__userprofile',
+            'player_b__userprofile'
+        ).order_by(
+            (F('a_wins') + F('b_wins')).desc(),
+            '-last_played'
+        )
+
+    def opponent_of(self, user_id):
+        return self.player_b if user_id == self.player_a_id else self.player_a
+
+    def record_for(self, user_id):
+        """
+        return the record as seen by one of the pair
+        """
+        mine, theirs = ('a', 'b') if user_id == self.player_a_id else ('b', 'a')
+        return {
+            'matches': self.matches,
+            'won': getattr(self, '{}_wins'.format(mine)),
+            'lost': getattr(self, '{}_wins'.format(theirs)),
+            'games_won': getattr(self, '{}_games'.format(mine)),
+            'games_lost': getattr(self, '{}_games'.format(theirs)),
+            'balled': getattr(self, '{}_balled'.format(mine)),
+            'balled_opponent': getattr(self, '{}_balled'.format(theirs)),
+            'last_played': self.last_played,
+        }
+
+    @classmethod
+    def record_match(cls, match, games):
+        """
+        Add a newly played match to the record of its two players
+        """
+        player_a_id, player_b_id = cls.pair(match.challenger_id, match.opponent_id)
+
+        # make sure the row is there before locking it, get_or_create copes with another result creating it first
+        cls.objects.get_or_create(player_a_id=player_a_id, player_b_id=player_b_id)
+        record = cls.objects.select_for_update().get(player_a_id=player_a_id, player_b_id=player_b_id)
+
+        side = {player_a_id: 'a', player_b_id: 'b'}
+        counts = [('wins', match.winner_id)]
+
+        for game in games:
+            counts += [('games', game.winner_id), ('balled', game.balled_id)]
+
+        for field, user_id in counts:
+            if user_id in side:
+                name = '{}_{}'.format(side[user_id], field)
+                setattr(record, name, getattr(record, name) + 1)
+
+        record.last_played = match.played
+        record.save()
+        return record
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Replace every record with ones totalled up from the match history
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            return cls.objects.bulk_create(
+                [
+                    cls(player_a_id=player_a_id, player_b_id=player_b_id, **values)
+                    for (player_a_id, player_b_id), values in calculate_head_to_head(Match, Game).items()
+                ]
+            )
+
+
+class PlayerRating(models.Model):
+    """
+    A player's Elo rating in a season, moved as each result is recorded
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ratings')
+    season = models.ForeignKey(Season, on_delete=models.CASCADE, blank=True, null=True)
+    rating = models.FloatField(default=initial_rating)
+    matches = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-rating']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'season'], name='playerrating_user_season_unique'),
+        ]
+
+    def __str__(self):
+        return '{} {:.0f}'.format(self.user, self.rating)
+
+    @classmethod
+    def record_match(cls, match):
+        """
+        Move the winner and loser ratings for the season of a newly played match.
+        returns the winner and loser ratings after it
+        """
+        ratings = {
+            rating.user_id: rating
+            for rating in cls.objects.select_for_update().filter(
+                season_id=match.season_id,
+                user_id__in=[match.winner_id, match.loser_id]
+            )
+        }
+
+        for user_id in [match.winner_id, match.loser_id]:
+            if user_id not in ratings:
+                ratings[user_id] = cls.objects.create(user_id=user_id, season_id=match.season_id)
+
+        winner = ratings[match.winner_id]
+        loser = ratings[match.loser_id]
+        winner.rating, loser.rating = elo(winner.rating, loser.rating)
+        winner.matches += 1
+        loser.matches += 1
+
+        cls.objects.bulk_update([winner, loser], ['rating', 'matches'])
+        return winner.rating, loser.rating
+
+    @classmethod
+    def rebuild(cls, season_ids=None):
+        """
+        Replace the ratings for the given seasons (or all of them) with ones replayed from the match history,
+        along with the ratings on the matches and the current ratings on the ladder
+        """
+        with transaction.atomic():
+            ratings, match_ratings = calculate_ratings(Match, season_ids)
+            existing = cls.objects.all()
+            matches = Match.objects.filter(played__isnull=False)
+
+            if season_ids is not None:
+                existing = existing.filter(season_id__in=season_ids)
+                matches = matches.filter(season_id__in=season_ids)
+
+            existing.delete()
+            created = cls.objects.bulk_create(
+                [
+                    cls(user_id=user_id, season_id=season_id, **values)
+                    for (user_id, season_id), values in ratings.items()
+                ]
+            )
+
+            # only touch the matches whose ratings have moved so incremental exports don't pull everything again
+            changed = []
+            updated = now()
+
+            for match in matches.only('pk', 'winner_rating', 'loser_rating').iterator():
+                winner_rating, loser_rating = match_ratings.get(match.pk, (None, None))
+
+                if (match.winner_rating, match.loser_rating) != (winner_rating, loser_rating):
+                    match.winner_rating = winner_rating
+                    match.loser_rating = loser_rating
+                    match.updated = updated
+                    changed.append(match)
+
+            Match.objects.bulk_update(changed, ['winner_rating', 'loser_rating', 'updated'], batch_size=500)
+
+            season = Season.objects.first()
+            season_id = season.pk if season else None
+
+            if season_ids is None or season_id in season_ids:
+                profiles = list(UserProfile.objects.all())
+
+                for profile in profiles:
+                    rating = ratings.get((profile.user_id, season_id))
+                    profile.rating = rating['rating'] if rating else settings.RATING_INITIAL
+                    profile.updated = updated
+
+                UserProfile.objects.bulk_update(profiles, ['rating', 'updated'])
+
+            tables_dirty('users', 'matches')
+
+        return created
+
+
+class SeasonStanding(models.Model):
+    """
+    Where a player finished a season, written once when the next season starts and not changed after
+    """
+    season = models.ForeignKey(Season, on_delete=models.CASCADE, related_name='standings')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='season_standings')
+    rank = models.IntegerField()
+    matches_won = models.IntegerField(default=0)
+    matches_lost = models.IntegerField(default=0)
+    games_won = models.IntegerField(default=0)
+    rating = models.FloatField(default=initial_rating)
+
+    class Meta:
+        ordering = ['season', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['season', 'user'], name='seasonstanding_season_user_unique'),
+        ]
+
+    def __str__(self):
+        return '{} #{} season {}'.format(self.user, self.rank, self.season_id)
+
+
+class DailyStanding(models.Model):
+    """
+    The ladder at the end of a day, one row per player.
+    Days nothing happened on can be left out, the ladder on any date is the latest day on or before it
+    """
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_standings')
+    rank = models.IntegerField()
+    rating = models.FloatField(default=initial_rating)
+
+    class Meta:
+        ordering = ['-date', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user'], name='dailystanding_date_user_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'rank'], name='dailystanding_date_rank_idx'),
+        ]
+
+    def __str__(self):
+        return '{} #{} on {}'.format(self.user, self.rank, self.date)
+
+
+class LadderEvent(models.Model):
+    """
+    A change to a player's place on the ladder, None meaning they aren't on it.
+    Events are only ever added, so the ladder at any time can be replayed from them, see pool_ladder.history
+    """
+    RESULT = 'result'
+    BALLED = 'balled'
+    FORFEIT = 'forfeit'
+    SEASON = 'season'
+    EDIT = 'edit'
+    JOIN = 'join'
+
+    time = models.DateTimeField(default=timezone.now)
+    kind = models.CharField(
+        max_length=10,
+        choices=[
+            (RESULT, 'Result'),
+            (BALLED, 'Balled'),
+            (FORFEIT, 'Forfeit'),
+            (SEASON, 'New season'),
+            (EDIT, 'Edited'),
+            (JOIN, 'Joined')
+        ]
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ladder_events')
+    rank_before = models.IntegerField(null=True, blank=True)
+    rank_after = models.IntegerField(null=True, blank=True)
+    match = models.ForeignKey(Match, on_delete=models.SET_NULL, blank=True, null=True)
+    season = models.ForeignKey(Season, on_delete=models.SET_NULL, blank=True, null=True)
+
+    class Meta:
+        ordering = ['time', 'pk']
+        indexes = [
+            models.Index(fields=['time'], name='ladderevent_time_idx'),
+            models.Index(fields=['user', 'time'], name='ladderevent_user_time_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {} {} -> {}'.format(self.time, self.user_id, self.rank_before, self.rank_after)
+
+    def save(self, **kwargs):
+        if self.pk is not None:
+            raise ValueError('ladder events can not be changed once recorded')
+
+        super().save(**kwargs)
+
+    @classmethod
+    def record(cls, kind, moves, match=None, season=None, time=None):
+        """
+        Add an event for each (user_id, rank_before, rank_after) in moves where the rank changed
+        """
+        time = time or now()
+        return cls.objects.bulk_create(
+            [
+                cls(
+                    time=time,
+                    kind=kind,
+                    user_id=user_id,
+                    rank_before=rank_before,
+                    rank_after=rank_after,
+                    match=match,
+                    season=season
+                ) for user_id, rank_before, rank_after in moves if rank_before != rank_after
+            ]
+        )
+
+
+class FailedNotification(models.Model):
+    """
+    A slack post or email that could not be delivered after all retries
+    """
+    kind = models.CharField(max_length=10, choices=[('slack', 'Slack'), ('email', 'Email')])
+    # the json event that can be sent again
+    payload = models.TextField()
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    failed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-failed']
+
+    def __str__(self):
+        return '{} failed {}'.format(self.kind, self.failed)
@@ -0,0 +1,228 @@
+import json
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from requests.adapters import HTTPAdapter
+
+from pool_ladder.models import FailedNotification
+
+# slack truncates very long messages so a digest is split into posts no longer than this
+SLACK_MESSAGE_LIMIT = 3500
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+
+
+def get_session():
+    """
+    return the keep-alive session shared by the notification threads
+    """
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.NOTIFICATION_CONCURRENCY)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+
+    return _session
+
+
+def get_executor():
+    """
+    return the thread pool that deliveries are run in, which bounds how many are in flight
+    """
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.NOTIFICATION_CONCURRENCY,
+                thread_name_prefix='notifications'
+            )
+
+    return _executor
+
+
+def is_transient(error):
+    """
+    Whether a failed attempt is worth making again: dropped connections, timeouts, server errors and rate limiting.
+    Anything else, like a bad webhook url or a refused address, will fail the same way every time
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+
+    if isinstance(error, smtplib.SMTPResponseException):
+        # smtp uses 4xx codes for failures that may clear up
+        return 400 <= error.smtp_code < 500
+
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+
+    # requests and smtplib raise their connection errors and timeouts as OSErrors
+    return isinstance(error, OSError)
+
+
+def with_retries(send):
+    """
+    Call send until it succeeds, backing off exponentially between attempts.
+    Errors that won't clear up are not retried.
+    Returns the last error (None once it has been sent) and the number of attempts made
+    """
+    error = None
+    attempt = 0
+
+    while attempt <= settings.NOTIFICATION_RETRIES:
+        if attempt:
+            time.sleep(settings.NOTIFICATION_BACKOFF * 2 ** (attempt - 1))
+
+        attempt += 1
+
+        try:
+            send()
+            return None, attempt
+        except Exception as e:
+            error = e
+            print('notification attempt {} failed: {}'.format(attempt, e))
+
+            if not is_transient(e):
+                break
+
+    return error, attempt
+
+
+def dead_letter(kind, payload, error, attempts):
+    FailedNotification.objects.create(
+        kind=kind,
+        payload=json.dumps(payload),
+        error=str(error),
+        attempts=attempts
+    )
+    print('{} notification moved to the dead letter store'.format(kind))
+
+
+def digest(messages, limit=SLACK_MESSAGE_LIMIT):
+    """
+    combine the messages into as few slack posts as will fit under the limit
+    """
+    posts = []
+    post = ''
+
+    for message in messages:
+        if post and len(post) + len(message) + 1 > limit:
+            posts.append(post)
+            post = message
+        else:
+            post = '{}\n{}'.format(post, message) if post else message
+
+    if post:
+        posts.append(post)
+
+    return posts
+
+
+def post_slack(message):
+    response = get_session().post(
+        settings.SLACK_WEBHOOK_URL,
+        json={'text': message},
+        timeout=settings.NOTIFICATION_TIMEOUT
+    )
+    response.raise_for_status()
+
+
+def deliver_slack(messages):
+    """
+    post a digest of the messages to slack
+    """
+    if not settings.SLACK_WEBHOOK_URL:
+        return
+
+    for message in digest(messages):
+        error, attempts = with_retries(lambda: post_slack(message))
+
+        if error:
+            dead_letter('slack', {'type': 'slack', 'message': message}, error, attempts)
+        else:
+            print('notified by slack')
+
+
+def challenge_email(event, connection=None):
+    return EmailMessage(
+        '{} Challenge'.format(settings.LADDER_NAME),
+        '{} has challenged you to a {} match.\n'
+        'It needs to be played by {} or you will forfeit'.format(
+            event.get('challenger'),
+            settings.LADDER_NAME,
+            event.get('time_until')
+        ),
+        '<{}>{}'.format(settings.FROM_EMAIL, settings.LADDER_NAME),
+        [
+            event.get('email')
+        ],
+        connection=connection
+    )
+
+
+def deliver_email(events):
+    """
+    send the challenge emails over a single connection
+    """
+    if not settings.FROM_EMAIL:
+        return
+
+    connection = get_connection()
+
+    try:
+        for event in events:
+            message = challenge_email(event, connection)
+            error, attempts = with_retries(message.send)
+
+            if error:
+                dead_letter('email', event, error, attempts)
+            else:
+                print('notified {} by email'.format(event.get('email')))
+    finally:
+        connection.close()
+
+
+def deliver(kind, items):
+    """
+    Deliver a batch in a notification thread.
+    The thread's database connection is tidied up afterwards as there is no request to do it
+    """
+    try:
+        if kind == 'slack':
+            deliver_slack(items)
+        else:
+            deliver_email(items)
+    finally:
+        close_old_connections()
+
+
+def retry_failed(notification):
+    """
+    Make one more attempt at a dead letter, removing it if it goes through
+    """
+    event = json.loads(notification.payload)
+
+    try:
+        if notification.kind == 'slack':
+            post_slack(event['message'])
+        else:
+            challenge_email(event).send()
+    except Exception as e:
+        notification.attempts += 1
+        notification.error = str(e)
+        notification.save()
+        return False
+
+    notification.delete()
+    return True
@@ -0,0 +1,24 @@
+import pygal
+from pygal.style import CleanStyle
+
+
+def render(ranks, max_rank):
+    """
+    Use Pygal to render the rank movements as a data uri
+    """
+    chart = pygal.DateTimeLine(
+        title='Rank Movements',
+        x_label_rotation=35,
+        x_title='Date Played',
+        y_title='Rank',
+        range=(1, max_rank),
+        inverse_y_axis=True,
+        show_legend=False,
+        truncate_label=-1,
+        x_value_formatter=lambda dt: dt.strftime('%b. %d, %Y, %I:%M %p'),
+        style=CleanStyle(
+            font_family='googlefont:Raleway',
+        ),
+    )
+    chart.add('', ranks)
+    return chart.render_data_uri()
@@ -0,0 +1,52 @@
+from django.conf import settings
+
+
+def initial_rating():
+    return settings.RATING_INITIAL
+
+
+def expected_score(rating, opponent_rating):
+    """
+    return the chance of a player with rating beating one with opponent_rating
+    """
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def elo(winner_rating, loser_rating, k_factor=None):
+    """
+    return the winner and loser ratings after a match between them
+    """
+    if k_factor is None:
+        k_factor = settings.RATING_K_FACTOR
+
+    change = k_factor * (1 - expected_score(winner_rating, loser_rating))
+    return winner_rating + change, loser_rating - change
+
+
+def calculate_ratings(match_model, season_ids=None):
+    """
+    Replay the played matches in one pass to work out every player's rating in each season.
+    Each result depends on the ratings left by the one before so they are worked through in the order they were played.
+    Returns the ratings as {(user_id, season_id): {'rating', 'matches'}} and {match_id: (winner_rating, loser_rating)}.
+    The model is passed in as pool_ladder.models imports this module
+    """
+    matches = match_model.objects.filter(played__isnull=False, winner__isnull=False, loser__isnull=False)
+
+    if season_ids is not None:
+        matches = matches.filter(season_id__in=season_ids)
+
+    ratings = {}
+    match_ratings = {}
+
+    for pk, season_id, winner_id, loser_id in matches.order_by('played', 'pk').values_list(
+        'pk', 'season_id', 'winner_id', 'loser_id'
+    ).iterator():
+        winner = ratings.setdefault((winner_id, season_id), {'rating': settings.RATING_INITIAL, 'matches': 0})
+        loser = ratings.setdefault((loser_id, season_id), {'rating': settings.RATING_INITIAL, 'matches': 0})
+
+        winner['rating'], loser['rating'] = elo(winner['rating'], loser['rating'])
+        winner['matches'] += 1
+        loser['matches'] += 1
+        match_ratings[pk] = (winner['rating'], loser['rating'])
+
+    return ratings, match_ratings
@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.utils.timezone import now
+
+from pool_ladder.charts import invalidate_rank_charts
+from pool_ladder.fanout import challenge_closed, notify_slack, tables_dirty
+from pool_ladder.models import Game, HeadToHead, LadderEvent, Match, PlayerRating, PlayerStats, UserProfile
+
+
+def parse_games(match, cleaned_data):
+    """
+    Turn the MatchForm data into a (winner, balled) pair of users for each game.
+    The form only offers the two players so they don't need looking up
+    """
+    players = {
+        str(match.challenger_id): match.challenger,
+        str(match.opponent_id): match.opponent
+    }
+
+    return [
+        (
+            players.get(cleaned_data.get('game_{}_winner'.format(index))),
+            players.get(cleaned_data.get('game_{}_balled'.format(index)))
+        ) for index in range(3)
+    ]
+
+
+def record_result(match, games, forfeit=False):
+    """
+    Record the games for a match, decide the winner and loser and move them on the ladder in one transaction.
+    A single table update and slack notification are sent once it commits.
+    forfeit marks the ladder events as coming from a challenge that ran out of time.
+    Returns the played match or None if results had already been entered
+    """
+    with transaction.atomic():
+        match = Match.objects.select_for_update(
+            of=('self',)
+        ).select_related(
+            'challenger',
+            'opponent'
+        ).get(
+            pk=match.pk
+        )
+
+        if match.played:
+            return None
+
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.select_for_update().filter(
+                user_id__in=[match.challenger_id, match.opponent_id]
+            )
+        }
+        challenger = match.challenger.userprofile = profiles[match.challenger_id]
+        opponent = match.opponent.userprofile = profiles[match.opponent_id]
+
+        match.played = now()
+
+        if not match.challenger_rank:
+            match.challenger_rank = challenger.rank
+
+        if not match.opponent_rank:
+            match.opponent_rank = opponent.rank
+
+        # write the games, creating any that don't exist yet
+        existing = {game.index: game for game in match.game_set.all()}
+        new_games = []
+
+        for index, (winner, balled) in enumerate(games):
+            game = existing.get(index)
+
+            if game is None:
+                game = Game(index=index, match=match)
+                new_games.append(game)
+
+            game.winner = winner
+            game.balled = balled
+
+        if existing:
+            Game.objects.bulk_update(existing.values(), ['winner', 'balled'])
+
+        if new_games:
+            Game.objects.bulk_create(new_games)
+
+        games = sorted(list(existing.values()) + new_games, key=lambda game: game.index)
+        match.winner, match.loser, balled = match.decide_winner(games)
+
+        winner = profiles[match.winner.pk]
+        loser = profiles[match.loser.pk]
+
+        winner_rank = min(match.challenger_rank, match.opponent_rank)
+        loser_rank = max(match.challenger_rank, match.opponent_rank)
+
+        match.winner_rating, match.loser_rating = PlayerRating.record_match(match)
+        winner.rating = match.winner_rating
+        loser.rating = match.loser_rating
+
+        if balled:
+            winner.update_rank(winner_rank, broadcast=False, match=match)
+            loser.update_rank(loser_rank, balled=True, broadcast=False, match=match)
+        else:
+            LadderEvent.record(
+                LadderEvent.FORFEIT if forfeit else LadderEvent.RESULT,
+                [(winner.user_id, winner.rank, winner_rank), (loser.user_id, loser.rank, loser_rank)],
+                match=match,
+                time=match.played
+            )
+            winner.movement = winner_rank - winner.rank
+            winner.rank = winner_rank
+            loser.movement = loser_rank - loser.rank
+            loser.rank = loser_rank
+            winner.updated = loser.updated = match.played
+            UserProfile.objects.bulk_update([winner, loser], ['rank', 'movement', 'rating', 'updated'])
+
+        match.winner_rank = winner.rank
+        match.loser_rank = loser.rank
+        match.save(broadcast=False)
+
+        PlayerStats.record_match(match, games)
+        HeadToHead.record_match(match, games)
+        PlayerStats.refresh_extremes()
+
+        invalidate_rank_charts([match.challenger_id, match.opponent_id])
+
+        # everything has changed in one go so tell everyone once
+        tables_dirty('matches', 'users', 'challenges')
+        challenge_closed(match.pk)
+        notify_slack(match.result_message(balled))
+
+    return match
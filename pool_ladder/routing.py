@@ -2,7 +2,7 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
 from django.conf.urls import url
 
-from pool_ladder.consumers import MainConsumer, NotificationConsumer
+from pool_ladder.consumers import FanoutConsumer, MainConsumer, NotificationConsumer
 
 application = ProtocolTypeRouter({
     # Empty for now (http->django views is added by default)
@@ -12,6 +12,7 @@ application = ProtocolTypeRouter({
         ])
     ),
     'channel': ChannelNameRouter({
-        'notifications': NotificationConsumer
+        'notifications': NotificationConsumer,
+        'fanout': FanoutConsumer
     }),
 })
@@ -0,0 +1,138 @@
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from pool_ladder.charts import invalidate_all_rank_charts
+from pool_ladder.fanout import challenge_closed, tables_dirty
+from pool_ladder.models import LadderEvent, Match, MatchParticipant, PlayerStats, Season, UserProfile
+from pool_ladder.standings import write_season_standings
+
+
+def random_order(profiles, previous, rng):
+    rng.shuffle(profiles)
+    return profiles
+
+
+def previous_order(profiles, previous, rng):
+    """
+    keep the order the ladder finished the last season in
+    """
+    return sorted(profiles, key=lambda profile: (profile.rank, profile.pk))
+
+
+def record_order(profiles, previous, rng):
+    """
+    seed the ladder on the matches won less those lost last season, ties keep their finishing order
+    """
+    scores = Counter()
+
+    if previous is not None:
+        for winner_id, loser_id in Match.objects.filter(
+            season=previous,
+            played__isnull=False
+        ).values_list(
+            'winner_id',
+            'loser_id'
+        ):
+            scores[winner_id] += 1
+            scores[loser_id] -= 1
+
+    return sorted(profiles, key=lambda profile: (-scores[profile.user_id], profile.rank, profile.pk))
+
+
+def elo_order(profiles, previous, rng):
+    """
+    seed the ladder on the Elo ratings players finished last season with, ties keep their finishing order
+    """
+    return sorted(profiles, key=lambda profile: (-profile.rating, profile.rank, profile.pk))
+
+
+# the ways the ranks can be set for a new season, each is given the active profiles, the season before and a Random
+STRATEGIES = {
+    'random': random_order,
+    'previous': previous_order,
+    'record': record_order,
+    'elo': elo_order,
+}
+
+
+def start_new_season(strategy='random', carry_challenges=False, seed=None):
+    """
+    Start the next season and rank the active players for it in one transaction, keeping the standings the last one
+    finished with.
+    Open challenges are declined, or moved into the new season with the players' new ranks if carry_challenges is set.
+    A single table update is sent once it commits.
+    Returns the new season
+    """
+    order = STRATEGIES[strategy]
+
+    with transaction.atomic():
+        previous = Season.objects.select_for_update().first()
+        season = Season.objects.create(number=previous.number + 1 if previous else 1)
+
+        profiles = list(UserProfile.objects.select_for_update().filter(active=True))
+        updated = now()
+
+        if previous is not None:
+            # keep where everyone finished before the ranks are set for the new season
+            write_season_standings(
+                previous,
+                [
+                    (profile.user_id, profile.rank, profile.rating)
+                    for profile in sorted(profiles, key=lambda profile: (profile.rank, profile.pk))
+                ]
+            )
+
+        finished = {profile.user_id: profile.rank for profile in profiles}
+
+        for rank, profile in enumerate(order(profiles, previous, random.Random(seed)), start=1):
+            profile.rank = rank
+            # everyone starts the season on the same rating
+            profile.rating = settings.RATING_INITIAL
+            profile.updated = updated
+
+        UserProfile.objects.bulk_update(profiles, ['rank', 'rating', 'updated'])
+        LadderEvent.record(
+            LadderEvent.SEASON,
+            [(profile.user_id, finished[profile.user_id], profile.rank) for profile in profiles],
+            season=season,
+            time=updated
+        )
+
+        challenges = Match.objects.filter(played__isnull=True, declined=False)
+
+        if carry_challenges:
+            ranks = {profile.user_id: profile.rank for profile in profiles}
+            open_challenges = list(challenges)
+
+            for challenge in open_challenges:
+                challenge.season = season
+                challenge.challenger_rank = ranks.get(challenge.challenger_id, challenge.challenger_rank)
+                challenge.opponent_rank = ranks.get(challenge.opponent_id, challenge.opponent_rank)
+                challenge.updated = updated
+
+            Match.objects.bulk_update(open_challenges, ['season', 'challenger_rank', 'opponent_rank', 'updated'])
+            MatchParticipant.sync(open_challenges)
+        else:
+            for pk in challenges.values_list('pk', flat=True):
+                challenge_closed(pk)
+
+            # started matches aren't declined so leave their players alone too
+            MatchParticipant.objects.filter(
+                result=MatchParticipant.OPEN,
+                played__isnull=True
+            ).update(
+                result=MatchParticipant.DECLINED
+            )
+            challenges.update(declined=True, updated=updated)
+
+        PlayerStats.refresh_extremes()
+        invalidate_all_rank_charts()
+
+        # the whole ladder has moved so tell everyone once
+        tables_dirty('users', 'challenges')
+
+    return season
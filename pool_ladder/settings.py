@@ -65,7 +65,7 @@ ROOT_URLCONF = 'pool_ladder.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'pool_ladder.metrics.MeasuredTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -139,16 +139,40 @@ LOGIN_REDIRECT_URL = 'index'
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'index'
 
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env['REDIS_URL'],
+    }
+}
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
             "hosts": [env['REDIS_URL']],
-            "group_expiry": 120
+            "group_expiry": 120,
+            "channel_capacity": {
+                "fanout": 1000,
+                "expiry": 1000,
+                "notifications": 1000
+            }
         },
     },
 }
 
+# seconds over which table changes are merged before the sockets are told to redraw
+FANOUT_WINDOW = float(env.get('FANOUT_WINDOW', 0.5))
+
+# messages each websocket can have waiting to be sent before it stops taking more from the channel layer
+SOCKET_SEND_QUEUE = int(env.get('SOCKET_SEND_QUEUE', 16))
+
+# seconds between the expiry scheduler reloading open challenges from the database
+EXPIRY_RESYNC = int(env.get('EXPIRY_RESYNC', 3600))
+
+# requests and consumer messages taking at least this many seconds are logged, unset to log none
+METRICS_SLOW_REQUEST = float(env['METRICS_SLOW_REQUEST']) if env.get('METRICS_SLOW_REQUEST') else None
+
 LADDER_NAME = env['LADDER_NAME']
 
 REGISTRATION_OPEN = True
@@ -166,6 +190,15 @@ FROM_EMAIL = env.get('FROM_EMAIL')
 
 SLACK_WEBHOOK_URL = env.get('SLACK_WEBHOOK_URL')
 
+# seconds over which notifications are collected so a burst goes out as one slack post
+NOTIFICATION_WINDOW = float(env.get('NOTIFICATION_WINDOW', 2))
+# deliveries in flight at once, seconds to wait for slack and how many times to retry before giving up
+NOTIFICATION_CONCURRENCY = int(env.get('NOTIFICATION_CONCURRENCY', 4))
+NOTIFICATION_TIMEOUT = float(env.get('NOTIFICATION_TIMEOUT', 10))
+NOTIFICATION_RETRIES = int(env.get('NOTIFICATION_RETRIES', 4))
+# seconds before the first retry, doubling on each attempt after that
+NOTIFICATION_BACKOFF = float(env.get('NOTIFICATION_BACKOFF', 1))
+
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 MESSAGE_TAGS = {
     messages.ERROR: 'danger'
@@ -173,4 +206,17 @@ MESSAGE_TAGS = {
 
 MAX_DAYS_TO_PLAY = env.get('MAX_DAYS_TO_PLAY', 6)
 
+# dates, as YYYY-MM-DD, that don't count as business days when working out how long a challenge has to be played
+HOLIDAYS = env.get('HOLIDAYS', [])
+
+if isinstance(HOLIDAYS, str):
+    HOLIDAYS = [holiday.strip() for holiday in HOLIDAYS.split(',') if holiday.strip()]
+
+# opening and closing times, like 09:00-17:30, challenges made outside them count from the next opening
+WORKING_HOURS = env.get('WORKING_HOURS')
+
+# the Elo rating every player starts each season on and how far a single result can move it
+RATING_INITIAL = float(env.get('RATING_INITIAL', 1500))
+RATING_K_FACTOR = float(env.get('RATING_K_FACTOR', 32))
+
 DATA_SECRET_TOKEN = env.get('DATA_SECRET_TOKEN')
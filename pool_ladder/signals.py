@@ -1,7 +1,7 @@
 from django.dispatch import receiver
 from django_registration.signals import user_registered
 
-from pool_ladder.models import UserProfile
+from pool_ladder.models import LadderEvent, PlayerStats, UserProfile
 
 
 @receiver(user_registered)
@@ -12,5 +12,10 @@ def create_user_profile(sender, **kwargs):
         user=user,
         rank=(UserProfile.objects.all().count() + 1)
     )
+    LadderEvent.record(LadderEvent.JOIN, [(user.pk, None, profile.rank)])
+
+    # the new player is at the bottom
+    PlayerStats.rebuild([user.pk])
+    PlayerStats.refresh_extremes()
 
     print('created profile {} for {}'.format(profile, user))
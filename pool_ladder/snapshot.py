@@ -0,0 +1,91 @@
+import copy
+import threading
+import time
+
+from django.core.cache import cache
+from django.utils.timezone import now
+
+from pool_ladder.availability import LadderAvailability
+from pool_ladder.diffs import decline_rights, open_challenges, played_matches
+from pool_ladder.fanout import ladder_version
+
+SNAPSHOT_KEY = 'ladder_snapshot'
+# the number of played matches kept, enough for the first page of results
+RECENT_RESULTS = 50
+# seconds to wait for another process to finish building a snapshot before building it here
+BUILD_WAIT = 2
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class LadderSnapshot(object):
+    """
+    The ladder, open challenges and recent results as they were at a ladder version.
+    Snapshots are shared between processes through the cache so treat everything in them as read only
+    """
+    def __init__(self, version):
+        self.version = version
+        self.built = now()
+        self.ladder = LadderAvailability()
+        self.profiles = sorted(self.ladder.profiles, key=lambda profile: (profile.rank, profile.pk))
+        self.challenges = list(open_challenges().order_by('challenge_time', 'pk'))
+        self.can_decline = decline_rights(self.challenges)
+        self.recent = list(played_matches().order_by('-played', '-pk')[:RECENT_RESULTS])
+        self.played_count = played_matches().count()
+
+    def availability(self):
+        """
+        return the availability of the ladder as of now
+        """
+        availability = copy.copy(self.ladder)
+        availability.by_user = dict(self.ladder.by_user)
+        availability.now = now()
+        return availability
+
+
+def get_snapshot():
+    """
+    Return the snapshot for the current ladder version.
+    The copy in this process is used until the version moves, then the shared copy,
+    and the database is only read if no process has built it yet
+    """
+    global _snapshot
+    version = ladder_version()
+
+    if _snapshot is not None and _snapshot.version == version:
+        return _snapshot
+
+    with _lock:
+        if _snapshot is not None and _snapshot.version == version:
+            return _snapshot
+
+        snapshot = cache.get(SNAPSHOT_KEY)
+
+        if snapshot is None or snapshot.version != version:
+            snapshot = build_snapshot(version)
+
+        _snapshot = snapshot
+        return snapshot
+
+
+def build_snapshot(version):
+    """
+    Build the snapshot if no other process is doing so, otherwise wait for theirs
+    """
+    building_key = '{}:building:{}'.format(SNAPSHOT_KEY, version)
+
+    if not cache.add(building_key, 1, BUILD_WAIT * 2):
+        deadline = time.time() + BUILD_WAIT
+
+        while time.time() < deadline:
+            time.sleep(0.05)
+            snapshot = cache.get(SNAPSHOT_KEY)
+
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+    snapshot = LadderSnapshot(version)
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    cache.delete(building_key)
+    return snapshot
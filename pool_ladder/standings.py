@@ -0,0 +1,220 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Subquery
+from django.utils.timezone import localdate
+
+from pool_ladder.models import (
+    DailyStanding, Game, Match, MatchParticipant, PlayerRating, Season, SeasonStanding, UserProfile
+)
+
+# rows written per insert while backfilling
+BATCH_SIZE = 1000
+
+
+def season_results(season):
+    """
+    return the matches won and lost and the games won by each player in the season
+    """
+    results = defaultdict(lambda: {'matches_won': 0, 'matches_lost': 0, 'games_won': 0})
+
+    for winner_id, loser_id in Match.objects.filter(
+        season=season,
+        played__isnull=False,
+        winner__isnull=False
+    ).values_list(
+        'winner_id',
+        'loser_id'
+    ):
+        results[winner_id]['matches_won'] += 1
+        results[loser_id]['matches_lost'] += 1
+
+    # clear the default ordering so it isn't added to the group by
+    for winner_id, games_won in Game.objects.filter(
+        match__season=season,
+        match__played__isnull=False,
+        winner__isnull=False
+    ).order_by().values('winner').annotate(
+        games_won=Count('id')
+    ).values_list('winner', 'games_won'):
+        results[winner_id]['games_won'] = games_won
+
+    return results
+
+
+def write_season_standings(season, standings):
+    """
+    Store where each player finished the season, given as (user_id, rank, rating).
+    Standings are only written once for a season so they are left alone if it already has them
+    """
+    if SeasonStanding.objects.filter(season=season).exists():
+        return []
+
+    results = season_results(season)
+    return SeasonStanding.objects.bulk_create(
+        [
+            SeasonStanding(season=season, user_id=user_id, rank=rank, rating=rating, **results[user_id])
+            for user_id, rank, rating in standings
+        ]
+    )
+
+
+def snapshot_day(day=None):
+    """
+    Store the ladder as it is now against the day (today by default), replacing any taken earlier that day
+    """
+    day = day or localdate()
+
+    with transaction.atomic():
+        DailyStanding.objects.filter(date=day).delete()
+        return DailyStanding.objects.bulk_create(
+            [
+                DailyStanding(date=day, user_id=user_id, rank=rank, rating=rating)
+                for user_id, rank, rating in UserProfile.objects.filter(
+                    active=True
+                ).values_list(
+                    'user_id',
+                    'rank',
+                    'rating'
+                )
+            ]
+        )
+
+
+def ladder_as_of(day):
+    """
+    return the standings of the latest day stored on or before day, read in a single query
+    """
+    latest = DailyStanding.objects.filter(date__lte=day).order_by('-date').values('date')[:1]
+    return DailyStanding.objects.filter(date=Subquery(latest)).select_related('user').order_by('rank')
+
+
+def placings(latest):
+    """
+    return the user ids in ladder order from the (rank, played) each came out of their latest match with.
+    ranks move under players who haven't played for a while so ties go to whoever played most recently
+    """
+    return sorted(latest, key=lambda user_id: (latest[user_id][0], -latest[user_id][1].timestamp(), user_id))
+
+
+def backfill_season_standings():
+    """
+    Write the standings of each finished season that doesn't have them, replayed from the ranks players came
+    out of their last match of the season with. Players that didn't play in a season aren't in its standings
+    """
+    current = Season.objects.first()
+    written = []
+
+    for season in Season.objects.filter(standings__isnull=True).exclude(pk=getattr(current, 'pk', None)):
+        latest = {}
+
+        for user_id, rank, played in MatchParticipant.objects.filter(
+            match__season=season,
+            played__isnull=False,
+            rank_after__isnull=False
+        ).order_by(
+            'played'
+        ).values_list(
+            'user_id',
+            'rank_after',
+            'played'
+        ):
+            latest[user_id] = (rank, played)
+
+        ratings = dict(PlayerRating.objects.filter(season=season).values_list('user_id', 'rating'))
+        written += write_season_standings(
+            season,
+            [
+                (user_id, rank, ratings.get(user_id, settings.RATING_INITIAL))
+                for rank, user_id in enumerate(placings(latest), start=1)
+            ]
+        )
+
+    return written
+
+
+def season_start_ranks(season_id):
+    """
+    return the rank each player went into their first match of the season with, as {user_id: rank}
+    """
+    ranks = {}
+
+    # latest first so each player is left with their first match
+    for user_id, rank in MatchParticipant.objects.filter(
+        match__season_id=season_id,
+        played__isnull=False,
+        rank_before__isnull=False
+    ).order_by(
+        '-played'
+    ).values_list(
+        'user_id',
+        'rank_before'
+    ):
+        ranks[user_id] = rank
+
+    return ranks
+
+
+def backfill_daily_standings(since=None):
+    """
+    Write the ladder for each day results were entered on (from since) that doesn't have one, replaying every
+    match up to the end of the day and placing players as backfill_season_standings does.
+    The ladder is reset at the start of each season to the ranks players went into their first match of it with,
+    so players that don't play in a season aren't in its days
+    """
+    existing = set(DailyStanding.objects.values_list('date', flat=True).distinct())
+    latest = {}
+    ratings = {}
+    rows = []
+    written = 0
+
+    def add_day(day):
+        if day in existing or (since is not None and day < since):
+            return
+
+        rows.extend(
+            DailyStanding(date=day, user_id=user_id, rank=rank, rating=ratings[user_id])
+            for rank, user_id in enumerate(placings(latest), start=1)
+        )
+
+    day = None
+    season = None
+
+    for season_id, user_id, rank, played, result, winner_rating, loser_rating in MatchParticipant.objects.filter(
+        played__isnull=False,
+        rank_after__isnull=False
+    ).order_by(
+        'played'
+    ).values_list(
+        'match__season_id',
+        'user_id',
+        'rank_after',
+        'played',
+        'result',
+        'match__winner_rating',
+        'match__loser_rating'
+    ).iterator():
+        if day is not None and localdate(played) != day:
+            add_day(day)
+
+            if len(rows) >= BATCH_SIZE:
+                written += len(DailyStanding.objects.bulk_create(rows))
+                rows = []
+
+        if season_id != season:
+            # the ranks are set again for a new season and everyone starts it on the same rating
+            season = season_id
+            start = season_start_ranks(season)
+            latest = {start_user_id: (start_rank, played) for start_user_id, start_rank in start.items()}
+            ratings = {start_user_id: settings.RATING_INITIAL for start_user_id in start}
+
+        day = localdate(played)
+        latest[user_id] = (rank, played)
+        rating = winner_rating if result == MatchParticipant.WON else loser_rating
+        ratings[user_id] = settings.RATING_INITIAL if rating is None else rating
+
+    if day is not None:
+        add_day(day)
+
+    return written + len(DailyStanding.objects.bulk_create(rows))
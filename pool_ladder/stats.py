@@ -0,0 +1,109 @@
+from django.db.models import Count, Max, Min, Q
+
+
+def calculate_player_stats(profile_model, match_model, game_model, user_ids=None):
+    """
+    Replay the match history to work out the statistics for each player.
+    The models are passed in as pool_ladder.models imports this module
+    """
+    profiles = profile_model.objects.all()
+    matches = match_model.objects.filter(played__isnull=False)
+    games = game_model.objects.filter(winner__isnull=False)
+
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+        matches = matches.filter(Q(challenger_id__in=user_ids) | Q(opponent_id__in=user_ids))
+        games = games.filter(winner_id__in=user_ids)
+
+    ranks = profile_model.objects.filter(active=True).aggregate(min_rank=Min('rank'), max_rank=Max('rank'))
+
+    stats = {
+        user_id: {
+            'user_id': user_id,
+            'matches_won': 0,
+            'matches_lost': 0,
+            'games_won': 0,
+            'streak': 0,
+            'last_played': None,
+            'is_top': rank == ranks['min_rank'],
+            'is_bottom': rank == ranks['max_rank']
+        } for user_id, rank in profiles.values_list('user_id', 'rank')
+    }
+
+    # walk the matches in the order they were played so the streaks come out right
+    for played, challenger_id, opponent_id, winner_id, loser_id in matches.order_by('played').values_list(
+        'played', 'challenger_id', 'opponent_id', 'winner_id', 'loser_id'
+    ).iterator():
+        for user_id in [challenger_id, opponent_id]:
+            if user_id in stats:
+                stats[user_id]['last_played'] = played
+
+        if winner_id in stats:
+            winner = stats[winner_id]
+            winner['matches_won'] += 1
+            winner['streak'] = winner['streak'] + 1 if winner['streak'] > 0 else 1
+
+        if loser_id in stats:
+            loser = stats[loser_id]
+            loser['matches_lost'] += 1
+            loser['streak'] = loser['streak'] - 1 if loser['streak'] < 0 else -1
+
+    # clear the default ordering so it isn't added to the group by
+    for winner_id, games_won in games.order_by().values('winner').annotate(
+        games_won=Count('id')
+    ).values_list('winner', 'games_won'):
+        if winner_id in stats:
+            stats[winner_id]['games_won'] = games_won
+
+    return list(stats.values())
+
+
+def calculate_head_to_head(match_model, game_model):
+    """
+    Total up the record of each pair of players that have played each other, keyed on (lower user id, higher user id).
+    The models are passed in as pool_ladder.models imports this module
+    """
+    pairs = {}
+
+    def pair(user_id, other_id):
+        return pairs.setdefault(
+            (min(user_id, other_id), max(user_id, other_id)),
+            {
+                'a_wins': 0,
+                'b_wins': 0,
+                'a_games': 0,
+                'b_games': 0,
+                'a_balled': 0,
+                'b_balled': 0,
+                'last_played': None
+            }
+        )
+
+    for played, challenger_id, opponent_id, winner_id in match_model.objects.filter(
+        played__isnull=False,
+        winner__isnull=False
+    ).order_by().values_list(
+        'played', 'challenger_id', 'opponent_id', 'winner_id'
+    ).iterator():
+        record = pair(challenger_id, opponent_id)
+        record['a_wins' if winner_id == min(challenger_id, opponent_id) else 'b_wins'] += 1
+
+        if record['last_played'] is None or played > record['last_played']:
+            record['last_played'] = played
+
+    for challenger_id, opponent_id, winner_id, balled_id in game_model.objects.filter(
+        match__played__isnull=False,
+        match__winner__isnull=False
+    ).order_by().values_list(
+        'match__challenger_id', 'match__opponent_id', 'winner_id', 'balled_id'
+    ).iterator():
+        record = pair(challenger_id, opponent_id)
+        player_a = min(challenger_id, opponent_id)
+
+        if winner_id is not None:
+            record['a_games' if winner_id == player_a else 'b_games'] += 1
+
+        if balled_id is not None:
+            record['a_balled' if balled_id == player_a else 'b_balled'] += 1
+
+    return pairs
@@ -1,7 +1,56 @@
+from .availability_tests import AvailabilityTestCase
+from .benchmarks_tests import BenchmarksTestCase
+from .business_days_tests import BusinessDaysTestCase
+from .chart_tests import RankChartTestCase
+from .consumers_tests import MainConsumerTestCase
+from .datatables_tests import DataTablesTestCase
+from .diffs_tests import LadderDiffTestCase
+from .expiry_tests import ExpiryTestCase
+from .export_tests import ExportTestCase
+from .fanout_tests import FanoutTestCase
+from .fragments_tests import FragmentsTestCase
+from .head_to_head_tests import HeadToHeadTestCase
+from .indexes_tests import IndexesTestCase
+from .ladder_events_tests import LadderEventsTestCase, LadderReplayTestCase
 from .match_tests import MatchTestCase
+from .metrics_tests import MetricsTestCase
+from .notifications_tests import NotificationsTestCase
+from .participants_tests import MatchParticipantTestCase, ParticipantHistoryTestCase
+from .ratings_tests import RatingsTestCase
+from .results_tests import ResultsTestCase
+from .seasons_tests import SeasonsTestCase
+from .snapshot_tests import LadderSnapshotTestCase
+from .standings_tests import BackfillStandingsTestCase, StandingsTestCase
+from .stats_tests import PlayerStatsTestCase
 from .ui_tests import UITestCase
 
 __all__ = [
+    'AvailabilityTestCase',
+    'BackfillStandingsTestCase',
+    'BenchmarksTestCase',
+    'BusinessDaysTestCase',
+    'DataTablesTestCase',
+    'ExpiryTestCase',
+    'ExportTestCase',
+    'FanoutTestCase',
+    'FragmentsTestCase',
+    'HeadToHeadTestCase',
+    'IndexesTestCase',
+    'LadderDiffTestCase',
+    'LadderEventsTestCase',
+    'LadderReplayTestCase',
+    'LadderSnapshotTestCase',
+    'MainConsumerTestCase',
+    'MatchParticipantTestCase',
     'MatchTestCase',
+    'MetricsTestCase',
+    'NotificationsTestCase',
+    'ParticipantHistoryTestCase',
+    'PlayerStatsTestCase',
+    'RankChartTestCase',
+    'RatingsTestCase',
+    'ResultsTestCase',
+    'SeasonsTestCase',
+    'StandingsTestCase',
     'UITestCase'
 ]
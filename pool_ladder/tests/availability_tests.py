@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils.timezone import now
+
+from pool_ladder.availability import LadderAvailability
+from pool_ladder.models import UserProfile, Match
+from pool_ladder.results import record_result
+from pool_ladder.tests.helpers import create_user
+
+
+class AvailabilityTestCase(TestCase):
+    def setUp(self):
+        self.users = [create_user(rank, active=(rank != 9)) for rank in range(1, 11)]
+
+        # an open challenge between 1 and 2
+        Match.objects.create(
+            challenger=self.users[1],
+            opponent=self.users[0],
+            challenger_rank=2,
+            opponent_rank=1
+        )
+
+        # a declined challenge between 3 and 4
+        Match.objects.create(
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3,
+            declined=True
+        )
+
+        # 5 and 6 have just played
+        recent = Match.objects.create(
+            challenger=self.users[5],
+            opponent=self.users[4],
+            challenger_rank=6,
+            opponent_rank=5
+        )
+        record_result(recent, [(self.users[4], None), (self.users[4], None), (None, None)])
+
+        # 7 and 8 played a while ago
+        old = Match.objects.create(
+            challenger=self.users[7],
+            opponent=self.users[6],
+            challenger_rank=8,
+            opponent_rank=7
+        )
+        record_result(old, [(self.users[6], None), (self.users[6], None), (None, None)])
+        Match.objects.filter(pk=old.pk).update(played=now() - timedelta(days=2))
+
+    def test_matches_profile_properties(self):
+        """
+        The batched answers are the same as the per profile properties
+        """
+        availability = LadderAvailability(UserProfile.objects.all())
+
+        for profile in UserProfile.objects.all():
+            self.assertEqual(availability.has_open_challenge(profile), profile.has_open_challenge)
+            self.assertEqual(availability.in_cool_down(profile), profile.in_cool_down)
+            self.assertEqual(availability.is_available(profile), profile.is_available)
+            self.assertEqual(availability.time_available(profile), profile.time_available)
+            self.assertEqual(availability.swag(profile), profile.swag)
+
+            for challenger in self.users:
+                self.assertEqual(
+                    availability.can_challenge(profile, challenger),
+                    profile.can_challenge(challenger),
+                    '{} challenging {}'.format(challenger, profile)
+                )
+
+    def test_fixed_number_of_queries(self):
+        """
+        The whole ladder is answered with the same number of queries regardless of size
+        """
+        with self.assertNumQueries(4):
+            availability = LadderAvailability()
+
+            for profile in availability.profiles:
+                for challenger in self.users:
+                    if challenger.pk in availability.by_user:
+                        availability.row_context(profile, challenger)
+
+    def test_for_users(self):
+        """
+        Restricting to a pair of users gives the same answers for that pair
+        """
+        availability = LadderAvailability.for_users(self.users[2], self.users[0])
+        opponent = availability.profile_for(self.users[0])
+        self.assertTrue(availability.has_open_challenge(opponent))
+        self.assertFalse(availability.can_challenge(opponent, self.users[2]))
+
+        availability = LadderAvailability.for_users(self.users[3], self.users[2])
+        opponent = availability.profile_for(self.users[2])
+        self.assertTrue(availability.can_challenge(opponent, self.users[3]))
+
+    def test_ladder_datatable(self):
+        """
+        The ladder datatable renders a row for each active player
+        """
+        self.client.login(username='user_rank_4', password='123456789')
+        response = self.client.get('/ladder/datatable', {'draw': 1})
+        data = response.json()['data']
+        self.assertEqual(len(data), 9)
+        # user_rank_4 can challenge rank 3 but not rank 2 which is in an open challenge
+        self.assertIn('Challenge', data[2][2])
+        self.assertIn('Waiting to play', data[1][2])
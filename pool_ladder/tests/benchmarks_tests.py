@@ -0,0 +1,53 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from pool_ladder.benchmarks import SCENARIOS, Benchmark, compare, generate_ladder
+from pool_ladder.models import Game, Match, UserProfile
+
+
+class BenchmarksTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        generate_ladder(10, years=1, rate=0.5)
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def test_generated_ladder(self):
+        """
+        The generated ladder has a rank for each player and every match has its games
+        """
+        self.assertEqual(sorted(UserProfile.objects.values_list('rank', flat=True)), list(range(1, 11)))
+
+        played = Match.objects.filter(played__isnull=False)
+        self.assertEqual(played.count(), 130)
+        self.assertEqual(Game.objects.count(), played.count() * 3)
+        self.assertEqual(played.filter(season__isnull=True).count(), 0)
+        self.assertTrue(Match.objects.filter(played__isnull=True).exists())
+
+        for match in played[:20]:
+            self.assertEqual(match.decide_winner(match.game_set.all())[0], match.winner)
+
+    def test_scenarios(self):
+        """
+        Every scenario runs and is measured, and going over the baseline is caught
+        """
+        results = Benchmark(sockets=3).run()
+        self.assertEqual(sorted(results), sorted(SCENARIOS))
+
+        for name, result in results.items():
+            self.assertGreater(result['queries'], 0, name)
+            self.assertGreater(result['wall_time'], 0, name)
+
+        baseline = {'10': results}
+        self.assertEqual(compare({'10': results}, baseline, 0), [])
+
+        worse = {'10': {'balled': dict(results['balled'], queries=results['balled']['queries'] + 1)}}
+        self.assertEqual(len(compare(worse, baseline, 0)), 1)
+
+        slower = {'10': {'fanout': dict(results['fanout'], wall_time=results['fanout']['wall_time'] * 3)}}
+        self.assertEqual(compare(slower, baseline, 1), ['10 players fanout: {:.3f}s, up from {:.3f}s'.format(
+            slower['10']['fanout']['wall_time'], results['fanout']['wall_time']
+        )])
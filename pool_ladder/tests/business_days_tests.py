@@ -0,0 +1,80 @@
+import subprocess
+import sys
+from datetime import date, datetime, timedelta
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.timezone import localdate, utc
+
+from pool_ladder.business_days import add_business_days, challenge_deadline, step_business_days
+
+# the day of the month given by pandas' BDay for 0 to 7 days from each day of the week of 2019-06-03
+BDAY_RESULTS = [
+    [3, 4, 5, 6, 7, 10, 11, 12],
+    [4, 5, 6, 7, 10, 11, 12, 13],
+    [5, 6, 7, 10, 11, 12, 13, 14],
+    [6, 7, 10, 11, 12, 13, 14, 17],
+    [7, 10, 11, 12, 13, 14, 17, 18],
+    [10, 10, 11, 12, 13, 14, 17, 18],
+    [10, 10, 11, 12, 13, 14, 17, 18],
+]
+
+
+class BusinessDaysTestCase(SimpleTestCase):
+    def test_same_as_bday(self):
+        """
+        Without holidays the results match pandas' BDay, keeping the time of day
+        """
+        monday = datetime(2019, 6, 3, 15, 30, tzinfo=utc)
+
+        for weekday, expected in enumerate(BDAY_RESULTS):
+            start = monday + timedelta(days=weekday)
+
+            for days, day in enumerate(expected):
+                self.assertEqual(add_business_days(start, days), start.replace(day=day), (start, days))
+
+    @override_settings(HOLIDAYS=['2019-06-05', date(2019, 6, 10)])
+    def test_holidays(self):
+        """
+        Holidays are skipped like weekends
+        """
+        tuesday = datetime(2019, 6, 4, 9, tzinfo=utc)
+        self.assertEqual(add_business_days(tuesday, 1), tuesday.replace(day=6))
+        self.assertEqual(add_business_days(tuesday, 3), tuesday.replace(day=11))
+        self.assertEqual(add_business_days(tuesday.replace(day=5), 0), tuesday.replace(day=6))
+
+    @override_settings(HOLIDAYS=[localdate() + timedelta(days=offset) for offset in (3, 4, 12, 40)])
+    def test_lookup_table(self):
+        """
+        Around today the lookup table gives the same days as walking over them, including past its horizon
+        """
+        for offset in range(-40, 400, 3):
+            day = localdate() + timedelta(days=offset)
+
+            for days in [0, 1, 2, 3, 5, 6, 20]:
+                start = datetime.combine(day, datetime.min.time()).replace(hour=11, tzinfo=utc)
+                self.assertEqual(add_business_days(start, days).date(), step_business_days(day, days), (day, days))
+
+    @override_settings(WORKING_HOURS='09:00-17:30')
+    def test_working_hours(self):
+        """
+        A challenge made outside working hours counts from the next opening
+        """
+        monday = datetime(2019, 6, 3, 12, tzinfo=utc)
+        self.assertEqual(challenge_deadline(monday, 3), monday.replace(day=6))
+        self.assertEqual(challenge_deadline(monday.replace(hour=7), 3), monday.replace(day=6, hour=9))
+        self.assertEqual(challenge_deadline(monday.replace(hour=18), 3), monday.replace(day=7, hour=9))
+        self.assertEqual(challenge_deadline(monday.replace(day=8), 3), monday.replace(day=13, hour=9))
+
+    def test_lazy_imports(self):
+        """
+        Loading the models doesn't pull in pandas or pygal
+        """
+        loaded = subprocess.check_output(
+            [
+                sys.executable,
+                '-c',
+                'import sys, django; django.setup(); import pool_ladder.models, pool_ladder.views; '
+                'print(sorted(name for name in ["pandas", "pygal"] if name in sys.modules))'
+            ]
+        )
+        self.assertEqual(loaded.decode().strip(), '[]')
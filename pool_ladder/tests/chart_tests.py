@@ -0,0 +1,77 @@
+from datetime import datetime, time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, make_aware
+
+from pool_ladder.charts import get_cached_rank_chart, render_rank_chart
+from pool_ladder.models import UserProfile, Match
+from pool_ladder.results import record_result
+from pool_ladder.tests.helpers import create_user
+
+
+class RankChartTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [create_user(rank) for rank in range(1, 4)]
+
+    def play(self, challenger, opponent):
+        match = Match.objects.create(
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=UserProfile.objects.get(user=challenger).rank,
+            opponent_rank=UserProfile.objects.get(user=opponent).rank
+        )
+        return record_result(match, [(challenger, None), (challenger, None), (None, None)])
+
+    def test_rank_history(self):
+        """
+        The history has the rank before and after each match in the order played
+        """
+        self.play(self.users[1], self.users[0])
+        self.play(self.users[2], self.users[1])
+
+        profile = UserProfile.objects.get(user=self.users[1])
+        self.assertEqual([rank for played, rank in profile.rank_history()], [2, 1, 1, 3])
+
+    def test_chart_is_cached_until_a_match_is_recorded(self):
+        """
+        The chart is only drawn again once the player has played or the length of the ladder changes
+        """
+        profile = UserProfile.objects.get(user=self.users[2])
+        chart = profile.get_rank_chart()
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('pool_ladder.models.render_rank_chart', wraps=render_rank_chart) as render:
+            self.assertEqual(UserProfile.objects.get(user=self.users[2]).get_rank_chart(), chart)
+
+        # only the profile itself was loaded, without reading the range of the ladder or drawing the chart
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(render.called)
+
+        # a match between other players leaves the chart alone
+        self.play(self.users[1], self.users[0])
+        self.assertEqual(UserProfile.objects.get(user=self.users[2]).get_rank_chart(), chart)
+
+        # the chart is drawn against the new length of the ladder when a player leaves it
+        bottom = create_user(4)
+        profile = UserProfile.objects.get(user=bottom)
+        profile.active = False
+        profile.save()
+
+        with mock.patch('pool_ladder.models.render_rank_chart', wraps=render_rank_chart) as render:
+            UserProfile.objects.get(user=self.users[2]).get_rank_chart()
+
+        ranks, max_rank = render.call_args[0]
+        self.assertEqual(max_rank, 3)
+        self.assertEqual(ranks[-1], (make_aware(datetime.combine(localdate(), time.min)), 3))
+
+        # a match involving the player means reading their history again
+        self.play(self.users[2], self.users[1])
+        self.assertIsNone(get_cached_rank_chart(self.users[2].pk))
+        profile = UserProfile.objects.get(user=self.users[2])
+        self.assertNotEqual(profile.get_rank_chart(), chart)
+        self.assertEqual(get_cached_rank_chart(self.users[2].pk)['series'], profile.rank_history())
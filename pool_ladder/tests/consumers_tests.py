@@ -0,0 +1,81 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import TransactionTestCase
+
+from pool_ladder.consumers import MainConsumer
+from pool_ladder.models import Match
+from pool_ladder.tests.helpers import create_user
+
+
+class SlowConsumer(MainConsumer):
+    """
+    a socket whose browser doesn't take anything until released
+    """
+    release = None
+
+    async def send_json(self, content, close=False):
+        await self.release.wait()
+        await super().send_json(content, close)
+
+
+class MainConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 4)]
+        async_to_sync(get_channel_layer().flush)()
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    async def connect(self, consumer, user):
+        socket = WebsocketCommunicator(consumer, '/pool-ladder/')
+        socket.scope['user'] = user
+        connected, subprotocol = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    def test_challenge(self):
+        """
+        A challenge over the socket creates the match, and a second is refused with a message
+        """
+        async_to_sync(self.check_challenge)()
+        self.assertTrue(Match.objects.filter(challenger=self.users[2], opponent=self.users[1]).exists())
+
+    async def check_challenge(self):
+        socket = await self.connect(MainConsumer, self.users[2])
+
+        # table updates go through the fan out coordinator so nothing comes straight back
+        await socket.send_json_to({'message_type': 'challenge', 'opponent': self.users[1].pk})
+        await socket.send_json_to({'message_type': 'challenge', 'opponent': self.users[0].pk})
+        message = await socket.receive_json_from(timeout=1)
+        self.assertEqual(message['message_type'], 'messages')
+        self.assertIn('You are not available', message['text'])
+
+        await socket.disconnect()
+
+    def test_redraws_merge_behind_a_slow_socket(self):
+        """
+        Redraws that arrive while one is waiting to be sent are merged into it
+        """
+        async_to_sync(self.check_slow_socket)()
+
+    async def check_slow_socket(self):
+        SlowConsumer.release = asyncio.Event()
+        socket = await self.connect(SlowConsumer, self.users[0])
+        layer = get_channel_layer()
+
+        for tables in [['users'], ['matches'], ['challenges', 'users']]:
+            await layer.group_send('pool_ladder', {'type': 'tables.dirty', 'tables': tables})
+            await asyncio.sleep(0.05)
+
+        SlowConsumer.release.set()
+
+        self.assertEqual(await socket.receive_json_from(timeout=1), {'message_type': 'tables', 'tables': ['users']})
+        self.assertEqual(
+            await socket.receive_json_from(timeout=1),
+            {'message_type': 'tables', 'tables': ['users', 'challenges', 'matches']}
+        )
+        self.assertTrue(await socket.receive_nothing(timeout=0.2))
+        await socket.disconnect()
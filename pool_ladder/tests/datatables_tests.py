@@ -0,0 +1,115 @@
+import json
+import re
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from pool_ladder.datatables import Column, DataTablesView
+from pool_ladder.fanout import bump_table_versions
+from pool_ladder.models import Match, Season
+from pool_ladder.tests.helpers import create_user
+
+
+class DataTablesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = create_user(1, 'alice')
+        self.bob = create_user(2, 'bob')
+        self.carol = create_user(3, 'carol')
+        self.played = now() - timedelta(days=30)
+        self.create_matches(self.alice, self.bob, 10)
+        self.create_matches(self.carol, self.bob, 5)
+        self.client.login(username='alice', password='123456789')
+
+    def create_matches(self, winner, loser, count):
+        matches = []
+
+        for index in range(count):
+            # give some matches the same played time so the primary key has to break ties
+            self.played += timedelta(hours=index % 2)
+            matches.append(
+                Match(challenger=loser, opponent=winner, winner=winner, loser=loser, played=self.played)
+            )
+
+        Match.objects.bulk_create(matches)
+
+    def get_matches(self, **params):
+        data = {'draw': 1, 'start': 0, 'length': 4, 'order[0][column]': 0, 'order[0][dir]': 'desc'}
+        data.update(params)
+        return self.client.get(reverse('match_datatable'), data).json()
+
+    def test_keyset_pages_match_offset_pages(self):
+        """
+        Walking the pages in order gives the same rows as offset pagination, with no gaps or repeats
+        """
+        expected = list(
+            Match.objects.filter(played__isnull=False).order_by('-played', '-pk').values_list('pk', flat=True)
+        )
+        seen = []
+
+        for start in range(0, len(expected), 4):
+            rows = self.get_matches(start=start)['data']
+            seen += [int(re.search(r'/match/(\d+)', row[0]).group(1)) for row in rows]
+
+        self.assertEqual(seen, expected)
+
+    def test_untrusted_order_column_is_ignored(self):
+        """
+        Ordering by a column that isn't orderable, or doesn't exist, falls back to the default ordering
+        """
+        for column in [1, 2, 99, 'played']:
+            response = self.client.get(
+                reverse('match_datatable'),
+                {'draw': 1, 'start': 0, 'length': 4, 'order[0][column]': column, 'columns[1][name]': 'password'}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['data']), 4)
+
+        response = self.client.get(
+            reverse('player_results_datatable', kwargs={'pk': self.alice.userprofile.pk}),
+            {'draw': 1, 'start': 0, 'length': 4, 'order[0][column]': 2}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_on_usernames(self):
+        """
+        Searching matches the player usernames only
+        """
+        data = self.get_matches(**{'search[value]': 'caro', 'length': 20})
+        self.assertEqual(data['recordsTotal'], 15)
+        self.assertEqual(data['recordsFiltered'], 5)
+
+        data = self.get_matches(**{'search[value]': '2', 'length': 20})
+        self.assertEqual(data['recordsFiltered'], 0)
+
+    def test_records_total_is_cached_until_the_table_changes(self):
+        """
+        The total is cached against the table version
+        """
+        self.assertEqual(self.get_matches()['recordsTotal'], 15)
+
+        self.create_matches(self.alice, self.carol, 2)
+        self.assertEqual(self.get_matches()['recordsTotal'], 15)
+
+        bump_table_versions(['matches'])
+        self.assertEqual(self.get_matches()['recordsTotal'], 17)
+
+    def test_defaults(self):
+        """
+        A view that only declares its model and columns lists every object with a cell for each column
+        """
+        class SeasonsView(DataTablesView):
+            model = Season
+            columns = [Column('number', order_by=['number'])]
+            default_order = ['-number']
+
+        Season.objects.bulk_create([Season(number=number) for number in range(1, 4)])
+        request = RequestFactory().get('/', {'draw': 1, 'start': 0, 'length': 2})
+        request.user = self.alice
+        data = json.loads(SeasonsView.as_view()(request).content.decode())
+
+        self.assertEqual(data['recordsTotal'], 3)
+        self.assertEqual(data['data'], [['3'], ['2']])
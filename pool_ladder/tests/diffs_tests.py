@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from pool_ladder.diffs import LadderDiff
+from pool_ladder.models import Match
+from pool_ladder.tests.helpers import create_user
+
+
+class LadderDiffTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [create_user(rank) for rank in range(1, 6)]
+        self.ladder_diff = LadderDiff()
+        self.ladder_diff.diff(['users', 'challenges', 'matches'])
+
+    def rows(self, diff, table):
+        return {row['id']: row for row in diff['tables'][table]['upsert']}
+
+    def test_new_challenge(self):
+        """
+        A new challenge is added and both of its players are no longer available
+        """
+        match = Match.objects.create(
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3
+        )
+        diff = self.ladder_diff.diff(['users', 'challenges'])
+
+        self.assertEqual(diff['seq'], 2)
+        challenge = self.rows(diff, 'challenges')[match.pk]
+        self.assertIn('Enter Results', challenge['actions'][str(self.users[3].pk)])
+        self.assertIn('Add a Day', challenge['actions'][str(self.users[2].pk)])
+
+        users = self.rows(diff, 'users')
+        self.assertTrue(users[self.users[3].pk]['has_open_challenge'])
+        self.assertFalse(users[self.users[2].pk]['available'])
+        self.assertIn('Waiting to play', users[self.users[2].pk]['status'])
+
+        match.declined = True
+        match.save()
+
+        diff = self.ladder_diff.diff(['challenges'])
+        self.assertEqual(diff['tables']['challenges'], {'upsert': [], 'remove': [match.pk]})
+
+    def test_balling_moves_the_ladder(self):
+        """
+        Everyone shifted by a balling is in the diff with their new rank
+        """
+        self.users[1].userprofile.update_rank(2, balled=True)
+        users = self.rows(self.ladder_diff.diff(['users']), 'users')
+
+        self.assertEqual(
+            {user_id: row['rank'] for user_id, row in users.items()},
+            {user.pk: rank for user, rank in zip(self.users[1:], [5, 2, 3, 4])}
+        )
+
+    def test_new_bottom_player(self):
+        """
+        The old bottom of the ladder loses its swag when someone joins below it
+        """
+        newcomer = create_user(6)
+        users = self.rows(self.ladder_diff.diff(['users']), 'users')
+
+        self.assertEqual(set(users), {self.users[4].pk, newcomer.pk})
+        self.assertNotIn('1F4A9', users[self.users[4].pk]['cells'][0])
+        self.assertIn('1F4A9', users[newcomer.pk]['cells'][0])
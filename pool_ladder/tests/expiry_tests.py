@@ -0,0 +1,150 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from pool_ladder.expiry import ExpiryScheduler, expired_challenges, forfeit_challenge, forfeit_expired
+from pool_ladder.models import User, UserProfile, Match
+
+
+class QueueLayer(object):
+    """
+    a channel layer that counts the receives made and hands out messages as they are put on its queue
+    """
+    def __init__(self):
+        self.queue = None
+        self.receives = 0
+
+    async def receive(self, channel):
+        self.receives += 1
+        return await self.queue.get()
+
+
+class ExpiryTestCase(TestCase):
+    def setUp(self):
+        self.opponent = User.objects.create_user(username='opponent', password='123456789')
+        UserProfile.objects.create(
+            user=self.opponent,
+            rank=1
+        )
+
+        self.challenger = User.objects.create_user(username='challenger', password='123456789')
+        UserProfile.objects.create(
+            user=self.challenger,
+            rank=2
+        )
+
+    def create_challenge(self, challenge_time):
+        return Match.objects.create(
+            challenger=self.challenger,
+            opponent=self.opponent,
+            challenger_rank=2,
+            opponent_rank=1,
+            challenge_time=challenge_time
+        )
+
+    def test_expired_challenge_is_forfeited_once(self):
+        """
+        The challenger wins an expired challenge and it can't be forfeited twice
+        """
+        match = self.create_challenge(now() - timedelta(days=10))
+        scheduler = ExpiryScheduler()
+        scheduler.load()
+
+        self.assertEqual(scheduler.forfeit_due(), 1)
+
+        match = Match.objects.get(pk=match.pk)
+        self.assertEqual(match.winner, self.challenger)
+        self.assertEqual(match.challenger.userprofile.rank, 1)
+
+        # nothing left to forfeit, even if asked directly
+        self.assertEqual(scheduler.forfeit_due(), 0)
+        self.assertFalse(forfeit_challenge(match.pk))
+
+    def test_open_challenge_is_not_forfeited(self):
+        """
+        A challenge still within its time is left alone
+        """
+        match = self.create_challenge(now())
+        scheduler = ExpiryScheduler()
+        scheduler.load()
+
+        self.assertEqual(scheduler.forfeit_due(), 0)
+        self.assertEqual(scheduler.next_deadline(), match.time_until.timestamp())
+        self.assertIsNone(Match.objects.get(pk=match.pk).played)
+
+    def test_deadline_is_updated_in_place(self):
+        """
+        Moving a deadline replaces the old heap entry and closing a challenge removes it
+        """
+        scheduler = ExpiryScheduler()
+        scheduler.schedule(1, 100)
+        scheduler.schedule(2, 200)
+        scheduler.handle({'type': 'challenge.scheduled', 'match': 1, 'deadline': 300})
+
+        self.assertEqual(scheduler.next_deadline(), 200)
+        self.assertEqual(scheduler.pop_due(250), [2])
+
+        scheduler.handle({'type': 'challenge.closed', 'match': 1})
+        self.assertIsNone(scheduler.next_deadline())
+        self.assertEqual(scheduler.pop_due(1000), [])
+
+    def test_deadline_is_stored(self):
+        """
+        The deadline is saved with the challenge and moves when a day is added
+        """
+        match = self.create_challenge(now() - timedelta(days=2))
+        self.assertEqual(Match.objects.get(pk=match.pk).deadline, match.time_until)
+
+        match.days_to_play += 1
+        match.save(update_fields=['days_to_play'])
+        self.assertEqual(Match.objects.get(pk=match.pk).deadline, match.time_until)
+
+    def test_forfeit_expired(self):
+        """
+        Expired challenges are found with a single query
+        """
+        expired = self.create_challenge(now() - timedelta(days=10))
+        other = User.objects.create_user(username='other', password='123456789')
+        UserProfile.objects.create(user=other, rank=3)
+        Match.objects.create(challenger=other, opponent=self.opponent, challenger_rank=3, opponent_rank=1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(expired_challenges().values_list('pk', flat=True)), [expired.pk])
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(forfeit_expired(), 1)
+        self.assertEqual(forfeit_expired(), 0)
+
+    def test_receive_is_not_cancelled(self):
+        """
+        The scheduler waking for a deadline leaves its receive waiting so no message is lost
+        """
+        layer = QueueLayer()
+        scheduler = ExpiryScheduler()
+        scheduler.load = scheduler.forfeit_due = lambda: None
+        scheduler.seconds_to_sleep = lambda: 0.01
+
+        with mock.patch('pool_ladder.expiry.get_channel_layer', return_value=layer):
+            async_to_sync(self.run_scheduler)(scheduler, layer)
+
+        # one receive took the message and the next is waiting
+        self.assertEqual(layer.receives, 2)
+        self.assertEqual(scheduler.next_deadline(), 100)
+
+    async def run_scheduler(self, scheduler, layer):
+        layer.queue = asyncio.Queue()
+        task = asyncio.ensure_future(scheduler.run())
+
+        # let it wake up for a few deadlines before the message arrives
+        await asyncio.sleep(0.1)
+        await layer.queue.put({'type': 'challenge.scheduled', 'match': 1, 'deadline': 100})
+        await asyncio.sleep(0.1)
+
+        task.cancel()
+        await asyncio.wait([task])
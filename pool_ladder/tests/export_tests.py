@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from pool_ladder.export import iterate_matches
+from pool_ladder.models import Match, Game, Season
+from pool_ladder.tests.helpers import create_user
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 4)]
+        season = Season.objects.create(number=1)
+        matches = []
+
+        for index in range(5):
+            matches.append(
+                Match(
+                    season=season,
+                    challenger=self.users[1],
+                    opponent=self.users[0],
+                    winner=self.users[0],
+                    loser=self.users[1],
+                    challenger_rank=2,
+                    opponent_rank=1,
+                    winner_rank=1,
+                    loser_rank=2,
+                    played=now()
+                )
+            )
+
+        # one challenge still to be played
+        matches.append(
+            Match(
+                season=season,
+                challenger=self.users[2],
+                opponent=self.users[1],
+                challenger_rank=3,
+                opponent_rank=2
+            )
+        )
+        Match.objects.bulk_create(matches)
+
+        Game.objects.bulk_create(
+            [
+                Game(match=match, index=index, winner=self.users[0], balled=self.users[1] if index == 1 else None)
+                for match in Match.objects.filter(played__isnull=False) for index in range(2)
+            ]
+        )
+
+    def export(self, **params):
+        response = self.client.get(reverse('match-data', kwargs={'season': 0}), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_queries_do_not_grow_with_matches(self):
+        """
+        Each chunk of matches takes one query for the matches and one for their games
+        """
+        with CaptureQueriesContext(connection) as queries:
+            matches = list(iterate_matches(Match.objects.all(), chunk_size=4))
+
+        self.assertEqual(len(matches), 6)
+        self.assertEqual(len(queries), 4)
+
+    def test_json_matches_serialize(self):
+        """
+        The json export has the same shape as Match.serialize
+        """
+        exported = json.loads(self.export().decode())
+        expected = json.loads(
+            json.dumps(
+                [match.serialize() for match in Match.objects.order_by('pk')],
+                cls=DjangoJSONEncoder
+            )
+        )
+
+        for row in exported:
+            del row['updated']
+
+        self.assertEqual(exported, expected)
+
+    def test_jsonl_and_csv(self):
+        lines = self.export(format='jsonl').decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(json.loads(lines[0])['games'][1]['balled'], 'user_rank_2')
+
+        rows = list(csv.DictReader(io.StringIO(self.export(format='csv').decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['game_1_balled'], 'user_rank_2')
+        self.assertEqual(rows[5]['winner'], '')
+
+    @skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_parquet(self):
+        table = pyarrow.parquet.read_table(io.BytesIO(self.export(format='parquet')))
+        self.assertEqual(table.num_rows, 6)
+        self.assertEqual(table.column('game_0_winner').to_pylist()[0], 'user_rank_1')
+
+    def test_since(self):
+        """
+        Only matches changed since the given time are exported
+        """
+        Match.objects.filter(played__isnull=True).update(updated=now() + timedelta(days=1))
+
+        lines = self.export(format='jsonl', since=(now() + timedelta(hours=1)).isoformat()).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+
+        lines = self.export(format='jsonl', since=(now() - timedelta(days=1)).date().isoformat()).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+        for since in ['yesterday', '2020-02-30', '2020-02-30T10:00']:
+            response = self.client.get(reverse('match-data', kwargs={'season': 0}), {'since': since})
+            self.assertEqual(response.status_code, 400)
@@ -0,0 +1,67 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
+from django.test import TransactionTestCase, override_settings
+
+from pool_ladder.consumers import FanoutConsumer, MainConsumer
+from pool_ladder.fanout import FANOUT_STATS
+from pool_ladder.models import User, UserProfile
+
+
+@override_settings(FANOUT_WINDOW=0.1)
+class FanoutTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='player', password='123456789')
+        self.profile = UserProfile.objects.create(
+            user=self.user,
+            rank=1
+        )
+        async_to_sync(get_channel_layer().flush)()
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def test_save_sends_a_single_coordinator_message(self):
+        """
+        A model save sends one message to the coordinator, not one per socket
+        """
+        self.profile.save()
+
+        message = async_to_sync(get_channel_layer().receive)('fanout')
+        self.assertEqual(message, {'type': 'tables.dirty', 'tables': ['users']})
+
+    def test_invalidations_are_merged(self):
+        """
+        Several invalidations in a window result in one message per socket
+        """
+        async_to_sync(self.check_merged)()
+
+    async def check_merged(self):
+        sockets = [WebsocketCommunicator(MainConsumer, '/pool-ladder/') for x in range(3)]
+
+        for socket in sockets:
+            connected, subprotocol = await socket.connect()
+            self.assertTrue(connected)
+
+        group_messages = FANOUT_STATS['group_messages']
+        socket_messages = FANOUT_STATS['socket_messages']
+
+        coordinator = ApplicationCommunicator(FanoutConsumer, {'type': 'channel', 'channel': 'fanout'})
+        await coordinator.send_input({'type': 'tables.dirty', 'tables': ['users']})
+        await coordinator.send_input({'type': 'tables.dirty', 'tables': ['matches', 'users']})
+        await coordinator.send_input({'type': 'tables.dirty', 'tables': ['challenges', 'users']})
+
+        for socket in sockets:
+            message = await socket.receive_json_from(timeout=1)
+            self.assertEqual(message['message_type'], 'diff')
+            self.assertEqual(message['seq'], 1)
+            self.assertEqual(sorted(message['tables']), ['challenges', 'matches', 'users'])
+
+        for socket in sockets:
+            self.assertTrue(await socket.receive_nothing(timeout=0.3))
+            await socket.disconnect()
+
+        await coordinator.wait(timeout=0.1)
+
+        self.assertEqual(FANOUT_STATS['group_messages'] - group_messages, 1)
+        self.assertEqual(FANOUT_STATS['socket_messages'] - socket_messages, 3)
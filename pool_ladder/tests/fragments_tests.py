@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from pool_ladder import fragments
+from pool_ladder.models import Match
+from pool_ladder.tests.helpers import create_user
+
+
+class FragmentsTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        Match.objects.bulk_create(
+            [
+                Match(
+                    challenger=self.users[1],
+                    opponent=self.users[0],
+                    winner=self.users[0],
+                    loser=self.users[1],
+                    played=now()
+                )
+            ]
+        )
+        self.client.login(username='user_rank_4', password='123456789')
+
+    def get_table(self, name):
+        return self.client.get(reverse(name), {'draw': 1, 'start': 0, 'length': 10}).json()['data']
+
+    def test_unchanged_rows_are_not_rendered_again(self):
+        """
+        The shared cells come from the cache until the row is saved
+        """
+        self.get_table('match_datatable')
+
+        with mock.patch('pool_ladder.diffs.render_fragment', wraps=fragments.render_fragment) as render:
+            self.get_table('match_datatable')
+            self.assertEqual(render.call_count, 0)
+
+            self.client.post(
+                reverse('update_username', kwargs={'pk': self.users[0].userprofile.pk}),
+                {'username': 'champion'}
+            )
+            rows = self.get_table('match_datatable')
+            self.assertEqual(render.call_count, 3)
+            self.assertIn('champion', rows[0][1])
+
+    def test_viewer_cells_are_rendered_per_viewer(self):
+        """
+        Each viewer gets their own challenge buttons on top of the shared cells
+        """
+        fourth = self.get_table('ladder_datatable')
+
+        self.client.login(username='user_rank_1', password='123456789')
+        first = self.get_table('ladder_datatable')
+
+        self.assertEqual([row[:2] for row in fourth], [row[:2] for row in first])
+        self.assertIn('Challenge', fourth[2][2])
+        self.assertNotIn('Challenge', first[2][2])
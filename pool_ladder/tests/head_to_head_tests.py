@@ -0,0 +1,113 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from pool_ladder.benchmarks import generate_ladder
+from pool_ladder.models import HeadToHead, Match, UserProfile
+from pool_ladder.results import record_result
+from pool_ladder.tests.helpers import create_user
+
+
+class HeadToHeadTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 4)]
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def play(self, challenger, opponent, games):
+        match = Match.objects.create(
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=UserProfile.objects.get(user=challenger).rank,
+            opponent_rank=UserProfile.objects.get(user=opponent).rank
+        )
+        return record_result(match, games)
+
+    def test_record_match(self):
+        """
+        Results add to the one record for the pair, whichever way round they played
+        """
+        first, second, third = self.users
+        self.play(second, first, [(second, None), (first, None), (second, None)])
+        match = self.play(second, first, [(None, second)])
+        self.play(third, first, [(third, None), (third, None), (None, None)])
+
+        record = HeadToHead.between(first.pk, second.pk)
+        self.assertEqual(record.pk, HeadToHead.between(second.pk, first.pk).pk)
+        self.assertEqual(
+            record.record_for(first.pk),
+            {
+                'matches': 2,
+                'won': 1,
+                'lost': 1,
+                'games_won': 1,
+                'games_lost': 2,
+                'balled': 0,
+                'balled_opponent': 1,
+                'last_played': match.played
+            }
+        )
+        self.assertEqual(record.record_for(second.pk)['balled'], 1)
+        self.assertEqual(HeadToHead.between(second.pk, third.pk).matches, 0)
+        self.assertEqual([record.opponent_of(first.pk) for record in HeadToHead.for_player(first.pk)], [second, third])
+
+    def test_rebuild(self):
+        """
+        Totalling the history gives the same records as adding each result as it comes in
+        """
+        generate_ladder(12, years=1, rate=0.5)
+        record_result(
+            Match.objects.filter(played__isnull=True).first(),
+            [(None, None), (None, None), (None, None)]
+        )
+
+        def records():
+            return sorted(
+                (record.player_a_id, record.player_b_id, record.record_for(record.player_a_id)['won'], str(record))
+                for record in HeadToHead.objects.select_related('player_a', 'player_b')
+            )
+
+        recorded = records()
+        HeadToHead.rebuild()
+        self.assertEqual(records(), recorded)
+
+        pairs = {
+            HeadToHead.pair(*pair)
+            for pair in Match.objects.filter(played__isnull=False).values_list('challenger_id', 'opponent_id')
+        }
+        self.assertEqual(len(recorded), len(pairs))
+
+    def test_views(self):
+        """
+        The player page lists the records without a query for each and the json answers for a pair
+        """
+        first, second, third = self.users
+        self.play(second, first, [(second, None), (second, None), (None, None)])
+        self.play(third, first, [(first, None), (first, None), (None, None)])
+        profiles = [user.userprofile for user in self.users]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('player_detail', kwargs={'pk': profiles[0].pk}))
+
+        self.assertEqual(len(response.context['head_to_head']), 2)
+        self.assertContains(response, 'Head to Head')
+        self.assertLess(len([query for query in queries if 'headtohead' in query['sql']]), 2)
+
+        response = self.client.get(
+            reverse('head_to_head', kwargs={'pk': profiles[0].pk, 'opponent_pk': profiles[1].pk})
+        ).json()
+        self.assertEqual((response['won'], response['lost'], response['games_lost']), (0, 1, 2))
+
+        response = self.client.get(
+            reverse('head_to_head', kwargs={'pk': profiles[1].pk, 'opponent_pk': profiles[2].pk})
+        ).json()
+        self.assertEqual((response['matches'], response['last_played']), (0, None))
+
+        self.assertEqual(
+            self.client.get(reverse('head_to_head', kwargs={'pk': profiles[1].pk, 'opponent_pk': 999})).status_code,
+            404
+        )
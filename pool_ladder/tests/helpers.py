@@ -0,0 +1,14 @@
+from pool_ladder.models import User, UserProfile
+
+
+def create_user(rank, username=None, active=True):
+    """
+    create a player at the given rank, named after it unless a username is given
+    """
+    user = User.objects.create_user(username=username or 'user_rank_{}'.format(rank), password='123456789')
+    UserProfile.objects.create(
+        user=user,
+        rank=rank,
+        active=active
+    )
+    return user
@@ -0,0 +1,46 @@
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from pool_ladder.benchmarks import generate_ladder
+from pool_ladder.management.commands.explain_queries import full_scans
+from pool_ladder.models import Game, Match
+
+
+class IndexesTestCase(TestCase):
+    def setUp(self):
+        generate_ladder(20, years=1, rate=0.5)
+
+    def test_game_index_unique(self):
+        """
+        A match can only have one game at each index
+        """
+        game = Game.objects.first()
+
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            Game.objects.create(match=game.match, index=game.index, winner=game.winner)
+
+        Game.objects.create(match=Match.objects.filter(played__isnull=True).first(), index=0)
+
+    def test_full_scans(self):
+        """
+        Plans are checked for reads of the whole match or game table
+        """
+        self.assertEqual(full_scans('2 0 0 SCAN TABLE pool_ladder_match'), ['pool_ladder_match'])
+        self.assertEqual(full_scans('Seq Scan on pool_ladder_game  (cost=0.00..1.01 rows=1)'), ['pool_ladder_game'])
+        self.assertEqual(full_scans('8 0 0 SCAN pool_ladder_match USING INDEX match_open_idx'), [])
+        self.assertEqual(full_scans('SEARCH pool_ladder_game USING INDEX game_match_index_unique'), [])
+        self.assertEqual(full_scans('SCAN pool_ladder_userprofile'), [])
+
+    def test_explain_queries(self):
+        """
+        Each of the hot queries is planned and none of them read all the matches or games
+        """
+        output = StringIO()
+        with redirect_stdout(output):
+            call_command('explain_queries', '--check')
+
+        self.assertIn('open challenges', output.getvalue())
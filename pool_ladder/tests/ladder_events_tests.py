@@ -0,0 +1,199 @@
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate, now
+from django_registration.signals import user_registered
+
+from pool_ladder.benchmarks import generate_ladder
+from pool_ladder.expiry import forfeit_challenge
+from pool_ladder.history import ladder_at, start_of_day
+from pool_ladder.models import DailyStanding, LadderEvent, Match, Season, User, UserProfile
+from pool_ladder.results import record_result
+from pool_ladder.seasons import start_new_season
+from pool_ladder.tests.helpers import create_user
+
+
+class LadderEventsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        self.season = Season.objects.create(number=1)
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def challenge(self, challenger, opponent, **kwargs):
+        return Match.objects.create(
+            season=self.season,
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=challenger.userprofile.rank,
+            opponent_rank=opponent.userprofile.rank,
+            **kwargs
+        )
+
+    def events(self, kind):
+        return list(LadderEvent.objects.filter(kind=kind).values_list('user', 'rank_before', 'rank_after'))
+
+    def test_events_recorded(self):
+        """
+        Every way a rank can change leaves an event for each player that moved
+        """
+        users = self.users
+        record_result(self.challenge(users[3], users[2]), [(users[3], None), (users[3], None), (None, None)])
+        self.assertEqual(self.events(LadderEvent.RESULT), [(users[3].pk, 4, 3), (users[2].pk, 3, 4)])
+
+        # the winner keeps their rank so only the balled player and those below them move
+        match = self.challenge(User.objects.get(pk=users[1].pk), users[0])
+        record_result(match, [(users[0], users[1]), (None, None), (None, None)])
+        self.assertEqual(
+            self.events(LadderEvent.BALLED),
+            [(users[3].pk, 3, 2), (users[2].pk, 4, 3), (users[1].pk, 2, 4)]
+        )
+        self.assertEqual(set(LadderEvent.objects.filter(kind=LadderEvent.BALLED).values_list('match', flat=True)),
+                         {match.pk})
+
+        match = self.challenge(
+            User.objects.get(pk=users[2].pk),
+            User.objects.get(pk=users[3].pk),
+            challenge_time=now() - timedelta(days=10)
+        )
+        forfeit_challenge(match.pk)
+        self.assertEqual(self.events(LadderEvent.FORFEIT), [(users[2].pk, 3, 2), (users[3].pk, 2, 3)])
+
+        ranks = dict(UserProfile.objects.values_list('user', 'rank'))
+        season = start_new_season(seed=3)
+        moved = [
+            (user_id, ranks[user_id], rank)
+            for user_id, rank in UserProfile.objects.values_list('user', 'rank') if ranks[user_id] != rank
+        ]
+        self.assertTrue(moved)
+        self.assertEqual(sorted(self.events(LadderEvent.SEASON)), sorted(moved))
+        self.assertEqual(set(LadderEvent.objects.filter(kind=LadderEvent.SEASON).values_list('season', flat=True)),
+                         {season.pk})
+
+        user = create_user(9)
+        user.is_staff = user.is_superuser = True
+        user.save()
+        self.client.force_login(user)
+        profile = UserProfile.objects.get(user=users[0])
+        url = reverse('admin:pool_ladder_userprofile_change', args=[profile.pk])
+        data = {'user': users[0].pk, 'rank': 7, 'slack_id': '', 'movement': 0, 'rating': 1500, 'active': 'on'}
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+
+        # players taken off the ladder are left with no rank
+        del data['active']
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.events(LadderEvent.EDIT), [(users[0].pk, profile.rank, 7), (users[0].pk, 7, None)])
+
+        new_user = User.objects.create_user(username='new', password='123456789')
+        user_registered.send(sender=None, user=new_user, request=None)
+        self.assertEqual(self.events(LadderEvent.JOIN), [(new_user.pk, None, new_user.userprofile.rank)])
+
+        event = LadderEvent.objects.first()
+        event.rank_after = 1
+
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_inactive_players_not_replayed(self):
+        """
+        Inactive players below a balled player are moved up with the rest but stay off the replayed ladder
+        """
+        inactive = create_user(5)
+        UserProfile.objects.filter(user=inactive).update(active=False)
+        match = self.challenge(self.users[1], self.users[0])
+        before = now()
+        record_result(match, [(self.users[0], self.users[1]), (None, None), (None, None)])
+
+        self.assertEqual(UserProfile.objects.get(user=inactive).rank, 4)
+        self.assertFalse(LadderEvent.objects.filter(user=inactive).exists())
+        self.assertEqual(
+            [(standing['user_id'], standing['rank']) for standing in ladder_at(before)[1]],
+            [(user.pk, rank) for rank, user in enumerate(self.users, start=1)]
+        )
+
+
+class LadderReplayTestCase(TransactionTestCase):
+    def setUp(self):
+        generate_ladder(8, years=1, rate=1)
+        self.matches = list(Match.objects.filter(played__isnull=False).order_by('played'))
+
+    def check_history(self):
+        """
+        check the replayed ladder against the ranks each match was played and finished at, returning the bases used
+        """
+        bases = set()
+
+        for match in self.matches:
+            base, before = ladder_at(match.played - timedelta(microseconds=1))
+            ranks = {standing['user_id']: standing['rank'] for standing in before}
+            self.assertEqual(sorted(ranks.values()), list(range(1, 9)))
+            self.assertEqual(
+                (ranks[match.challenger_id], ranks[match.opponent_id]),
+                (match.challenger_rank, match.opponent_rank)
+            )
+
+            bases.add(base)
+            base, after = ladder_at(match.played)
+            ranks = {standing['user_id']: standing['rank'] for standing in after}
+            self.assertEqual((ranks[match.winner_id], ranks[match.loser_id]), (match.winner_rank, match.loser_rank))
+
+        return bases
+
+    def test_replay(self):
+        """
+        The ladder at any time is replayed back from the live ladder or on from the nearest daily standings
+        """
+        live = list(UserProfile.objects.order_by('rank').values_list('user', 'rank'))
+
+        with CaptureQueriesContext(connection) as queries:
+            base, standings = ladder_at(now())
+
+        # the daily standings are looked for first
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(base, 'live')
+        self.assertEqual([(standing['user_id'], standing['rank']) for standing in standings], live)
+        self.assertEqual(ladder_at(self.matches[0].played - timedelta(days=2))[1], [])
+        self.assertEqual(self.check_history(), {'live'})
+
+        # store the end of each day played then replay again, now mostly from the stored days
+        days = sorted({localdate(match.played) for match in self.matches})
+        DailyStanding.objects.bulk_create(
+            [
+                DailyStanding(date=day, user_id=standing['user_id'], rank=standing['rank'], rating=1500)
+                for day in days
+                for standing in ladder_at(start_of_day(day + timedelta(days=1)) - timedelta(microseconds=1))[1]
+            ]
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            base, standings = ladder_at(self.matches[10].played)
+
+        self.assertEqual(len(queries), 3)
+        self.assertLess(base, localdate(self.matches[10].played))
+
+        bases = self.check_history()
+        self.assertIn('live', bases)
+        self.assertGreater(len(bases), 10)
+
+    def test_replay_view(self):
+        """
+        The replayed ladder is served as JSON for any ISO 8601 time
+        """
+        User.objects.create_user(username='viewer', password='123456789')
+        self.client.login(username='viewer', password='123456789')
+        match = self.matches[-1]
+
+        response = self.client.get(reverse('ladder_replay'), {'at': match.played.isoformat()}).json()
+        self.assertEqual(response['base'], 'live')
+        self.assertEqual(
+            [standing['username'] for standing in response['standings'] if standing['rank'] == match.winner_rank],
+            [match.winner.username]
+        )
+        self.assertEqual(self.client.get(reverse('ladder_replay'), {'at': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('ladder_replay'), {'at': '2020-02-30T10:00'}).status_code, 400)
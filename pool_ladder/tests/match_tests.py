@@ -1,15 +1,10 @@
+from django.db import connection
 from django.db.models import Max
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from pool_ladder.models import User, UserProfile, Game, Match
-
-
-def create_user(rank, active=True):
-    user = User.objects.create_user(username='user_rank_{}'.format(rank), password='123456789')
-    UserProfile.objects.create(
-        user=user,
-        rank=rank,
-        active=active
-    )
+from pool_ladder.results import record_result
+from pool_ladder.tests.helpers import create_user
 
 
 class MatchTestCase(TestCase):
@@ -154,7 +149,7 @@ class MatchTestCase(TestCase):
             challenger_rank=self.challenger.userprofile.rank,
             opponent_rank=self.opponent.userprofile.rank
         )
-        match.start_match()
+        record_result(match, [(self.opponent, None), (self.opponent, None), (None, None)])
 
         # make sure that both players are in cool down
         self.assertTrue(self.challenger.userprofile.in_cool_down)
@@ -187,15 +182,14 @@ class MatchTestCase(TestCase):
 
         # the third match results in a balling
         third_match = Match.objects.get(pk=3)
-        third_match.start_match()
-
-        game_0 = third_match.game_set.get(index=0)
-        game_0.winner = User.objects.get(username='user_rank_5')
-        game_0.balled = User.objects.get(username='user_rank_6')
-        game_0.save()
-
-        third_match.set_winner_and_loser()
-        third_match.save()
+        record_result(
+            third_match,
+            [
+                (User.objects.get(username='user_rank_5'), User.objects.get(username='user_rank_6')),
+                (None, None),
+                (None, None)
+            ]
+        )
 
         # user ranks should have altered accordingly
         self.assertEqual(User.objects.get(username='user_rank_6').userprofile.rank, 20)
@@ -256,7 +250,7 @@ class MatchTestCase(TestCase):
         # create loads of users with a couple inactive
         for x in range(20):
             rank = x + 1
-            create_user(rank, (rank < 18))
+            create_user(rank, active=(rank < 18))
 
         # create a match
         match = Match.objects.create(
@@ -267,18 +261,39 @@ class MatchTestCase(TestCase):
         )
 
         # the match results in a balling
-        match.start_match()
-
-        game_0 = match.game_set.get(index=0)
-        game_0.winner = User.objects.get(username='user_rank_5')
-        game_0.balled = User.objects.get(username='user_rank_3')
-        game_0.save()
-
-        match.set_winner_and_loser()
-        match.save()
+        record_result(
+            match,
+            [
+                (User.objects.get(username='user_rank_5'), User.objects.get(username='user_rank_3')),
+                (None, None),
+                (None, None)
+            ]
+        )
 
         # make sure the balled players rank is
         self.assertEqual(
             User.objects.get(username='user_rank_3').userprofile.rank,
             UserProfile.objects.filter(active=True).aggregate(max_rank=Max('rank'))['max_rank']
         )
+
+    def test_a_balling_does_not_scale_with_the_ladder(self):
+        """
+        Shifting the ladder after a balling is a fixed number of queries however many players move
+        """
+        for x in range(30):
+            create_user(x + 4)
+
+        def count_balling_queries(balled_rank):
+            profile = UserProfile.objects.get(rank=balled_rank)
+
+            with CaptureQueriesContext(connection) as queries:
+                profile.update_rank(balled_rank, balled=True)
+
+            return len(queries)
+
+        # a ball near the top moves everyone, near the bottom moves only a few
+        self.assertEqual(count_balling_queries(2), count_balling_queries(30))
+        self.assertEqual(
+            list(UserProfile.objects.order_by('rank').values_list('rank', flat=True)),
+            list(range(1, 34))
+        )
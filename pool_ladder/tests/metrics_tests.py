@@ -0,0 +1,75 @@
+import io
+from contextlib import redirect_stdout
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from pool_ladder import metrics
+from pool_ladder.models import User, Match, Season
+from pool_ladder.tests.helpers import create_user
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.users = [create_user(rank) for rank in range(1, 6)]
+        self.client.login(username='user_rank_1', password='123456789')
+
+    def test_view_sample(self):
+        """
+        A datatables request records the queries it ran, apart from the middleware's, along with the time
+        spent rendering its rows
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('ladder_datatable'), {'draw': 1, 'search[value]': 'user'})
+
+        totals = metrics.totals()['LadderDataTablesView']
+        self.assertEqual(totals['count'], 1)
+        self.assertGreater(totals['queries'], 0)
+        self.assertLess(totals['queries'], len(queries))
+        self.assertGreater(totals['template_time'], 0)
+        # queries run while rendering count towards both timings
+        self.assertGreaterEqual(totals['wall_time'], max(totals['db_time'], totals['template_time']))
+
+    def test_streamed_sample(self):
+        """
+        Streamed responses are recorded once their content has been sent
+        """
+        season = Season.objects.create(number=1)
+        Match.objects.create(challenger=self.users[1], opponent=self.users[0], season=season)
+
+        response = self.client.get(reverse('match-data', kwargs={'season': 1}))
+        self.assertNotIn('MatchData', metrics.totals())
+
+        b''.join(response.streaming_content)
+        self.assertGreater(metrics.totals()['MatchData']['queries'], 0)
+
+    def test_endpoint(self):
+        """
+        The metrics are only shown to staff
+        """
+        self.client.get(reverse('ladder_datatable'), {'draw': 1})
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        User.objects.filter(pk=self.users[0].pk).update(is_staff=True)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        text = response.content.decode()
+        self.assertIn('pool_ladder_requests_total{name="LadderDataTablesView"} 1', text)
+        self.assertIn('pool_ladder_duration_seconds_bucket{name="LadderDataTablesView",le="+Inf"} 1', text)
+        self.assertIn('pool_ladder_fanout_saves', text)
+
+    @override_settings(METRICS_SLOW_REQUEST=0)
+    def test_slow_log(self):
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            self.client.get(reverse('ladder_datatable'), {'draw': 1})
+
+        self.assertIn('slow LadderDataTablesView', output.getvalue())
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.testing import ApplicationCommunicator
+from django.core import mail
+from django.test import TransactionTestCase, override_settings
+
+from pool_ladder.consumers import NotificationConsumer
+from pool_ladder.models import FailedNotification
+from pool_ladder.notifications import deliver, deliver_slack, digest, retry_failed
+
+
+class StubWebhook(BaseHTTPRequestHandler):
+    """
+    records each post and answers with the next queued status
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.posts.append(json.loads(body.decode()))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    # keep-alive connections stay open so each needs its own thread
+    daemon_threads = True
+
+
+@override_settings(
+    FROM_EMAIL='ladder@example.com',
+    NOTIFICATION_WINDOW=0.1,
+    NOTIFICATION_BACKOFF=0.01,
+    NOTIFICATION_RETRIES=2,
+)
+class NotificationsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.server = StubServer(('127.0.0.1', 0), StubWebhook)
+        self.server.posts = []
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.settings = override_settings(
+            SLACK_WEBHOOK_URL='http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+
+    def test_slack_retries_with_backoff(self):
+        """
+        Server errors are retried and the message is only posted once it goes through
+        """
+        self.server.statuses = [500, 503]
+        deliver_slack(['hello'])
+
+        self.assertEqual(len(self.server.posts), 3)
+        self.assertFalse(FailedNotification.objects.exists())
+
+    def test_undeliverable_slack_is_dead_lettered(self):
+        """
+        A message that fails every attempt is stored so it can be retried from the admin
+        """
+        self.server.statuses = [500, 500, 500]
+        deliver_slack(['hello'])
+
+        failed = FailedNotification.objects.get()
+        self.assertEqual(failed.kind, 'slack')
+        self.assertEqual(failed.attempts, 3)
+
+        self.assertTrue(retry_failed(failed))
+        self.assertFalse(FailedNotification.objects.exists())
+        self.assertEqual(self.server.posts[-1], {'text': 'hello'})
+
+    def test_client_errors_are_not_retried(self):
+        """
+        Rate limiting is retried but other client errors go straight to the dead letter store
+        """
+        self.server.statuses = [429]
+        deliver_slack(['hello'])
+        self.assertEqual(len(self.server.posts), 2)
+        self.assertFalse(FailedNotification.objects.exists())
+
+        self.server.statuses = [404]
+
+        with mock.patch('pool_ladder.notifications.close_old_connections') as close_old_connections:
+            deliver('slack', ['hello again'])
+
+        self.assertEqual(len(self.server.posts), 3)
+        self.assertEqual(FailedNotification.objects.get().attempts, 1)
+        close_old_connections.assert_called_once_with()
+
+    def test_digest_splits_long_bursts(self):
+        self.assertEqual(digest(['a', 'b', 'c']), ['a\nb\nc'])
+        self.assertEqual(digest(['a' * 6, 'b' * 6, 'c'], limit=10), ['a' * 6, 'b' * 6 + '\nc'])
+
+    def test_bursts_become_one_post(self):
+        """
+        Messages arriving within the window are posted together and emails are all sent
+        """
+        async_to_sync(self.send_burst)()
+        self.wait_for(lambda: self.server.posts and len(mail.outbox) == 2)
+
+        self.assertEqual(self.server.posts, [{'text': 'forfeit 0\nforfeit 1\nforfeit 2'}])
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@example.com', 'b@example.com'])
+
+    async def send_burst(self):
+        consumer = ApplicationCommunicator(NotificationConsumer, {'type': 'channel', 'channel': 'notifications'})
+
+        for index in range(3):
+            await consumer.send_input({'type': 'slack', 'message': 'forfeit {}'.format(index)})
+
+        for email in ['a@example.com', 'b@example.com']:
+            await consumer.send_input({'type': 'email', 'email': email, 'challenger': 'c', 'time_until': 'soon'})
+
+        # give the window time to close before the consumer is stopped
+        await consumer.receive_nothing(timeout=0.5)
+        await consumer.wait(timeout=0.1)
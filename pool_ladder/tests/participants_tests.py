@@ -0,0 +1,183 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TransactionTestCase
+
+from pool_ladder.benchmarks import generate_ladder
+from pool_ladder.models import Match, MatchParticipant, Season, UserProfile
+from pool_ladder.results import record_result
+from pool_ladder.seasons import start_new_season
+from pool_ladder.tests.helpers import create_user
+
+
+def participants(match):
+    return list(
+        MatchParticipant.objects.filter(
+            match=match
+        ).values_list(
+            'user_id',
+            'role',
+            'result',
+            'rank_before',
+            'rank_after'
+        )
+    )
+
+
+class MatchParticipantTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 6)]
+        self.match = Match.objects.create(
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3
+        )
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def test_challenge(self):
+        """
+        A challenge has a row for each player that is kept up to date as it is declined
+        """
+        self.assertEqual(
+            participants(self.match),
+            [
+                (self.users[3].pk, MatchParticipant.CHALLENGER, MatchParticipant.OPEN, 4, None),
+                (self.users[2].pk, MatchParticipant.OPPONENT, MatchParticipant.OPEN, 3, None)
+            ]
+        )
+        self.assertTrue(self.users[2].userprofile.has_open_challenge)
+        self.assertFalse(self.users[0].userprofile.has_open_challenge)
+
+        self.match.declined = True
+        self.match.save()
+        self.assertEqual(
+            [result for user_id, role, result, before, after in participants(self.match)],
+            [MatchParticipant.DECLINED, MatchParticipant.DECLINED]
+        )
+        self.assertFalse(self.users[2].userprofile.has_open_challenge)
+
+    def test_result(self):
+        """
+        Entering the result records who won and the rank each player left with
+        """
+        record_result(self.match, [(self.users[3], None), (self.users[3], None), (None, None)])
+        self.assertEqual(
+            participants(self.match),
+            [
+                (self.users[3].pk, MatchParticipant.CHALLENGER, MatchParticipant.WON, 4, 3),
+                (self.users[2].pk, MatchParticipant.OPPONENT, MatchParticipant.LOST, 3, 4)
+            ]
+        )
+        self.assertEqual(list(self.users[3].userprofile.matches), [self.match])
+        self.assertEqual(
+            [rank for played, rank in UserProfile.objects.get(user=self.users[2]).rank_history()],
+            [3, 4]
+        )
+
+    def test_balled(self):
+        """
+        A balled player moving to the bottom moves the pending challenges below them up, participants included
+        """
+        pending = Match.objects.create(
+            challenger=self.users[4],
+            opponent=self.users[3],
+            challenger_rank=5,
+            opponent_rank=4
+        )
+        match = Match.objects.create(
+            challenger=self.users[1],
+            opponent=self.users[0],
+            challenger_rank=2,
+            opponent_rank=1
+        )
+        record_result(match, [(None, self.users[1])])
+        pending.refresh_from_db()
+        self.assertEqual(
+            [before for user_id, role, result, before, after in participants(pending)],
+            [pending.challenger_rank, pending.opponent_rank]
+        )
+        self.assertEqual(participants(match)[0][2:], (MatchParticipant.LOST, 2, 5))
+
+    def test_can_decline(self):
+        """
+        Being challenged in both of the last two matches is read from the participants, a declined one not counting
+        """
+        opponent = UserProfile.objects.get(user=self.users[2])
+        self.assertFalse(opponent.can_decline())
+
+        record_result(self.match, [(self.users[2], None), (self.users[2], None), (None, None)])
+        Match.objects.create(challenger=self.users[4], opponent=self.users[2], challenger_rank=5, opponent_rank=3)
+        self.assertTrue(opponent.can_decline())
+
+        Match.objects.create(
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3,
+            declined=True
+        )
+        self.assertFalse(opponent.can_decline())
+
+        Match.objects.create(challenger=self.users[4], opponent=self.users[2], challenger_rank=5, opponent_rank=3)
+        self.assertFalse(opponent.can_decline())
+
+        Match.objects.create(challenger=self.users[3], opponent=self.users[2], challenger_rank=4, opponent_rank=3)
+        self.assertTrue(opponent.can_decline())
+
+    def test_new_season(self):
+        """
+        Open challenges are declined or carried over with the new ranks
+        """
+        Season.objects.create(number=1)
+        start_new_season('previous', carry_challenges=True)
+        self.assertEqual([result for row in participants(self.match) for result in row[2:4]], ['open', 4, 'open', 3])
+
+        start_new_season('previous')
+        self.assertEqual([row[2] for row in participants(self.match)], ['declined', 'declined'])
+
+        # a match that has been played keeps its result
+        played = Match.objects.create(
+            challenger=self.users[1],
+            opponent=self.users[0],
+            challenger_rank=2,
+            opponent_rank=1
+        )
+        record_result(played, [(self.users[0], None), (self.users[0], None), (None, None)])
+        start_new_season('previous')
+        self.assertEqual([row[2] for row in participants(played)], ['lost', 'won'])
+        self.assertFalse(Match.objects.get(pk=played.pk).declined)
+
+
+class ParticipantHistoryTestCase(TransactionTestCase):
+    def test_rank_history(self):
+        """
+        The history read from the participants is the same as working it out from the matches
+        """
+        generate_ladder(12, years=1, rate=0.5)
+        self.assertEqual(MatchParticipant.objects.count(), Match.objects.count() * 2)
+
+        for profile in UserProfile.objects.all():
+            user = profile.user
+            expected = []
+
+            for match in Match.objects.filter(played__isnull=False).order_by('played'):
+                if user.pk == match.challenger_id:
+                    expected += [(match.played, match.challenger_rank)]
+                elif user.pk == match.opponent_id:
+                    expected += [(match.played, match.opponent_rank)]
+                else:
+                    continue
+
+                expected += [(match.played, match.winner_rank if match.winner_id == user.pk else match.loser_rank)]
+
+            self.assertEqual(profile.rank_history(), expected)
+            self.assertEqual(
+                set(profile.matches.values_list('pk', flat=True)),
+                set(
+                    Match.objects.filter(played__isnull=False, challenger=user).values_list('pk', flat=True)
+                ) | set(
+                    Match.objects.filter(played__isnull=False, opponent=user).values_list('pk', flat=True)
+                )
+            )
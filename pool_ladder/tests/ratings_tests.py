@@ -0,0 +1,137 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from pool_ladder.availability import LadderAvailability
+from pool_ladder.diffs import ladder_rows
+from pool_ladder.models import Match, PlayerRating, Season, UserProfile
+from pool_ladder.ratings import elo, expected_score
+from pool_ladder.results import record_result
+from pool_ladder.seasons import start_new_season
+from pool_ladder.tests.helpers import create_user
+
+
+@override_settings(RATING_INITIAL=1500, RATING_K_FACTOR=32)
+class RatingsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        self.season = Season.objects.create(number=1)
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def play(self, challenger, opponent, winner):
+        match = Match.objects.create(
+            season=Season.objects.first(),
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=UserProfile.objects.get(user=challenger).rank,
+            opponent_rank=UserProfile.objects.get(user=opponent).rank
+        )
+        return record_result(match, [(winner, None), (winner, None), (None, None)])
+
+    def ratings(self):
+        return {
+            (rating.user_id, rating.season_id): (round(rating.rating, 6), rating.matches)
+            for rating in PlayerRating.objects.all()
+        }
+
+    def test_elo(self):
+        """
+        An even match moves both ratings by half the K factor and an upset moves them further
+        """
+        self.assertEqual(expected_score(1500, 1500), 0.5)
+        self.assertEqual(elo(1500, 1500), (1516, 1484))
+        self.assertGreater(elo(1400, 1600)[0] - 1400, elo(1600, 1400)[0] - 1600)
+        self.assertEqual(elo(1500, 1500, k_factor=10), (1505, 1495))
+
+    def test_result(self):
+        """
+        Entering a result moves the season ratings of both players and records them on the match and the ladder
+        """
+        match = self.play(self.users[3], self.users[2], self.users[3])
+        self.assertEqual((match.winner_rating, match.loser_rating), (1516, 1484))
+        self.assertEqual(
+            self.ratings(),
+            {(self.users[3].pk, self.season.pk): (1516, 1), (self.users[2].pk, self.season.pk): (1484, 1)}
+        )
+        self.assertEqual(UserProfile.objects.get(user=self.users[3]).rating, 1516)
+
+        # balled results go through a different path for the ranks
+        match = Match.objects.create(
+            season=self.season,
+            challenger=self.users[1],
+            opponent=self.users[0],
+            challenger_rank=2,
+            opponent_rank=1
+        )
+        record_result(match, [(None, self.users[1])])
+        self.assertEqual(UserProfile.objects.get(user=self.users[1]).rating, 1484)
+        self.assertEqual(UserProfile.objects.get(user=self.users[0]).rating, 1516)
+
+    def test_rebuild(self):
+        """
+        Replaying the history gives the same ratings as recording them one result at a time
+        """
+        self.play(self.users[3], self.users[2], self.users[3])
+        self.play(self.users[2], self.users[1], self.users[2])
+        self.play(self.users[1], self.users[0], self.users[0])
+        start_new_season('elo')
+        self.play(self.users[1], self.users[0], self.users[1])
+
+        ratings = self.ratings()
+        match_ratings = list(Match.objects.order_by('pk').values_list('winner_rating', 'loser_rating'))
+        profile_ratings = list(UserProfile.objects.order_by('pk').values_list('rating', flat=True))
+
+        PlayerRating.objects.all().delete()
+        Match.objects.update(winner_rating=None, loser_rating=None)
+        UserProfile.objects.update(rating=0)
+        call_command('rebuild_ratings')
+
+        self.assertEqual(self.ratings(), ratings)
+        self.assertEqual(list(Match.objects.order_by('pk').values_list('winner_rating', 'loser_rating')), match_ratings)
+        self.assertEqual(list(UserProfile.objects.order_by('pk').values_list('rating', flat=True)), profile_ratings)
+
+        # rebuilding an earlier season leaves the ladder alone
+        UserProfile.objects.update(rating=0)
+        call_command('rebuild_ratings', '--season', '1')
+        self.assertEqual(self.ratings(), ratings)
+        self.assertEqual(list(UserProfile.objects.values_list('rating', flat=True)), [0] * 4)
+
+    def test_new_season(self):
+        """
+        Ratings start again each season and the elo strategy seeds the ladder on the ones players finished with
+        """
+        self.play(self.users[3], self.users[2], self.users[3])
+        self.play(self.users[3], self.users[1], self.users[3])
+        self.play(self.users[1], self.users[0], self.users[1])
+
+        # 1531, 1501 from a win and a loss, 1484 losing to a new player and 1483 losing to a better one
+        start_new_season('elo')
+        self.assertEqual(
+            list(UserProfile.objects.order_by('rank').values_list('user_id', flat=True)),
+            [self.users[3].pk, self.users[1].pk, self.users[2].pk, self.users[0].pk]
+        )
+        self.assertEqual(set(UserProfile.objects.values_list('rating', flat=True)), {1500})
+
+        match = self.play(self.users[1], self.users[0], self.users[0])
+        self.assertEqual((match.winner_rating, match.loser_rating), (1516, 1484))
+        self.assertEqual(PlayerRating.objects.filter(season=Season.objects.first()).count(), 2)
+
+    def test_ladder_and_export(self):
+        """
+        The rating is shown on the ladder and is part of the match data
+        """
+        self.play(self.users[3], self.users[2], self.users[3])
+
+        profile = UserProfile.objects.select_related('user').get(user=self.users[3])
+        row = ladder_rows(LadderAvailability(), [profile])[0]
+        self.assertIn('1516', row['cells'][1])
+
+        response = self.client.get(reverse('match-data', kwargs={'season': 0}))
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((data[0]['winner_rating'], data[0]['loser_rating']), (1516, 1484))
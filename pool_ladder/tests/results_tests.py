@@ -0,0 +1,85 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TransactionTestCase
+
+from pool_ladder.models import User, UserProfile, Match
+from pool_ladder.tests.helpers import create_user
+
+
+async def drain(channel):
+    """
+    return every message waiting on the channel
+    """
+    messages = []
+
+    while True:
+        try:
+            messages.append(await asyncio.wait_for(get_channel_layer().receive(channel), 0.05))
+        except asyncio.TimeoutError:
+            return messages
+
+
+class ResultsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 6)]
+        self.match = Match.objects.create(
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3
+        )
+        async_to_sync(get_channel_layer().flush)()
+        self.client.login(username='user_rank_4', password='123456789')
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def post_result(self, games):
+        data = {}
+
+        for index, (winner, balled) in enumerate(games):
+            data['game_{}_winner'.format(index)] = winner.pk if winner else '---'
+            data['game_{}_balled'.format(index)] = balled.pk if balled else '---'
+
+        return self.client.post('/play/{}'.format(self.match.pk), data)
+
+    def test_result_sends_one_update(self):
+        """
+        Entering a result sends one table update and one slack message
+        """
+        response = self.post_result([(self.users[3], None), (self.users[2], None), (self.users[3], None)])
+        self.assertEqual(response.url, '/')
+
+        match = Match.objects.get(pk=self.match.pk)
+        self.assertEqual(match.winner, self.users[3])
+        self.assertEqual(match.winner_rank, 3)
+        self.assertEqual(match.loser_rank, 4)
+        self.assertEqual(match.game_set.count(), 3)
+        self.assertEqual(User.objects.get(username='user_rank_4').userprofile.movement, -1)
+
+        self.assertEqual(
+            async_to_sync(drain)('fanout'),
+            [{'type': 'tables.dirty', 'tables': ['matches', 'users', 'challenges']}]
+        )
+        self.assertEqual(
+            async_to_sync(drain)('notifications'),
+            [{'type': 'slack', 'message': 'user_rank_4 has beaten user_rank_3!'}]
+        )
+
+    def test_balled_result_sends_one_update(self):
+        """
+        A balling moves the ladder but still only sends one table update and one slack message
+        """
+        self.post_result([(self.users[3], self.users[2]), (None, None), (None, None)])
+
+        self.assertEqual(
+            list(UserProfile.objects.order_by('rank').values_list('user__username', flat=True)),
+            ['user_rank_1', 'user_rank_2', 'user_rank_4', 'user_rank_5', 'user_rank_3']
+        )
+        self.assertEqual(len(async_to_sync(drain)('fanout')), 1)
+        self.assertEqual(
+            async_to_sync(drain)('notifications'),
+            [{'type': 'slack', 'message': 'user_rank_3 JUST GOT BALLED!'}]
+        )
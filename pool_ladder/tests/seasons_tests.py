@@ -0,0 +1,120 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from pool_ladder.models import User, UserProfile, Match, PlayerStats, Season
+from pool_ladder.results import record_result
+from pool_ladder.seasons import start_new_season
+from pool_ladder.tests.results_tests import drain
+from pool_ladder.tests.helpers import create_user
+
+
+class SeasonsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 7)]
+        self.season = Season.objects.create(number=1)
+        PlayerStats.rebuild()
+        async_to_sync(get_channel_layer().flush)()
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def ranks(self):
+        return list(UserProfile.objects.order_by('rank').values_list('user_id', flat=True))
+
+    def play(self, challenger, opponent, winner):
+        match = Match.objects.create(
+            season=self.season,
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=UserProfile.objects.get(user=challenger).rank,
+            opponent_rank=UserProfile.objects.get(user=opponent).rank
+        )
+        record_result(match, [(winner, None), (winner, None), (None, None)])
+
+    def test_random(self):
+        """
+        The ranks are shuffled in a handful of queries and the table update goes out once
+        """
+        async_to_sync(drain)('fanout')
+
+        with CaptureQueriesContext(connection) as queries:
+            season = start_new_season(seed=1)
+
+        self.assertEqual(season.number, 2)
+        # including the four that store the standings season 1 finished with
+        self.assertLess(len(queries), 16)
+        self.assertEqual(sorted(UserProfile.objects.values_list('rank', flat=True)), list(range(1, 7)))
+        self.assertNotEqual(self.ranks(), [user.pk for user in self.users])
+
+        messages = async_to_sync(drain)('fanout')
+        self.assertEqual(messages, [{'type': 'tables.dirty', 'tables': ['users', 'challenges']}])
+
+        # the swag follows the new top and bottom of the ladder
+        self.assertTrue(PlayerStats.objects.get(user_id=self.ranks()[0]).is_top)
+        self.assertTrue(PlayerStats.objects.get(user_id=self.ranks()[-1]).is_bottom)
+
+    def test_previous(self):
+        """
+        Ranks keep the order they finished in, closing any gaps
+        """
+        UserProfile.objects.filter(user=self.users[5]).update(active=False)
+        start_new_season('previous')
+        self.assertEqual(self.ranks()[:5], [user.pk for user in self.users[:5]])
+
+    def test_record(self):
+        """
+        Players are seeded on how they did last season
+        """
+        self.play(self.users[5], self.users[4], self.users[5])
+        self.play(self.users[5], self.users[3], self.users[5])
+        self.play(self.users[2], self.users[1], self.users[1])
+
+        before = self.ranks()
+        start_new_season('record')
+
+        # two wins, one win, no matches then one loss each in the order they finished
+        losers = [user_id for user_id in before if user_id in (self.users[2].pk, self.users[3].pk, self.users[4].pk)]
+        self.assertEqual(self.ranks(), [self.users[5].pk, self.users[1].pk, self.users[0].pk] + losers)
+
+    def test_open_challenges(self):
+        """
+        Open challenges are declined unless they are carried into the new season with the new ranks
+        """
+        challenge = Match.objects.create(
+            season=self.season,
+            challenger=self.users[1],
+            opponent=self.users[0],
+            challenger_rank=2,
+            opponent_rank=1
+        )
+        start_new_season('previous', carry_challenges=True)
+        challenge.refresh_from_db()
+        self.assertFalse(challenge.declined)
+        self.assertEqual(challenge.season.number, 2)
+
+        UserProfile.objects.filter(user=self.users[0]).update(rank=7)
+        start_new_season('previous', carry_challenges=True)
+        challenge.refresh_from_db()
+        self.assertEqual((challenge.challenger_rank, challenge.opponent_rank), (1, 6))
+
+        start_new_season()
+        challenge.refresh_from_db()
+        self.assertTrue(challenge.declined)
+        self.assertEqual(challenge.season.number, 3)
+
+    def test_view(self):
+        """
+        Only superusers can start a season and the strategy is checked
+        """
+        self.client.login(username='user_rank_1', password='123456789')
+        self.assertEqual(self.client.get(reverse('new-season')).status_code, 403)
+
+        User.objects.filter(pk=self.users[0].pk).update(is_superuser=True)
+        self.assertEqual(self.client.get(reverse('new-season'), {'strategy': 'alphabetical'}).status_code, 400)
+        self.assertRedirects(self.client.get(reverse('new-season'), {'strategy': 'previous'}), reverse('index'))
+        self.assertEqual(Season.objects.first().number, 2)
+        self.assertEqual(self.ranks(), [user.pk for user in self.users])
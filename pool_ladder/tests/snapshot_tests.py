@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from pool_ladder import snapshot
+from pool_ladder.fanout import bump_table_versions
+from pool_ladder.models import Match
+from pool_ladder.snapshot import get_snapshot
+from pool_ladder.tests.helpers import create_user
+
+
+class LadderSnapshotTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        snapshot._snapshot = None
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        Match.objects.create(challenger=self.users[3], opponent=self.users[2], challenger_rank=4, opponent_rank=3)
+
+    def test_snapshot_is_kept_until_the_version_moves(self):
+        first = get_snapshot()
+        self.assertEqual([profile.rank for profile in first.profiles], [1, 2, 3, 4])
+        self.assertEqual(len(first.challenges), 1)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_snapshot(), first)
+
+        create_user(5)
+        self.assertIs(get_snapshot(), first)
+
+        # as the commit of the save would
+        bump_table_versions(['users'])
+        self.assertEqual([profile.rank for profile in get_snapshot().profiles], [1, 2, 3, 4, 5])
+
+    def test_shared_snapshot_is_used_by_other_processes(self):
+        """
+        A process without its own copy reads the one another process built rather than the database
+        """
+        get_snapshot()
+        snapshot._snapshot = None
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_snapshot().profiles), 4)
+
+    def test_refreshes_do_not_read_the_ladder(self):
+        """
+        Once the snapshot is built the ladder and challenges tables don't query the ladder again
+        """
+        self.client.login(username='user_rank_1', password='123456789')
+        get_snapshot()
+
+        with CaptureQueriesContext(connection) as queries:
+            for name in ['ladder_datatable', 'challenge_datatable', 'match_datatable']:
+                for draw in range(3):
+                    response = self.client.get(reverse(name), {'draw': draw, 'start': 0, 'length': 10})
+                    self.assertEqual(response.status_code, 200)
+
+        self.assertEqual([query['sql'] for query in queries if 'pool_ladder_' in query['sql']], [])
@@ -0,0 +1,184 @@
+from datetime import date, timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate
+
+from pool_ladder.benchmarks import generate_ladder
+from pool_ladder.models import DailyStanding, Match, MatchParticipant, Season, SeasonStanding, UserProfile
+from pool_ladder.results import record_result
+from pool_ladder.seasons import start_new_season
+from pool_ladder.standings import backfill_daily_standings, ladder_as_of, snapshot_day
+from pool_ladder.tests.helpers import create_user
+
+
+class StandingsTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        self.season = Season.objects.create(number=1)
+
+    def tearDown(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def test_season_standings(self):
+        """
+        Starting a season keeps the ranks, results and ratings the last one finished with
+        """
+        match = Match.objects.create(
+            season=self.season,
+            challenger=self.users[3],
+            opponent=self.users[2],
+            challenger_rank=4,
+            opponent_rank=3
+        )
+        record_result(match, [(self.users[3], None), (self.users[2], None), (self.users[3], None)])
+        start_new_season(seed=1)
+
+        self.assertEqual(
+            list(
+                SeasonStanding.objects.filter(
+                    season=self.season
+                ).values_list(
+                    'user_id', 'rank', 'matches_won', 'matches_lost', 'games_won', 'rating'
+                )
+            ),
+            [
+                (self.users[0].pk, 1, 0, 0, 0, 1500),
+                (self.users[1].pk, 2, 0, 0, 0, 1500),
+                (self.users[3].pk, 3, 1, 0, 2, 1516),
+                (self.users[2].pk, 4, 0, 1, 1, 1484)
+            ]
+        )
+        self.assertEqual(SeasonStanding.objects.count(), 4)
+
+        self.client.login(username='user_rank_1', password='123456789')
+        response = self.client.get(reverse('season_standings', kwargs={'number': 1})).json()
+        self.assertEqual([standing['user__username'] for standing in response['standings']][2], 'user_rank_4')
+        self.assertEqual(self.client.get(reverse('season_standings', kwargs={'number': 2})).json()['standings'], [])
+
+    def test_daily_standings(self):
+        """
+        The ladder on a date is the latest day stored on or before it, read in one query
+        """
+        today = localdate()
+        snapshot_day(today - timedelta(days=3))
+        UserProfile.objects.filter(user=self.users[0]).update(rank=5)
+        snapshot_day(today)
+        snapshot_day(today)
+
+        with CaptureQueriesContext(connection) as queries:
+            ladder = [standing.user for standing in ladder_as_of(today - timedelta(days=1))]
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(ladder, self.users)
+        self.assertEqual([standing.user for standing in ladder_as_of(today)], self.users[1:] + self.users[:1])
+        self.assertEqual(list(ladder_as_of(today - timedelta(days=4))), [])
+        self.assertEqual(DailyStanding.objects.filter(date=today).count(), 4)
+
+        self.client.login(username='user_rank_1', password='123456789')
+        response = self.client.get(reverse('ladder_history', kwargs={'date': str(today - timedelta(days=1))})).json()
+        self.assertEqual(response['date'], str(today - timedelta(days=3)))
+        self.assertEqual(response['standings'][0], {'rank': 1, 'user__username': 'user_rank_1', 'rating': 1500})
+        self.assertEqual(self.client.get(reverse('ladder_history', kwargs={'date': 'yesterday'})).status_code, 400)
+        self.assertEqual(self.client.get(reverse('ladder_history', kwargs={'date': '2020-13-45'})).status_code, 400)
+
+    def test_backfill_across_seasons(self):
+        """
+        Backfilled days start again from the new season's ranks rather than where players finished the last one
+        """
+        users = self.users
+        record_result(
+            Match.objects.create(
+                season=self.season, challenger=users[3], opponent=users[2], challenger_rank=4, opponent_rank=3
+            ),
+            [(users[3], None), (users[3], None), (None, None)]
+        )
+        # seeded on rating the winner goes to the top
+        season = start_new_season('elo')
+        profiles = {profile.user_id: profile for profile in UserProfile.objects.all()}
+        self.assertEqual([profiles[user.pk].rank for user in users], [2, 3, 4, 1])
+
+        for challenger, opponent in [(users[1], users[0]), (users[2], users[3])]:
+            record_result(
+                Match.objects.create(
+                    season=season,
+                    challenger=challenger,
+                    opponent=opponent,
+                    challenger_rank=profiles[challenger.pk].rank,
+                    opponent_rank=profiles[opponent.pk].rank
+                ),
+                [(opponent, None), (opponent, None), (None, None)]
+            )
+
+        # one match a day, oldest first
+        today = localdate()
+
+        for days_ago, match in enumerate(Match.objects.order_by('-pk'), start=1):
+            played = match.played - timedelta(days=days_ago)
+            Match.objects.filter(pk=match.pk).update(played=played)
+            MatchParticipant.objects.filter(match=match).update(played=played)
+
+        DailyStanding.objects.all().delete()
+        backfill_daily_standings()
+
+        # the first day of the new season has the players that hadn't played in it yet at their new ranks
+        self.assertEqual(
+            [standing.user for standing in ladder_as_of(today - timedelta(days=2))],
+            [users[3], users[0], users[1], users[2]]
+        )
+        # only those that played in the first season are in its days
+        self.assertEqual(
+            [standing.user for standing in ladder_as_of(today - timedelta(days=3))],
+            [users[3], users[2]]
+        )
+
+
+class BackfillStandingsTestCase(TransactionTestCase):
+    def test_backfill(self):
+        """
+        Finished seasons and each day played are replayed from the history, leaving what is already there alone
+        """
+        generate_ladder(10, years=2, rate=0.5)
+        seasons = list(Season.objects.order_by('number'))
+        first_day = localdate(Match.objects.filter(played__isnull=False).order_by('played').first().played)
+        snapshot_day(first_day)
+
+        call_command('backfill_standings')
+
+        finished = SeasonStanding.objects.values_list('season', flat=True).distinct()
+        self.assertEqual(set(finished), {seasons[0].pk})
+        self.assertEqual(
+            SeasonStanding.objects.filter(season=seasons[0]).count(),
+            len({
+                user_id for pair in Match.objects.filter(
+                    season=seasons[0],
+                    played__isnull=False
+                ).values_list('winner_id', 'loser_id') for user_id in pair
+            })
+        )
+
+        ranks = list(SeasonStanding.objects.filter(season=seasons[0]).values_list('rank', flat=True))
+        self.assertEqual(ranks, list(range(1, len(ranks) + 1)))
+
+        played_days = {localdate(played) for played in Match.objects.filter(
+            played__isnull=False
+        ).values_list('played', flat=True)}
+        self.assertEqual(set(DailyStanding.objects.values_list('date', flat=True)), played_days)
+
+        # the day that was already stored is kept as it was, with everyone on the ladder
+        self.assertEqual(DailyStanding.objects.filter(date=first_day).count(), 10)
+
+        # the last day played has the ranks everyone came out of their latest match with
+        last = Match.objects.filter(played__isnull=False).order_by('-played').first()
+        self.assertEqual(
+            list(ladder_as_of(date.max).filter(user__in=[last.winner, last.loser]).values_list('user', 'rank')),
+            sorted([(last.winner_id, last.winner_rank), (last.loser_id, last.loser_rank)], key=lambda pair: pair[1])
+        )
+
+        call_command('backfill_standings')
+        self.assertEqual(DailyStanding.objects.count(), DailyStanding.objects.values('date', 'user').distinct().count())
@@ -0,0 +1,84 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from pool_ladder.models import UserProfile, Match, PlayerStats
+from pool_ladder.results import record_result
+from pool_ladder.tests.helpers import create_user
+
+
+class PlayerStatsTestCase(TestCase):
+    def setUp(self):
+        self.users = [create_user(rank) for rank in range(1, 5)]
+        PlayerStats.rebuild()
+
+    def play(self, challenger, opponent, winner, balled=None):
+        match = Match.objects.create(
+            challenger=challenger,
+            opponent=opponent,
+            challenger_rank=UserProfile.objects.get(user=challenger).rank,
+            opponent_rank=UserProfile.objects.get(user=opponent).rank
+        )
+        return record_result(match, [(winner, balled), (winner, None), (None, None)])
+
+    def stats(self):
+        return {
+            stats.user_id: (
+                stats.matches_won,
+                stats.matches_lost,
+                stats.games_won,
+                stats.streak,
+                stats.last_played,
+                stats.is_top,
+                stats.is_bottom
+            ) for stats in PlayerStats.objects.all()
+        }
+
+    def test_recorded_stats_match_a_rebuild(self):
+        """
+        Stats kept up to date as results are recorded are the same as ones rebuilt from the history
+        """
+        self.play(self.users[1], self.users[0], self.users[1])
+        self.play(self.users[3], self.users[2], self.users[2])
+        self.play(self.users[2], self.users[0], self.users[2])
+        self.play(self.users[3], self.users[1], self.users[3], balled=self.users[1])
+
+        recorded = self.stats()
+        PlayerStats.rebuild()
+        self.assertEqual(recorded, self.stats())
+
+        profile = UserProfile.objects.get(user=self.users[2])
+        self.assertEqual(profile.matches_played, 2)
+        self.assertEqual(profile.matches_won, 2)
+        self.assertEqual(profile.games_won, 4)
+        self.assertEqual(profile.stats.streak, 2)
+        self.assertEqual(UserProfile.objects.get(user=self.users[0]).stats.streak, -2)
+
+    def test_swag_follows_the_ladder(self):
+        """
+        The top and bottom of the ladder move with the results
+        """
+        self.assertEqual(UserProfile.objects.get(user=self.users[0]).swag, ['1f478'])
+        self.assertEqual(UserProfile.objects.get(user=self.users[3]).swag, ['1F4A9'])
+
+        self.play(self.users[1], self.users[0], self.users[1], balled=self.users[0])
+
+        self.assertEqual(UserProfile.objects.get(user=self.users[1]).swag, ['1f478'])
+        self.assertEqual(UserProfile.objects.get(user=self.users[0]).swag, ['1F4A9', '1F3B1'])
+        self.assertEqual(UserProfile.objects.get(user=self.users[3]).swag, [])
+
+    def test_extremes_only_refreshed_when_the_ladder_changes(self):
+        """
+        Saving a profile only marks the top and bottom again if its rank or active flag changed
+        """
+        profile = UserProfile.objects.get(user=self.users[3])
+        profile.slack_id = 'U123'
+
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+
+        self.assertFalse([query for query in queries if 'pool_ladder_playerstats' in query['sql']])
+
+        profile.active = False
+        profile.save()
+        self.assertEqual(UserProfile.objects.get(user=self.users[2]).swag, ['1F4A9'])
@@ -1,5 +1,12 @@
+import json
+import re
+import shutil
+import subprocess
+from unittest import skipUnless
+
 from django.conf import settings
 from django.test import TestCase
+from django.urls import reverse
 
 from pool_ladder.models import User, UserProfile, Game, Match
 
@@ -132,3 +139,41 @@ class UITestCase(TestCase):
                 match = Match.objects.get(pk=match.pk)
                 self.assertEqual(match.days_to_play, current_days_to_play + 1)
 
+
+    @skipUnless(shutil.which('node'), 'node is needed to run the page script')
+    def test_diff_outside_the_first_page_fetches_from_the_server(self):
+        """
+        A new result is drawn from the diff on the first page of the latest matches, anywhere else the table is
+        fetched from the server again
+        """
+        self.client.login(username='challenger', password='123456789')
+        page = self.client.get(reverse('index')).content.decode()
+        apply_matches = re.search(r"matchCells, (function\(table, patch\) \{.*?\n {20}\})\),\n", page, re.S).group(1)
+        apply_diff = re.search(r"function applyDiff\(action\) \{.*?\n {8}\}\n", page, re.S).group(0)
+
+        def redraws(request):
+            script = """
+                const redraws = [];
+                function redraw(name, local) { redraws.push([name, local]); }
+                function upsert(rows, patch) { return rows.concat(patch.upsert); }
+                function sortRows(rows) { return rows; }
+                let lastSeq = null;
+                const tables = {matches: {rows: [{id: 1}], total: 1, request: %s, apply: %s}};
+                %s
+                applyDiff({seq: 1, tables: {matches: {upsert: [{id: 2}], remove: []}}});
+                console.log(JSON.stringify(redraws));
+            """ % (json.dumps(request), apply_matches, apply_diff)
+            return json.loads(subprocess.check_output(['node', '-e', script]).decode())
+
+        self.assertEqual(
+            redraws({'start': 0, 'length': 10, 'order': [{'column': 0, 'dir': 'desc'}]}),
+            [['matches', True]]
+        )
+        self.assertEqual(
+            redraws({'start': 10, 'length': 10, 'order': [{'column': 0, 'dir': 'desc'}]}),
+            [['matches', False]]
+        )
+        self.assertEqual(
+            redraws({'start': 0, 'length': 10, 'order': [{'column': 0, 'dir': 'asc'}]}),
+            [['matches', False]]
+        )
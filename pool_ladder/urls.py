@@ -35,6 +35,7 @@ urlpatterns = [
 
     path('player/<int:pk>', views.PlayerView.as_view(), name='player_detail'),
     path('player/<int:pk>/results', views.PlayerResultsDataTablesView.as_view(), name='player_results_datatable'),
+    path('player/<int:pk>/head-to-head/<int:opponent_pk>', views.HeadToHeadView.as_view(), name='head_to_head'),
 
     path('user/<int:pk>/update', views.UserNameUpdateView.as_view(), name='update_username'),
 
@@ -45,5 +46,9 @@ urlpatterns = [
     path('match/datatable', views.PlayedMatchesDataTablesView.as_view(), name='match_datatable'),
 
     path('new-season', views.NewSeason.as_view(), name='new-season'),
+    path('season/<int:number>/standings', views.SeasonStandings.as_view(), name='season_standings'),
+    path('ladder/replay', views.LadderReplay.as_view(), name='ladder_replay'),
+    path('ladder/<str:date>', views.LadderHistory.as_view(), name='ladder_history'),
     path('match-data/<int:season>', views.MatchData.as_view(), name='match-data'),
+    path('metrics', views.Metrics.as_view(), name='metrics'),
 ]
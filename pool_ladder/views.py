@@ -1,24 +1,36 @@
 import base64
 import hashlib
-import random
-from math import ceil
+from datetime import datetime, time
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.auth.models import User
-from django.core.paginator import Paginator
 from django.db.models import Q
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import render, get_object_or_404, redirect
-from django.template import Template, Context
-from django.template.loader import get_template
 from django.views import View
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_naive, make_aware, now
 from django.views.generic import DetailView
 
+from pool_ladder.datatables import Column, DataTablesView
+from pool_ladder.diffs import (
+    challenge_cells, challenge_rows, ladder_cells, ladder_rows, match_rows, open_challenges, played_matches
+)
+from pool_ladder.export import csv_stream, iterate_matches, json_stream, jsonl_stream, parquet_stream
+from pool_ladder.fanout import fanout_stats
 from pool_ladder.forms import MatchForm
-from pool_ladder.models import Match, UserProfile, Season
+from pool_ladder.fragments import cached_rows, render_fragment
+from pool_ladder.history import ladder_at
+from pool_ladder.metrics import MeasuredView, prometheus
+from pool_ladder.models import HeadToHead, Match, UserProfile, Season
+from pool_ladder.results import parse_games, record_result
+from pool_ladder.seasons import STRATEGIES, start_new_season
+from pool_ladder.snapshot import get_snapshot
+from pool_ladder.standings import ladder_as_of
 
 
 class IndexView(LoginRequiredMixin, View):
@@ -33,6 +45,29 @@ class MatchView(DetailView):
 class PlayerView(DetailView):
     model = UserProfile
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user_id = self.object.user_id
+        context['head_to_head'] = [
+            (record.opponent_of(user_id), record.record_for(user_id)) for record in HeadToHead.for_player(user_id)
+        ]
+        return context
+
+
+class HeadToHeadView(View):
+    @staticmethod
+    def get(request, pk, opponent_pk):
+        """
+        The record of one player against another, read from the single row kept for the pair
+        """
+        users = dict(UserProfile.objects.filter(pk__in=[pk, opponent_pk]).values_list('pk', 'user_id'))
+
+        if pk == opponent_pk or len(users) != 2:
+            raise Http404('head to head needs two players')
+
+        record = HeadToHead.between(users[pk], users[opponent_pk]).record_for(users[pk])
+        return JsonResponse(dict(record, player=pk, opponent=opponent_pk))
+
 
 class UserNameUpdateView(View):
     @staticmethod
@@ -42,10 +77,13 @@ class UserNameUpdateView(View):
         profile.user.save()
         profile.save()
 
+        # the username is shown in the cached match rows
+        Match.objects.filter(Q(challenger=profile.user) | Q(opponent=profile.user)).update(updated=now())
+
         return redirect('player_detail', pk=pk)
 
 
-class PlayMatch(LoginRequiredMixin, View):
+class PlayMatch(MeasuredView, LoginRequiredMixin, View):
     def get(self, request, pk):
         match = get_object_or_404(Match, pk=pk)
         form = MatchForm(match_pk=match.pk)
@@ -64,84 +102,10 @@ class PlayMatch(LoginRequiredMixin, View):
             return render(request, 'pool_ladder/index.html')
 
         if form.is_valid():
-            ####
-            # Start the match
-            # this adds 3 games to the match and sets the winner and loser rank based on the participants
-
-            match.start_match()
-
-            ####
-            # UPDATE GAME 0
-            ####
-
-            game_0 = match.game_set.get(index=0)
-
-            try:
-                game_0.winner = User.objects.get(pk=form.cleaned_data['game_0_winner'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            try:
-                game_0.balled = User.objects.get(pk=form.cleaned_data['game_0_balled'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            game_0.save()
-
-            ####
-            # UPDATE GAME 1
-            ####
-
-            game_1 = match.game_set.get(index=1)
-
-            try:
-                game_1.winner = User.objects.get(pk=form.cleaned_data['game_1_winner'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            try:
-                game_1.balled = User.objects.get(pk=form.cleaned_data['game_1_balled'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            game_1.save()
-
-            ####
-            # UPDATE GAME 2
-            ####
-
-            game_2 = match.game_set.get(index=2)
-
-            try:
-                game_2.winner = User.objects.get(pk=form.cleaned_data['game_2_winner'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            try:
-                game_2.balled = User.objects.get(pk=form.cleaned_data['game_2_balled'])
-            except User.DoesNotExist:
-                pass
-            except ValueError:
-                pass
-
-            game_2.save()
-
-            ####
-            # UPDATE MATCH
-            ####
-
-            match.set_winner_and_loser()
-            match.save()
+            # games, ranks and the match are all written together
+            if record_result(match, parse_games(match, form.cleaned_data)) is None:
+                messages.add_message(request, messages.ERROR, 'Results have already been entered for this match.')
+                return render(request, 'pool_ladder/index.html')
 
             return redirect('index')
         else:
@@ -186,235 +150,224 @@ class DeclineMatch(View):
         return render(request, 'pool_ladder/index.html')
 
 
-def generic_data_tables_view(request, object, query_set, paginate=True):
-    # get the basic parameters
-    draw = int(request.GET.get('draw', 0))
-    start = int(request.GET.get('start', 0))
-    length = int(request.GET.get('length', 0))
-
-    # handle a search term
-    search = request.GET.get('search[value]', '')
-    results_total = query_set.count()
-
-    if search:
-        # start with a blank Q object and add a query for every non-relational field attached to the model
-        q_objects = Q()
-
-        for field in object._meta.fields:
-            if field.is_relation:
-                continue
-            kwargs = {'{}__icontains'.format(field.name): search}
-            q_objects |= Q(**kwargs)
-
-        query_set = query_set.filter(q_objects)
-
-    # handle the ordering
-    order_column_index = request.GET.get('order[0][column]')
-    order_by = request.GET.get('columns[{}][name]'.format(order_column_index))
-    order_direction = request.GET.get('order[0][dir]')
-
-    if order_direction == 'desc':
-        order_by = '-{}'.format(order_by)
-
-    if order_by:
-        query_set = query_set.order_by(order_by)
-
-    # now we have our completed queryset. we can paginate it if requested
-    if paginate:
-        index = start + 1  # start is 0 based, pages are 1 based
-        page = Paginator(
-            query_set,
-            length
-        ).get_page(
-            ceil(index / length)
-        )
-
-    return {
-        'draw': draw,
-        'recordsTotal': results_total,
-        'recordsFiltered': query_set.count(),
-        'data': page if paginate else query_set
-    }
-
-
-class LadderDataTablesView(LoginRequiredMixin, View):
-    def get(self, request):
-        data = generic_data_tables_view(request, UserProfile, UserProfile.objects.filter(active=True), paginate=False)
-        return JsonResponse(
-            {
-                'draw': data['draw'],
-                'recordsTotal': data['recordsTotal'],
-                'recordsFiltered': data['recordsFiltered'],
-                'data': [
-                    [
-                        get_template('pool_ladder/fragments/user_rank.html').render({'profile': profile}),
-                        get_template('pool_ladder/fragments/user_name.html').render({'profile': profile}),
-                        get_template(
-                            'pool_ladder/fragments/user_available.html'
-                        ).render(
-                            {
-                                'profile': profile,
-                                'can_challenge': profile.can_challenge(request.user)
-                            }
-                        )
-                    ] for profile in data['data']
-                ]
-            }
+def ordered(objects, ordering):
+    """
+    the snapshot keeps objects in ascending order so reverse them if descending order was asked for
+    """
+    return list(reversed(objects)) if ordering[0].startswith('-') else objects
+
+
+class LadderDataTablesView(DataTablesView):
+    table = 'users'
+    columns = [
+        Column('rank', order_by=['rank']),
+        Column('user', search=['user__username__icontains']),
+        Column('available'),
+    ]
+    default_order = ['rank']
+    paginate = False
+
+    def get_queryset(self, request, **kwargs):
+        return UserProfile.objects.filter(active=True).select_related('user')
+
+    def get_snapshot_page(self, ordering, start, length, **kwargs):
+        return ordered(get_snapshot().profiles, ordering), len(get_snapshot().profiles)
+
+    def get_data(self, request, objects, **kwargs):
+        # availability for the whole ladder comes from the snapshot rather than per row
+        rows = ladder_rows(get_snapshot().availability(), objects)
+        viewer = next((row for row in rows if row['id'] == request.user.pk), None)
+        # the browser keeps the rows so it can apply diffs to them
+        return {'data': [ladder_cells(row, viewer) for row in rows], 'rows': rows}
+
+
+class ChallengesDataTablesView(DataTablesView):
+    table = 'challenges'
+    columns = [
+        Column('challenge_time', order_by=['challenge_time']),
+        Column('time_until'),
+        Column('challenger', search=['challenger__username__icontains']),
+        Column('opponent', search=['opponent__username__icontains']),
+        Column('action'),
+    ]
+    default_order = ['challenge_time']
+    paginate = False
+
+    def get_queryset(self, request, **kwargs):
+        return open_challenges()
+
+    def get_snapshot_page(self, ordering, start, length, **kwargs):
+        return ordered(get_snapshot().challenges, ordering), len(get_snapshot().challenges)
+
+    def get_data(self, request, objects, **kwargs):
+        rows = challenge_rows(objects, get_snapshot().can_decline)
+        return {'data': [challenge_cells(row, request.user) for row in rows], 'rows': rows}
+
+
+class PlayedMatchesDataTablesView(DataTablesView):
+    table = 'matches'
+    columns = [
+        Column('played', order_by=['played']),
+        Column('winner', search=['winner__username__icontains']),
+        Column('loser', search=['loser__username__icontains']),
+    ]
+    default_order = ['-played']
+
+    def get_queryset(self, request, **kwargs):
+        return played_matches()
+
+    def get_snapshot_page(self, ordering, start, length, **kwargs):
+        snapshot = get_snapshot()
+
+        # only the latest results are kept
+        if ordering != ['-played', '-pk']:
+            return None
+
+        if length > 0 and start + length <= len(snapshot.recent):
+            return snapshot.recent[start:start + length], snapshot.played_count
+
+        if snapshot.played_count == len(snapshot.recent):
+            return snapshot.recent[start:start + length] if length > 0 else snapshot.recent, snapshot.played_count
+
+        return None
+
+    def get_data(self, request, objects, **kwargs):
+        rows = match_rows(objects)
+        return {'data': [row['cells'] for row in rows], 'rows': rows}
+
+
+class PlayerResultsDataTablesView(DataTablesView):
+    table = 'matches'
+    columns = [
+        Column('played', order_by=['played']),
+        Column('result'),
+        Column('rank'),
+    ]
+    default_order = ['-played']
+
+    def get_queryset(self, request, pk=None, **kwargs):
+        self.profile = get_object_or_404(UserProfile.objects.select_related('user'), pk=pk)
+        return self.profile.matches.select_related('season', 'challenger', 'opponent', 'winner')
+
+    def search_filter(self, search):
+        # search on the other player in each match
+        return Q(challenger__username__icontains=search) | Q(opponent__username__icontains=search)
+
+    def get_rows(self, request, objects, **kwargs):
+        user = self.profile.user
+        return cached_rows(
+            'results:{}'.format(user.pk),
+            objects,
+            lambda match: [
+                render_fragment('results_played', {'match': match, 'user': user}),
+                render_fragment('results_result', {'match': match, 'user': user}),
+                render_fragment('results_rank', {'match': match, 'user': user})
+            ]
         )
 
 
-class ChallengesDataTablesView(LoginRequiredMixin, View):
-    def get(self, request):
-        data = generic_data_tables_view(
-            request,
-            Match,
-            Match.objects.filter(played__isnull=True).filter(declined=False),
-            paginate=False
-        )
+class SeasonStandings(LoginRequiredMixin, View):
+    @staticmethod
+    def get(request, number):
+        """
+        Where each player finished the season, empty until the next season starts
+        """
+        season = get_object_or_404(Season, number=number)
         return JsonResponse(
             {
-                'draw': data['draw'],
-                'recordsTotal': data['recordsTotal'],
-                'recordsFiltered': data['recordsFiltered'],
-                'data': [
-                    [
-                        Template('{{ challenge.challenge_time }}').render(Context({'challenge': challenge})),
-                        Template(
-                            '<small>{{ challenge.time_until | timeuntil }}</small>'
-                        ).render(
-                            Context({'challenge': challenge})
-                        ),
-                        get_template(
-                            'pool_ladder/fragments/challenge_challenger.html'
-                        ).render(
-                            {'challenge': challenge}
-                        ),
-                        get_template(
-                            'pool_ladder/fragments/challenge_opponent.html'
-                        ).render(
-                            {'challenge': challenge}
-                        ),
-                        get_template(
-                            'pool_ladder/fragments/challenge_action.html'
-                        ).render(
-                            {
-                                'challenge': challenge,
-                                'logged_in_user': request.user.username,
-                                'max_days': challenge.days_to_play == settings.MAX_DAYS_TO_PLAY
-                            }
-                        )
-                    ] for challenge in data['data']
-                ]
+                'season': season.number,
+                'standings': list(
+                    season.standings.order_by(
+                        'rank'
+                    ).values(
+                        'rank', 'user__username', 'matches_won', 'matches_lost', 'games_won', 'rating'
+                    )
+                )
             }
         )
 
 
-class PlayedMatchesDataTablesView(LoginRequiredMixin, View):
-    def get(self, request):
-        data = generic_data_tables_view(
-            request,
-            Match,
-            Match.objects.exclude(played__isnull=True).filter(declined=False)
-        )
-        return JsonResponse(
-            {
-                'draw': data['draw'],
-                'recordsTotal': data['recordsTotal'],
-                'recordsFiltered': data['recordsFiltered'],
-                'data': [
-                    [
-                        get_template('pool_ladder/fragments/match_link.html').render({'match': match}),
-                        get_template('pool_ladder/fragments/match_winner.html').render({'match': match}),
-                        get_template('pool_ladder/fragments/match_loser.html').render({'match': match})
-                    ] for match in data['data']
-                ]
-            }
-        )
+class LadderHistory(LoginRequiredMixin, View):
+    @staticmethod
+    def get(request, date):
+        """
+        The ladder as it was at the end of the given YYYY-MM-DD date
+        """
+        try:
+            day = parse_date(date)
+        except ValueError:
+            # well formed but not a real date
+            day = None
 
+        if day is None:
+            return HttpResponseBadRequest('date must be YYYY-MM-DD')
 
-class PlayerResultsDataTablesView(LoginRequiredMixin, View):
-    def get(self, request, pk):
-        profile = get_object_or_404(UserProfile, pk=pk)
-        data = generic_data_tables_view(request, Match, profile.matches)
+        standings = list(ladder_as_of(day).values('date', 'rank', 'user__username', 'rating'))
         return JsonResponse(
             {
-                'draw': data['draw'],
-                'recordsTotal': data['recordsTotal'],
-                'recordsFiltered': data['recordsFiltered'],
-                'data': [
-                    [
-                        get_template(
-                            'pool_ladder/fragments/results_played.html'
-                        ).render(
-                            {
-                                'match': match,
-                                'user': profile.user
-                            }
-                        ),
-                        get_template(
-                            'pool_ladder/fragments/results_result.html'
-                        ).render(
-                            {
-                                'match': match,
-                                'user': profile.user
-                            }
-                        ),
-                        get_template(
-                            'pool_ladder/fragments/results_rank.html'
-                        ).render(
-                            {
-                                'match': match,
-                                'user': profile.user
-                            }
-                        )
-                    ] for match in data['data']
+                'date': standings[0]['date'] if standings else None,
+                'standings': [
+                    {key: value for key, value in standing.items() if key != 'date'} for standing in standings
                 ]
             }
         )
 
 
-class NewSeason(LoginRequiredMixin, View):
+class LadderReplay(LoginRequiredMixin, View):
     @staticmethod
     def get(request):
         """
-        This method will shuffle all player ranks and start a new season
+        The ladder as it was at the ISO 8601 time given as 'at', replayed from the ladder events
         """
-        if not request.user.is_superuser:
-            return HttpResponseForbidden()
-
-        # create a new season
-        # first get the latest season
-        latest_season = Season.objects.all().first()
-        Season.objects.create(number=latest_season.number + 1)
+        try:
+            at = parse_datetime(request.GET.get('at', ''))
+        except ValueError:
+            # well formed but not a real time
+            at = None
 
-        # now we shuffle the ranks
-        active_users = UserProfile.objects.filter(active=True).order_by('-rank')
+        if at is None:
+            return HttpResponseBadRequest('at must be an ISO 8601 time')
 
-        user_list = []
+        if is_naive(at):
+            at = make_aware(at)
 
-        for user in active_users:
-            user_list.append({user.pk: user.rank})
+        base, standings = ladder_at(at)
+        return JsonResponse({'at': at, 'base': base, 'standings': standings})
 
-        random.shuffle(user_list)
 
-        new_rank = 1
+class NewSeason(LoginRequiredMixin, View):
+    @staticmethod
+    def get(request):
+        """
+        Start a new season, shuffling the player ranks unless another strategy is given
+        """
+        if not request.user.is_superuser:
+            return HttpResponseForbidden()
 
-        for user in user_list:
-            profile = UserProfile.objects.get(pk=list(user.keys())[0])
-            profile.rank = new_rank
-            profile.save()
+        strategy = request.GET.get('strategy', 'random')
 
-            new_rank += 1
+        if strategy not in STRATEGIES:
+            return HttpResponseBadRequest('strategy must be one of {}'.format(', '.join(STRATEGIES)))
 
+        season = start_new_season(strategy, carry_challenges=request.GET.get('carry_challenges') == 'true')
+        messages.add_message(request, messages.INFO, 'Season {} has started.'.format(season.number))
         return redirect('index')
 
 
-class MatchData(View):
-    @staticmethod
-    def get(request, season):
+class MatchData(MeasuredView, View):
+    # content type and file extension of each export format
+    formats = {
+        'json': ('application/json', 'json'),
+        'jsonl': ('application/x-ndjson', 'jsonl'),
+        'csv': ('text/csv', 'csv'),
+        'parquet': ('application/octet-stream', 'parquet'),
+    }
+
+    def get(self, request, season):
         """
-        Return serialized match data
-        type can be json or anything else which defaults to csv
+        Stream serialized match data.
+        format can be json (the default), jsonl, csv or parquet.
+        since limits the export to matches changed at or after the given ISO 8601 date or time
         """
         try:
             secret_token = settings.DATA_SECRET_TOKEN
@@ -444,14 +397,57 @@ class MatchData(View):
                 print('mismatch token')
                 return HttpResponseForbidden()
 
+        export_format = request.GET.get('format', 'json')
+
+        if export_format not in self.formats:
+            return HttpResponseBadRequest('format must be one of {}'.format(', '.join(self.formats)))
+
         if season == 'all' or season == 0:
             matches = Match.objects.all()
         else:
             season_obj = get_object_or_404(Season, number=season)
             matches = Match.objects.filter(season=season_obj)
 
-        data = [match.serialize() for match in matches]
-        return JsonResponse(data, safe=False)
+        if 'since' in request.GET:
+            try:
+                since = parse_datetime(request.GET['since'])
+                since_date = parse_date(request.GET['since']) if since is None else None
+            except ValueError:
+                # well formed but not a real date or time
+                since = since_date = None
+
+            if since is None:
+                if since_date is None:
+                    return HttpResponseBadRequest('since must be an ISO 8601 date or time')
+
+                since = datetime.combine(since_date, time())
+
+            if is_naive(since):
+                since = make_aware(since)
+
+            matches = matches.filter(updated__gte=since)
+
+        content_type, extension = self.formats[export_format]
+        streams = {
+            'json': json_stream,
+            'jsonl': jsonl_stream,
+            'csv': csv_stream,
+            'parquet': parquet_stream,
+        }
 
+        response = StreamingHttpResponse(streams[export_format](iterate_matches(matches)), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="matches-{}.{}"'.format(season or 'all', extension)
+        return response
 
 
+class Metrics(LoginRequiredMixin, View):
+    @staticmethod
+    def get(request):
+        """
+        The query counts and timings of the views and socket handlers in this process, for prometheus to scrape
+        """
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+
+        gauges = {'pool_ladder_fanout_{}'.format(key): value for key, value in fanout_stats().items()}
+        return HttpResponse(prometheus(gauges), content_type='text/plain; version=0.0.4')